@@ -0,0 +1,6 @@
+"""
+Micro/end-to-end benchmarks for HEXACOBot hot paths.
+
+Run from the repository root:
+    python -m hexaco_bot.benchmarks.run
+"""
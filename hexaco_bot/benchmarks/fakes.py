@@ -0,0 +1,123 @@
+"""
+In-memory fakes used by the benchmark suite.
+
+FakeBot records outgoing calls instead of talking to Telegram, InMemoryDatabaseManager runs the
+real DatabaseManager SQL against a single shared `:memory:` SQLite connection.
+"""
+
+import random
+import sqlite3
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.data.hexaco_questions import get_total_questions as get_total_hexaco_questions
+from hexaco_bot.src.data.sds_questions import get_total_sds_questions, SDS_ANSWER_OPTIONS
+from hexaco_bot.src.data.svs_questions import get_total_svs_questions, SVS_ANSWER_OPTIONS
+from hexaco_bot.src.data.panas_questions import get_total_panas_questions, PANAS_ANSWER_OPTIONS
+from hexaco_bot.src.data.self_efficacy_questions import get_total_self_efficacy_questions, SELF_EFFICACY_ANSWER_OPTIONS
+from hexaco_bot.src.data.cdrisc_questions import get_total_cdrisc_questions, CDRISC_ANSWER_OPTIONS
+from hexaco_bot.src.data.rfq_questions import get_total_rfq_questions, RFQ_ANSWER_OPTIONS
+from hexaco_bot.src.data.pid5bfm_questions import get_total_pid5bfm_questions, PID5BFM_ANSWER_OPTIONS
+
+# test_type -> (число вопросов, допустимые значения ответа)
+TEST_SPECS: Dict[str, Tuple[int, List[int]]] = {
+    'hexaco': (get_total_hexaco_questions(), [1, 2, 3, 4, 5]),
+    'sds': (get_total_sds_questions(), list(SDS_ANSWER_OPTIONS)),
+    'svs': (get_total_svs_questions(), list(SVS_ANSWER_OPTIONS)),
+    'panas': (get_total_panas_questions(), list(PANAS_ANSWER_OPTIONS)),
+    'self_efficacy': (get_total_self_efficacy_questions(), list(SELF_EFFICACY_ANSWER_OPTIONS)),
+    'cdrisc': (get_total_cdrisc_questions(), list(CDRISC_ANSWER_OPTIONS)),
+    'rfq': (get_total_rfq_questions(), list(RFQ_ANSWER_OPTIONS)),
+    'pid5bfm': (get_total_pid5bfm_questions(), list(PID5BFM_ANSWER_OPTIONS)),
+}
+
+
+class FakeBot:
+    """Stands in for telebot.TeleBot: records API calls and returns minimal Message-like objects."""
+
+    def __init__(self, history: int = 1000):
+        # Храним только последние вызовы, чтобы длинные прогоны не росли по памяти
+        self.calls: deque = deque(maxlen=history)
+        self._next_message_id = 1
+
+    def _record(self, method: str, args: tuple, kwargs: dict):
+        self.calls.append((method, args, kwargs))
+        message = SimpleNamespace(message_id=self._next_message_id)
+        self._next_message_id += 1
+        return message
+
+    def send_message(self, *args, **kwargs):
+        return self._record('send_message', args, kwargs)
+
+    def send_document(self, *args, **kwargs):
+        return self._record('send_document', args, kwargs)
+
+    def edit_message_text(self, *args, **kwargs):
+        return self._record('edit_message_text', args, kwargs)
+
+    def delete_message(self, *args, **kwargs):
+        self._record('delete_message', args, kwargs)
+        return True
+
+    def answer_callback_query(self, *args, **kwargs):
+        self._record('answer_callback_query', args, kwargs)
+        return True
+
+    # Декораторы регистрации обработчиков: функции не вызываются, достаточно вернуть их как есть
+    def callback_query_handler(self, *args, **kwargs):
+        return lambda func: func
+
+    def message_handler(self, *args, **kwargs):
+        return lambda func: func
+
+    def sent_texts(self) -> List[str]:
+        """Texts of all send_message calls, in order."""
+        return [args[1] if len(args) > 1 else kwargs.get('text', '') for method, args, kwargs in self.calls
+                if method == 'send_message']
+
+    def reset(self):
+        self.calls.clear()
+
+
+class InMemoryDatabaseManager(DatabaseManager):
+    """DatabaseManager over one shared in-memory connection (the schema lives as long as the object)."""
+
+    def __init__(self):
+        super().__init__(':memory:')
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+    def get_connection(self) -> sqlite3.Connection:
+        # `with conn:` в DatabaseManager только управляет транзакцией и не закрывает соединение
+        return self._conn
+
+    def copy_from(self, other: 'InMemoryDatabaseManager'):
+        """Replaces this database's content with a copy of another in-memory database."""
+        other._conn.backup(self._conn)
+        self.user_cache.clear()
+
+
+def make_user(db: DatabaseManager, user_id: int, username: str = None) -> Dict[str, Any]:
+    """Creates a fully registered user and returns its row."""
+    db.create_user(user_id, username or f"bench_user_{user_id}", "Bench", "User", "male")
+    db.update_user_paei(user_id, "PAEI")
+    db.update_user_mbti(user_id, "INTJ")
+    return db.get_user(user_id)
+
+
+def make_responses(test_type: str, rng: random.Random) -> Dict[int, int]:
+    """Random but valid answers for every question of a test."""
+    total, values = TEST_SPECS[test_type]
+    return {question_num: rng.choice(values) for question_num in range(1, total + 1)}
+
+
+def make_callback(user_id: int, data: str, message_id: int = 1, call_id: str = "1"):
+    """Minimal CallbackQuery look-alike with the attributes QuestionHandler reads."""
+    return SimpleNamespace(
+        id=call_id,
+        data=data,
+        from_user=SimpleNamespace(id=user_id, first_name="Bench"),
+        message=SimpleNamespace(chat=SimpleNamespace(id=user_id), message_id=message_id),
+    )
@@ -0,0 +1,145 @@
+"""
+Import-time report for the bot entry point, built on `python -X importtime`.
+
+Startup of a restarted or newly added worker is dominated by imports, so this measures how long a
+fresh interpreter needs to import hexaco_bot.src.main and which modules that time goes to. Every run is
+a separate process (the import cache of the current one would hide everything); the run with the
+median total is reported.
+
+Usage (from the repository root):
+    python -m hexaco_bot.benchmarks.importtime              # report for hexaco_bot.src.main
+    python -m hexaco_bot.benchmarks.importtime --top 30
+    python -m hexaco_bot.benchmarks.run --import-time       # same report plus startup.import_main in the results
+"""
+
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+project_grandparent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+DEFAULT_MODULE = "hexaco_bot.src.main"
+
+# import time:       324 |      78440 |     hexaco_bot.src.scoring.svs_scorer
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+@dataclass
+class ImportEntry:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 - сам измеряемый модуль, 1 - импортирован им напрямую и т.д.
+
+
+@dataclass
+class ImportReport:
+    module: str
+    totals_us: List[int]  # время импорта `module` в каждом прогоне
+    entries: List[ImportEntry]  # прогон с медианным временем
+
+    @property
+    def total_us(self) -> float:
+        return statistics.median(self.totals_us)
+
+    def top(self, count: int, key: str = 'cumulative_us', own_only: bool = False) -> List[ImportEntry]:
+        entries = [entry for entry in self.entries if entry.name != self.module]
+        if own_only:
+            entries = [entry for entry in entries if entry.name.startswith('hexaco_bot')]
+        return sorted(entries, key=lambda entry: getattr(entry, key), reverse=True)[:count]
+
+
+def parse_importtime(output: str) -> List[ImportEntry]:
+    entries = []
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            entries.append(ImportEntry(match.group(4), int(match.group(1)), int(match.group(2)),
+                                       (len(match.group(3)) - 1) // 2))
+    return entries
+
+
+def _imported_by(entries: List[ImportEntry], module: str) -> List[ImportEntry]:
+    """`module` and what it imported: -X importtime prints a module after its imports, so it is the
+    block of deeper entries right before the module's own line (interpreter startup, site... are dropped)."""
+    end = next((i for i, entry in enumerate(entries) if entry.name == module and entry.depth == 0), None)
+    if end is None:
+        return []
+    start = end
+    while start > 0 and entries[start - 1].depth > 0:
+        start -= 1
+    return entries[start:end + 1]
+
+
+def _child_env(workdir: str) -> Dict[str, str]:
+    """Settings pointed at a throwaway directory: importing main configures logging at import time."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_grandparent_dir, env.get('PYTHONPATH')]))
+    env.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+    env['LOG_FILE'] = os.path.join(workdir, 'bot.log')
+    env['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    env['METRICS_PORT'] = '0'
+    return env
+
+
+def measure_import_time(module: str = DEFAULT_MODULE, runs: int = 5) -> ImportReport:
+    """Imports `module` in `runs` fresh interpreters with -X importtime."""
+    workdir = tempfile.mkdtemp(prefix="hexaco_importtime_")
+    env = _child_env(workdir)
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=workdir, env=env, capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        entries = _imported_by(parse_importtime(result.stderr), module)
+        if not entries:
+            raise RuntimeError(f"No -X importtime line for {module}")
+        samples.append((entries[-1].cumulative_us, entries))
+    samples.sort(key=lambda sample: sample[0])
+    return ImportReport(module, [total for total, _ in samples], samples[len(samples) // 2][1])
+
+
+def as_benchmark_stats(report: ImportReport) -> Dict[str, float]:
+    """The import time in the per-call format of run.measure(), for history and baseline comparison."""
+    totals = [float(total) for total in report.totals_us]
+    return {
+        "median_us": statistics.median(totals),
+        "min_us": min(totals),
+        "mean_us": statistics.fmean(totals),
+        "stdev_us": statistics.stdev(totals) if len(totals) > 1 else 0.0,
+        "rounds": len(totals),
+        "calls_per_round": 1,
+    }
+
+
+def print_import_report(report: ImportReport, top: int = 15):
+    print(f"import {report.module}: {report.total_us / 1000:.1f}ms median of {len(report.totals_us)} runs "
+          f"(min {min(report.totals_us) / 1000:.1f}ms)")
+    print(f"  {'slowest imports (cumulative)':<52} {'cumulative':>10} {'self':>8}")
+    for entry in report.top(top):
+        print(f"  {entry.name:<52} {entry.cumulative_us / 1000:>8.1f}ms "
+              f"{entry.self_us / 1000:>6.1f}ms")
+    print(f"  {'project modules (cumulative)':<52}")
+    for entry in report.top(top, own_only=True):
+        print(f"  {entry.name:<52} {entry.cumulative_us / 1000:>8.1f}ms {entry.self_us / 1000:>6.1f}ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report how long importing the bot takes and where the time goes.")
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (default: 5).")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list (default: 15).")
+    args = parser.parse_args(argv)
+    print_import_report(measure_import_time(args.module, args.runs), args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Benchmark runner with history tracking and regression thresholds.
+
+Every run is appended to results/history.jsonl (git revision, timestamp, per-benchmark stats) and
+compared against baseline.json: a benchmark whose best-round (min) per-call time exceeds the baseline
+min by more than the threshold is reported as a regression and the process exits with code 1. The
+median of µs-scale benchmarks moves by tens of percent between reruns of the same tree on a shared
+machine; the best of many interleaved rounds (see measure) is what stays put.
+
+Usage (from the repository root):
+    python -m hexaco_bot.benchmarks.run                     # run everything, compare with baseline
+    python -m hexaco_bot.benchmarks.run -k answer_callback  # only benchmarks whose name contains the substring
+    python -m hexaco_bot.benchmarks.run --save-baseline     # record the current numbers as the new baseline
+    python -m hexaco_bot.benchmarks.run --import-time       # also report import time of the bot (startup.import_main)
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+project_grandparent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_grandparent_dir not in sys.path:
+    sys.path.insert(0, project_grandparent_dir)
+
+from hexaco_bot.benchmarks.importtime import as_benchmark_stats, measure_import_time, print_import_report
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE_PATH = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_HISTORY_PATH = BENCHMARKS_DIR / "results" / "history.jsonl"
+IMPORT_BENCHMARK = "startup.import_main"
+DEFAULT_THRESHOLD = 0.30  # допустимое замедление лучшего раунда относительно baseline (30%)
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_environment(workdir: str, report_files: int):
+    """
+    Points settings at a throwaway workdir and fills the reports directory with dummy files,
+    so that _start_test_flow lists a realistically sized directory. Must run before importing the suite.
+    """
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["USER_REPORTS_DIR"] = os.path.join(workdir, "user_reports")
+    os.environ["USER_PROFILES_DIR"] = os.path.join(workdir, "user_profile")
+    os.makedirs(os.environ["USER_REPORTS_DIR"], exist_ok=True)
+    os.makedirs(os.environ["USER_PROFILES_DIR"], exist_ok=True)
+    for i in range(report_files):
+        path = os.path.join(os.environ["USER_REPORTS_DIR"], f"report_other_user_{i}_20250101_000000.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"user_id": i, "tests": {}}, f)
+
+
+def _timed_batch(run: Callable[[], Any], teardown: Optional[Callable[[], Any]], number: int) -> float:
+    """Total time of `number` calls; with a teardown every call is timed separately and teardown is excluded."""
+    if teardown is None:
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        return time.perf_counter() - started
+    total = 0.0
+    for _ in range(number):
+        started = time.perf_counter()
+        run()
+        total += time.perf_counter() - started
+        teardown()
+    return total
+
+
+def _unpack(benchmark: Any):
+    return benchmark if isinstance(benchmark, tuple) else (benchmark, None)
+
+
+def calibrate(benchmark: Any, min_round_time: float) -> int:
+    """Number of calls per round so that one round takes at least min_round_time (timeit-style)."""
+    run, teardown = _unpack(benchmark)
+    if teardown is not None:
+        teardown()  # состояние после проверочного вызова в setup
+    number = 1
+    while True:
+        elapsed = _timed_batch(run, teardown, number)
+        if elapsed >= min_round_time or number >= 1_000_000:
+            return number
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_round_time / elapsed) + 1))
+
+
+def _stats(per_call: List[float], number: int) -> Dict[str, float]:
+    return {
+        "median_us": statistics.median(per_call),
+        "min_us": min(per_call),
+        "mean_us": statistics.fmean(per_call),
+        "stdev_us": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "rounds": len(per_call),
+        "calls_per_round": number,
+    }
+
+
+def measure(benchmarks: Dict[str, Any], rounds: int, min_round_time: float) -> Dict[str, Dict[str, float]]:
+    """
+    Per-call statistics in microseconds for every benchmark (what a suite setup function returns: a
+    callable or a (run, teardown) pair). Rounds are interleaved: each of the `rounds` passes runs one
+    round of every benchmark, so a slow stretch of a shared machine hits one round of many benchmarks
+    instead of all rounds of one, and min_us (the gated statistic) comes from a quiet moment.
+    """
+    numbers = {name: calibrate(benchmark, min_round_time) for name, benchmark in benchmarks.items()}
+    per_call: Dict[str, List[float]] = {name: [] for name in benchmarks}
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            for name, benchmark in benchmarks.items():
+                run, teardown = _unpack(benchmark)
+                per_call[name].append(_timed_batch(run, teardown, numbers[name]) / numbers[name] * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {name: _stats(per_call[name], numbers[name]) for name in benchmarks}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                                capture_output=True, text=True, timeout=10)
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_baseline(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {"benchmarks": {}, "thresholds": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    baseline.setdefault("benchmarks", {})
+    baseline.setdefault("thresholds", {})
+    return baseline
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]], previous: Dict[str, Any]):
+    """Writes a new baseline, keeping per-benchmark threshold overrides from the previous one."""
+    baseline = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "thresholds": previous.get("thresholds", {}),
+        "benchmarks": {name: {"median_us": round(stats["median_us"], 3), "min_us": round(stats["min_us"], 3)}
+                       for name, stats in sorted(results.items())},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def append_history(path: Path, results: Dict[str, Dict[str, float]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], default_threshold: float) -> List[Dict[str, Any]]:
+    """
+    Returns one row per benchmark with its status against the baseline: ok, improved, regressed or new.
+    The change is that of min_us (baselines without it fall back to the median).
+    """
+    rows = []
+    for name, stats in sorted(results.items()):
+        reference = baseline["benchmarks"].get(name)
+        threshold = baseline["thresholds"].get(name, default_threshold)
+        row = {"name": name, "median_us": stats["median_us"], "min_us": stats["min_us"],
+               "baseline_us": None, "change": None, "status": "new"}
+        if reference:
+            key = "min_us" if reference.get("min_us") else "median_us"
+            row["baseline_us"] = reference[key]
+            row["change"] = stats[key] / reference[key] - 1.0
+            if row["change"] > threshold:
+                row["status"] = "REGRESSED"
+            elif row["change"] < -threshold:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    print(f"{'benchmark':<42} {'median':>12} {'min':>12} {'base min':>12} {'change':>8}  status")
+    for row in rows:
+        baseline = f"{row['baseline_us']:.1f}us" if row["baseline_us"] is not None else "-"
+        change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "-"
+        print(f"{row['name']:<42} {row['median_us']:>10.1f}us {row['min_us']:>10.1f}us {baseline:>12} {change:>8}  {row['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run HEXACOBot hot-path benchmarks and compare against the baseline.")
+    parser.add_argument("-k", "--filter", action="append", default=[],
+                        help="Only run benchmarks whose name contains this substring (repeatable).")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit.")
+    parser.add_argument("--rounds", type=int, default=20, help="Measured rounds per benchmark (default: 20).")
+    parser.add_argument("--min-round-time", type=float, default=0.02, help="Minimum duration of one round, seconds.")
+    parser.add_argument("--background-users", type=int, default=200,
+                        help="Other users with a full set of results preloaded into the in-memory DB.")
+    parser.add_argument("--report-files", type=int, default=500, help="Dummy files in the user reports directory.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed best-round slowdown vs baseline before failing (fraction, default: 0.30).")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--no-history", action="store_true", help="Do not append this run to the history file.")
+    parser.add_argument("--no-fail", action="store_true", help="Exit with 0 even if regressions are detected.")
+    parser.add_argument("--import-time", action="store_true",
+                        help="Also measure importing hexaco_bot.src.main in fresh interpreters (startup.import_main) "
+                             "and print where the import time goes.")
+    parser.add_argument("--json", type=Path, default=None, help="Also write the raw results to this file.")
+    args = parser.parse_args(argv)
+
+    # Обработчики очень многословны на INFO; для замеров оставляем только предупреждения и ошибки
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    workdir = tempfile.mkdtemp(prefix="hexaco_bench_")
+    prepare_environment(workdir, args.report_files)
+    from hexaco_bot.benchmarks.suite import BENCHMARKS, BenchContext
+
+    names = [name for name in BENCHMARKS if not args.filter or any(f in name for f in args.filter)]
+    if args.list:
+        print("\n".join(names + ([IMPORT_BENCHMARK] if args.import_time else [])))
+        return 0
+    if not names and not args.import_time:
+        print("No benchmarks match the filter.")
+        return 1
+
+    ctx = BenchContext(background_users=args.background_users)
+    benchmarks = {}
+    for name in names:
+        print(f"  setup {name}", file=sys.stderr)
+        benchmarks[name] = BENCHMARKS[name](ctx)
+    results = measure(benchmarks, rounds=args.rounds, min_round_time=args.min_round_time)
+    if args.import_time:
+        # Отдельные процессы: в текущем все модули уже импортированы
+        report = measure_import_time()
+        print_import_report(report)
+        results[IMPORT_BENCHMARK] = as_benchmark_stats(report)
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, baseline, args.threshold)
+    suspects = [row["name"] for row in rows if row["status"] == "REGRESSED"]
+    if suspects and not args.save_baseline:
+        # Повторный замер, чтобы не падать из-за разового шума; берем лучший из двух результатов
+        retries = measure({name: benchmarks[name] for name in suspects if name != IMPORT_BENCHMARK},
+                          rounds=args.rounds, min_round_time=args.min_round_time)
+        if IMPORT_BENCHMARK in suspects:
+            retries[IMPORT_BENCHMARK] = as_benchmark_stats(measure_import_time())
+        for name, retry in retries.items():
+            if retry["min_us"] < results[name]["min_us"]:
+                results[name] = retry
+        rows = compare(results, baseline, args.threshold)
+    print_report(rows)
+
+    if not args.no_history:
+        append_history(args.history, results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        # При частичном прогоне (-k) остальные записи baseline сохраняются
+        merged = dict(baseline["benchmarks"])
+        merged.update(results)
+        save_baseline(args.baseline, merged, baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = [row for row in rows if row["status"] == "REGRESSED"]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than the threshold.")
+        return 0 if args.no_fail else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
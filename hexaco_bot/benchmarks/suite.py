@@ -0,0 +1,291 @@
+"""
+Benchmark definitions.
+
+Each benchmark is a setup function registered in BENCHMARKS: it receives a BenchContext, builds its
+own fakes and returns a zero-argument callable that executes the measured hot path once, or a
+(run, teardown) pair when every call must start from the same state (teardown is not timed).
+Importing this module requires USER_REPORTS_DIR/USER_PROFILES_DIR to be configured, see run.py.
+"""
+
+import json
+import random
+import functools
+import itertools
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from hexaco_bot.benchmarks.fakes import (
+    TEST_SPECS, FakeBot, InMemoryDatabaseManager, make_user, make_responses, make_callback,
+)
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.session.session_manager import SessionManager
+from hexaco_bot.src.handlers.question_handler import QuestionHandler
+
+BENCH_USER_ID = 900000001
+BENCH_USERNAME = "bench_user"
+
+
+@dataclass
+class BenchContext:
+    """Shared knobs for all benchmarks."""
+    background_users: int = 200  # сколько "чужих" пользователей с полным набором результатов лежит в БД
+    seed: int = 42
+
+
+BENCHMARKS: Dict[str, Callable[[BenchContext], Any]] = {}
+
+
+def benchmark(name: str):
+    """Registers a setup function under the given benchmark name."""
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def _register_per_test_type(prefix: str, setup):
+    for test_type in TEST_SPECS:
+        BENCHMARKS[f"{prefix}[{test_type}]"] = functools.partial(setup, test_type=test_type)
+
+
+_templates: Dict[tuple, InMemoryDatabaseManager] = {}
+
+
+def _background_template(ctx: BenchContext) -> InMemoryDatabaseManager:
+    """
+    Builds (once per context settings) a DB filled with other users' results, so that queries run
+    against a realistically sized table. Benchmarks get their own copy via the SQLite backup API.
+    """
+    key = (ctx.background_users, ctx.seed)
+    if key in _templates:
+        return _templates[key]
+    db = InMemoryDatabaseManager()
+    db.initialize_database()
+    rng = random.Random(ctx.seed)
+    for i in range(ctx.background_users):
+        user_id = 100000000 + i
+        make_user(db, user_id)
+        session_id = f"background-{user_id}"
+        db.create_test_session(session_id, user_id)
+        for test_type in TEST_SPECS:
+            responses = make_responses(test_type, rng)
+            db.save_test_result(session_id, user_id, test_type, {"score": rng.random()}, json.dumps(responses))
+    _templates[key] = db
+    return db
+
+
+def _build_handler(ctx: BenchContext):
+    """Fresh in-memory DB + fake bot + real SessionManager/QuestionHandler with one registered user."""
+    db = InMemoryDatabaseManager()
+    db.copy_from(_background_template(ctx))
+    bot = FakeBot()
+    session_manager = SessionManager(db)
+    handler = QuestionHandler(bot, db, session_manager)
+    make_user(db, BENCH_USER_ID, BENCH_USERNAME)
+    session = session_manager.get_or_create_session(BENCH_USER_ID)
+    return bot, db, session_manager, handler, session
+
+
+def _checked(bot: FakeBot, run: Callable[[], Any]) -> Callable[[], Any]:
+    """Runs the hot path once and fails fast if the handler reported an error to the user."""
+    bot.reset()
+    run()
+    errors = [text for text in bot.sent_texts() if text.startswith("❌") or "ошибка" in text.lower()]
+    if errors:
+        raise RuntimeError(f"Benchmark setup is not exercising the happy path, bot replied: {errors[0]!r}")
+    return run
+
+
+def _delete_bench_results(db: InMemoryDatabaseManager):
+    """Teardown for paths that insert results: keeps the table size constant between calls."""
+    def teardown():
+        with db.get_connection() as conn:
+            conn.execute("DELETE FROM result_scales WHERE result_id IN (SELECT rowid FROM results WHERE user_id = ?)",
+                         (BENCH_USER_ID,))
+            aggregates.remove_results(conn, [BENCH_USER_ID])
+            conn.execute("DELETE FROM results WHERE user_id = ?", (BENCH_USER_ID,))
+            conn.execute("UPDATE users SET completed_tests_mask = 0 WHERE user_id = ?", (BENCH_USER_ID,))
+        db.user_cache.update(BENCH_USER_ID, lambda user: dict(user, completed_tests_mask=0))
+    return teardown
+
+
+def _show_question(ctx: BenchContext, test_type: str):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    session.current_test_type = test_type
+    return _checked(bot, lambda: handler._show_question(BENCH_USER_ID, BENCH_USER_ID, 2, test_type))
+
+
+def _answer_callback(ctx: BenchContext, test_type: str):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    session.current_test_type = test_type
+    _, values = TEST_SPECS[test_type]
+    # Ответ на первый вопрос: сохранение ответа + показ второго вопроса
+    call = make_callback(BENCH_USER_ID, f"answer_{test_type}_1_{values[0]}")
+    return _checked(bot, lambda: handler._handle_answer_callback(call))
+
+
+def _complete_test_part(ctx: BenchContext, test_type: str):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    session.current_test_type = test_type
+    session.responses[test_type] = make_responses(test_type, random.Random(ctx.seed))
+    run = _checked(bot, lambda: handler._complete_test_part(BENCH_USER_ID, BENCH_USER_ID, test_type))
+    return run, _delete_bench_results(db)
+
+
+_register_per_test_type("handler.show_question", _show_question)
+_register_per_test_type("handler.answer_callback", _answer_callback)
+_register_per_test_type("handler.complete_test_part", _complete_test_part)
+
+
+@benchmark("handler.start_test_flow")
+def _start_test_flow(ctx: BenchContext):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    rng = random.Random(ctx.seed)
+    # Пользователь прошел часть тестов: меню выбора следующего теста
+    for test_type in ('hexaco', 'sds'):
+        db.save_test_result(session.session_id, BENCH_USER_ID, test_type, {"score": 1.0},
+                            json.dumps(make_responses(test_type, rng)))
+    return _checked(bot, lambda: handler._start_test_flow(BENCH_USER_ID, BENCH_USER_ID, "Bench"))
+
+
+@benchmark("db.save_test_result")
+def _db_save_test_result(ctx: BenchContext):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    responses_json = json.dumps(make_responses('hexaco', random.Random(ctx.seed)))
+    scores = {
+        'honesty_humility': 3.1, 'emotionality': 2.9, 'extraversion': 3.4, 'agreeableness': 3.0,
+        'conscientiousness': 3.8, 'openness': 3.6, 'altruism': 3.2,
+    }
+
+    def run():
+        if not db.save_test_result(session.session_id, BENCH_USER_ID, 'hexaco', scores, responses_json):
+            raise RuntimeError("save_test_result failed")
+    return run, _delete_bench_results(db)
+
+
+@benchmark("db.get_user_data_for_report")
+def _db_get_user_data_for_report(ctx: BenchContext):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    rng = random.Random(ctx.seed)
+    for test_type in TEST_SPECS:
+        db.save_test_result(session.session_id, BENCH_USER_ID, test_type, {"score": 1.0},
+                            json.dumps(make_responses(test_type, rng)))
+
+    def run():
+        report = db.get_user_data_for_report(BENCH_USER_ID)
+        if not report or len(report['tests']) != len(TEST_SPECS):
+            raise RuntimeError("get_user_data_for_report returned incomplete data")
+    return run
+
+
+@benchmark("handler.show_overall_results_menu")
+def _show_overall_results_menu(ctx: BenchContext):
+    bot, db, session_manager, handler, session = _build_handler(ctx)
+    rng = random.Random(ctx.seed)
+    for test_type in TEST_SPECS:
+        for _ in range(3):
+            db.save_test_result(session.session_id, BENCH_USER_ID, test_type, {"score": 1.0},
+                                json.dumps(make_responses(test_type, rng)))
+    return _checked(bot, lambda: handler.show_overall_results_menu(BENCH_USER_ID, BENCH_USER_ID))
+
+
+@benchmark("scoring.hexaco.calculate_scores")
+def _hexaco_calculate_scores(ctx: BenchContext):
+    from hexaco_bot.src.scoring.hexaco_scorer import HEXACOScorer
+    scorer = HEXACOScorer()
+    responses = make_responses('hexaco', random.Random(ctx.seed))
+    return lambda: scorer.calculate_scores(responses)
+
+
+@benchmark("scoring.hexaco.validate_responses")
+def _hexaco_validate_responses(ctx: BenchContext):
+    from hexaco_bot.src.scoring.hexaco_scorer import HEXACOScorer
+    scorer = HEXACOScorer()
+    responses = make_responses('hexaco', random.Random(ctx.seed))
+
+    def run():
+        if scorer.validate_responses(responses):
+            raise RuntimeError("valid responses reported as invalid")
+    return run
+
+
+@benchmark("scoring.svs.calculate_scores")
+def _svs_calculate_scores(ctx: BenchContext):
+    from hexaco_bot.src.scoring.svs_scorer import SVSScorer
+    scorer = SVSScorer()
+    responses = make_responses('svs', random.Random(ctx.seed))
+    return lambda: scorer.calculate_scores(responses)
+
+
+SVS_BATCH_SIZE = 1000
+
+
+@benchmark(f"scoring.svs.calculate_scores_batch[{SVS_BATCH_SIZE}]")
+def _svs_calculate_scores_batch(ctx: BenchContext):
+    from hexaco_bot.src.scoring.svs_scorer import SVSScorer
+    scorer = SVSScorer()
+    rng = random.Random(ctx.seed)
+    batch = [make_responses('svs', rng) for _ in range(SVS_BATCH_SIZE)]
+    return lambda: scorer.calculate_scores_batch(batch)
+
+
+@benchmark(f"scoring.svs.score_matrix[{SVS_BATCH_SIZE}]")
+def _svs_score_matrix(ctx: BenchContext):
+    import numpy as np
+    from hexaco_bot.src.scoring.svs_scorer import SVSScorer, QUESTION_NUMBERS
+    scorer = SVSScorer()
+    rng = random.Random(ctx.seed)
+    answers = np.array([[responses[q_id] for q_id in QUESTION_NUMBERS]
+                        for responses in (make_responses('svs', rng) for _ in range(SVS_BATCH_SIZE))])
+    return lambda: scorer.score_matrix(answers)
+
+
+SIMILARITY_USERS = 100_000
+_similarity_indexes: Dict[tuple, Any] = {}
+
+
+def _similarity_index(ctx: BenchContext):
+    """An index of SIMILARITY_USERS random profiles (a fifth without SVS), built once per seed."""
+    if ctx.seed in _similarity_indexes:
+        return _similarity_indexes[ctx.seed]
+    import numpy as np
+    from hexaco_bot.src.data.similarity import SimilarityIndex, HEXACO_SCALES
+    rng = np.random.default_rng(ctx.seed)
+    index = SimilarityIndex(db_path='')
+    hexaco = rng.uniform(1, 5, (SIMILARITY_USERS, len(HEXACO_SCALES)))
+    svs = rng.normal(0, 1.2, (SIMILARITY_USERS, index.dimensions - len(HEXACO_SCALES)))
+    svs[rng.random(SIMILARITY_USERS) < 0.2] = np.nan
+    index.load(list(range(1, SIMILARITY_USERS + 1)), np.hstack([hexaco, svs]))
+    _similarity_indexes[ctx.seed] = index
+    return index
+
+
+def _similarity_query(ctx: BenchContext, metric: str):
+    index = _similarity_index(ctx)
+    user_ids = random.Random(ctx.seed).sample(range(1, SIMILARITY_USERS + 1), 64)
+    queries = itertools.cycle(user_ids)
+    return lambda: index.query(next(queries), 10, metric)
+
+
+BENCHMARKS[f"similarity.query[cosine,{SIMILARITY_USERS}]"] = functools.partial(_similarity_query, metric='cosine')
+BENCHMARKS[f"similarity.query[euclidean,{SIMILARITY_USERS}]"] = functools.partial(_similarity_query, metric='euclidean')
+
+
+@benchmark(f"similarity.add[{SIMILARITY_USERS}]")
+def _similarity_add(ctx: BenchContext):
+    index = _similarity_index(ctx)
+    rng = random.Random(ctx.seed)
+    values = {feature: rng.uniform(1, 5) for feature in index.features}
+    # Обновление уже проиндексированного пользователя: размер индекса между вызовами не меняется
+    return lambda: index.add(rng.randint(1, SIMILARITY_USERS), values)
+
+
+@benchmark("archetypes.nearest[k=8]")
+def _archetypes_nearest(ctx: BenchContext):
+    from hexaco_bot.src.data.archetypes import ARCHETYPE_FEATURES, ArchetypeModel
+    rng = random.Random(ctx.seed)
+    dimensions = len(ARCHETYPE_FEATURES)
+    model = ArchetypeModel(ARCHETYPE_FEATURES, [0.0] * dimensions, [1.0] * dimensions,
+                           [[rng.gauss(0, 1) for _ in range(dimensions)] for _ in range(8)], [""] * 8)
+    values = {feature: rng.gauss(0, 1) for feature in ARCHETYPE_FEATURES}
+    return lambda: model.nearest(model.standardize(values))
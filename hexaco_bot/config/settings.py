@@ -17,12 +17,108 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN environment variable is required")
 
+# telebot worker threads handling updates in this process
+BOT_THREADS = int(os.getenv('BOT_THREADS', 2))
+# getUpdates long-poll duration; bounds how long stopping the polling takes on shutdown
+POLLING_TIMEOUT_SECONDS = int(os.getenv('POLLING_TIMEOUT_SECONDS', 10))
+# SIGTERM/SIGINT: time to finish handlers in progress and save state before the process exits
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv('SHUTDOWN_TIMEOUT_SECONDS', 30))
+
 # Database Configuration
 DATABASE_PATH = os.getenv('DATABASE_PATH', './data/hexaco_bot.db')
+# Schema migrations: rows per batch, pause between batches, backup directory (default: <db dir>/backups)
+MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', 500))
+MIGRATION_BATCH_PAUSE_MS = float(os.getenv('MIGRATION_BATCH_PAUSE_MS', 20))
+MIGRATION_BACKUP_DIR = os.getenv('MIGRATION_BACKUP_DIR', '')
+# Hot backups: snapshot every BACKUP_INTERVAL_HOURS (0 disables), keep the newest BACKUP_KEEP_LAST
+# plus one per day for BACKUP_KEEP_DAILY days; the copy goes BACKUP_PAGES_PER_STEP pages at a time
+BACKUP_DIR = os.getenv('BACKUP_DIR', '')
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', 6))
+BACKUP_KEEP_LAST = int(os.getenv('BACKUP_KEEP_LAST', 8))
+BACKUP_KEEP_DAILY = int(os.getenv('BACKUP_KEEP_DAILY', 7))
+BACKUP_PAGES_PER_STEP = int(os.getenv('BACKUP_PAGES_PER_STEP', 256))
+BACKUP_STEP_SLEEP_MS = float(os.getenv('BACKUP_STEP_SLEEP_MS', 5))
+# Columnar export for analysts (src/data/export.py), default: <db dir>/exports
+EXPORT_DIR = os.getenv('EXPORT_DIR', '')
+
+# In-process cache of users rows in front of DatabaseManager.get_user (size 0 or TTL 0 disables it)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 4096))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 300))
+
+# How often users.completed_tests_mask is checked against results (hours, 0 disables the job)
+COMPLETED_TESTS_RECONCILE_HOURS = float(os.getenv('COMPLETED_TESTS_RECONCILE_HOURS', 24))
+
+# How often every bot process reads admin_events written by admin scripts, e.g. src/data/purge.py
+# (seconds, 0 disables: deleted users' sessions then stay in memory until they expire)
+ADMIN_EVENTS_POLL_SECONDS = float(os.getenv('ADMIN_EVENTS_POLL_SECONDS', 5))
+
+# Retention job (src/data/retention.py): how often it runs (hours, 0 disables), newest reports kept per
+# user (0 keeps all), age in days after which unfinished test sessions expire (0 keeps them), whether
+# profiles of users missing from the database are removed (1 - yes, off by default)
+RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', 24))
+RETENTION_REPORTS_PER_USER = int(os.getenv('RETENTION_REPORTS_PER_USER', 3))
+RETENTION_SESSION_DAYS = float(os.getenv('RETENTION_SESSION_DAYS', 30))
+RETENTION_ORPHAN_PROFILES = bool(int(os.getenv('RETENTION_ORPHAN_PROFILES', 0)))
+# Sessions per transaction and pages per PRAGMA incremental_vacuum step
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 500))
+RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', 1024))
+
+# Where SessionManager keeps sessions: memory - only in this process, sqlite - shared file SESSION_STORE_PATH
+# (required when several worker processes serve the bot, see src/cluster/launcher.py)
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', './data/sessions.db')
+
+# Multi-process mode: the launcher sets WORKER_INDEX for each worker; worker i accepts updates from the
+# front on WORKER_BASE_PORT + i. CLUSTER_INTAKE: polling (front calls getUpdates) or webhook
+WORKER_INDEX = int(os.getenv('WORKER_INDEX')) if os.getenv('WORKER_INDEX') else None
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', 2))
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', 9200))
+CLUSTER_INTAKE = os.getenv('CLUSTER_INTAKE', 'polling')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # публичный адрес для setWebhook; пусто - webhook уже настроен
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Background jobs (backups, reconciliation, online migrations, file watcher) run only in the worker
+# holding this lease; another worker takes over if the leader does not renew it in time
+LEADER_LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS', 30))
+# Bot API base URL override in telebot format, e.g. http://127.0.0.1:8081/bot{0}/{1} (local server, load tests)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')
+
+# Reports and psychoprofiles directories (absolute by default, overridable e.g. for load tests)
+USER_REPORTS_DIR = os.getenv('USER_REPORTS_DIR', os.path.join(project_dir, 'user_reports'))
+USER_PROFILES_DIR = os.getenv('USER_PROFILES_DIR', os.path.join(project_dir, 'user_profile'))
 
 # Logging Configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE = os.getenv('LOG_FILE', './logs/bot.log')
+# queue - запись логов в отдельном потоке (QueueHandler/QueueListener), sync - прямо в потоке обработчика
+LOG_MODE = os.getenv('LOG_MODE', 'queue')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_INTERVAL_HOURS = float(os.getenv('LOG_ROTATE_INTERVAL_HOURS', 24))
+# Доля сохраняемых DEBUG/INFO записей для шумных логгеров: "logger.name=0.1,other.logger=0.5"
+LOG_SAMPLING = os.getenv('LOG_SAMPLING', 'hexaco_bot.src.session.session_manager.responses=0.1')
+
+# Metrics endpoint (Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables it)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
+# Tracing: jsonl - трейсы в TRACE_JSONL_PATH, otlp - OTLP/HTTP JSON на TRACE_OTLP_ENDPOINT, none - выключено.
+# Экспортируются трейсы медленнее TRACE_SLOW_MS плюс случайная доля TRACE_SAMPLE_RATE остальных
+TRACE_EXPORT = os.getenv('TRACE_EXPORT', 'jsonl')
+TRACE_JSONL_PATH = os.getenv('TRACE_JSONL_PATH', './logs/traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 1000))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 0.0))
+
+# Administrators (comma-separated Telegram user ids) allowed to use service commands like /profile
+ADMIN_USER_IDS = {int(x) for x in os.getenv('ADMIN_USER_IDS', '').replace(' ', '').split(',') if x}
+
+# Runtime profiler (/profile command, SIGUSR1): output directory, default window and sampling interval
+PROFILE_DIR = os.getenv('PROFILE_DIR', './logs/profiles')
+PROFILE_DEFAULT_SECONDS = float(os.getenv('PROFILE_DEFAULT_SECONDS', 30))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))
 
 # ChatGPT API Configuration
 CHATGPT_API_KEY = os.getenv('CHATGPT_API_KEY')
@@ -9,6 +9,15 @@ import sys
 import os
 from datetime import datetime
 
+# Корень проекта (родитель hexaco_bot) в sys.path, чтобы импортировать hexaco_bot.src.*
+PROJECT_GRANDPARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_GRANDPARENT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_GRANDPARENT_DIR)
+
+from hexaco_bot.config.settings import DATABASE_PATH
+from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.data.purge import purge_users
+
 def delete_test_data(user_id, test_name):
     """
     Удаляет данные конкретного теста для пользователя из таблицы results
@@ -17,14 +26,15 @@ def delete_test_data(user_id, test_name):
         user_id (int): ID пользователя Telegram
         test_name (str): Название теста (hexaco, cdrisc, pid5bfm, panas, rfq, sds, self_efficacy, svs, urica, dweck)
     """
-    db_path = "data/hexaco_bot.db"
+    db_path = DATABASE_PATH
     
     if not os.path.exists(db_path):
         print(f"❌ База данных не найдена: {db_path}")
         return False
     
+    # Автокоммит: purge_users сам открывает и фиксирует транзакции пачек
+    conn = sqlite3.connect(db_path, isolation_level=None)
     try:
-        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
         # Проверяем, существует ли таблица results
@@ -53,10 +63,12 @@ def delete_test_data(user_id, test_name):
                 print("❌ Операция отменена")
                 return False
         
-        # Удаляем данные
-        cursor.execute("DELETE FROM results WHERE user_id = ? AND test_type = ?", (user_id, test_name))
-        deleted_count = cursor.rowcount
-        conn.commit()
+        # Удаляем через purge_users: значения шкал, счетчики прохождений и маска пройденных тестов
+        # обновляются вместе с results, а работающий бот сбросит сессию и кэш пользователя
+        if not DatabaseManager(db_path).initialize_database(run_online_migrations=False):
+            print(f"❌ Не удалось обновить схему базы данных")
+            return False
+        deleted_count = purge_users(conn, [user_id], test_name).rows['results']
         
         # Проверяем результат
         cursor.execute("SELECT COUNT(*) FROM results WHERE user_id = ? AND test_type = ?", (user_id, test_name))
@@ -78,7 +90,7 @@ def delete_test_data(user_id, test_name):
 
 def show_user_tests(user_id):
     """Показывает все тесты пользователя"""
-    db_path = "data/hexaco_bot.db"
+    db_path = DATABASE_PATH
     
     if not os.path.exists(db_path):
         print(f"❌ База данных не найдена: {db_path}")
@@ -115,7 +127,7 @@ def show_user_tests(user_id):
 
 def show_test_details(user_id, test_name):
     """Показывает детали конкретного теста"""
-    db_path = "data/hexaco_bot.db"
+    db_path = DATABASE_PATH
     
     try:
         conn = sqlite3.connect(db_path)
@@ -147,14 +159,15 @@ def show_test_details(user_id, test_name):
 
 def backup_database():
     """Создает резервную копию базы данных"""
-    db_path = "data/hexaco_bot.db"
+    db_path = DATABASE_PATH
     
     if not os.path.exists(db_path):
         print(f"❌ База данных не найдена: {db_path}")
         return False
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = f"data/hexaco_bot_backup_{timestamp}.db"
+    name, ext = os.path.splitext(os.path.basename(db_path))
+    backup_path = os.path.join(os.path.dirname(db_path), f"{name}_backup_{timestamp}{ext}")
     
     try:
         conn = sqlite3.connect(db_path)
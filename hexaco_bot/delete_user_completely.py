@@ -1,7 +1,15 @@
 import sqlite3
 import sys
 import os
-from pathlib import Path
+
+# Корень проекта (родитель hexaco_bot) в sys.path, чтобы импортировать hexaco_bot.src.*
+PROJECT_GRANDPARENT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_GRANDPARENT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_GRANDPARENT_DIR)
+
+from hexaco_bot.config.settings import DATABASE_PATH, USER_REPORTS_DIR, USER_PROFILES_DIR
+from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.data.purge import purge_users
 
 def delete_user_completely(user_id):
     """
@@ -11,17 +19,15 @@ def delete_user_completely(user_id):
     Args:
         user_id (int): ID пользователя Telegram
     """
-    db_path = "data/hexaco_bot.db"
+    db_path = DATABASE_PATH
     
-    # Таблицы для очистки (правильная структура БД)
-    tables_to_clean = [
-        "users",
-        "test_sessions", 
-        "results"
-    ]
+    if not os.path.exists(db_path):
+        print(f"❌ База данных не найдена: {db_path}")
+        return
     
+    # Автокоммит: purge_users сам открывает и фиксирует транзакции пачек
+    conn = sqlite3.connect(db_path, isolation_level=None)
     try:
-        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
         # Получаем информацию о пользователе для подтверждения
@@ -41,21 +47,18 @@ def delete_user_completely(user_id):
             print("❌ Удаление отменено")
             return
         
-        # Удаление из всех таблиц
-        total_deleted = 0
-        for table in tables_to_clean:
-            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (user_id,))
-            count = cursor.fetchone()[0]
-            
+        # Удаление через purge_users (для многих пользователей: python -m hexaco_bot.src.data.purge):
+        # таблицы, счетчики, файлы отчетов и профиля, сброс сессии в работающем боте
+        if not DatabaseManager(db_path).initialize_database(run_online_migrations=False):
+            print("❌ Не удалось обновить схему базы данных")
+            return
+        result = purge_users(conn, [user_id], reports_dir=USER_REPORTS_DIR, profiles_dir=USER_PROFILES_DIR)
+        for table, count in result.rows.items():
             if count > 0:
-                cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
                 print(f"✅ Удалено {count} записей из таблицы {table}")
-                total_deleted += count
-        
-        conn.commit()
-        
-        # Удаление связанных файлов
-        delete_user_files(user_id, username)
+        for path in result.files:
+            print(f"🗑️  Удален файл: {path}")
+        total_deleted = sum(result.rows.values())
         
         print(f"🎉 Пользователь {user_id} полностью удален! Всего удалено записей: {total_deleted}")
         print("📝 Теперь пользователь начнет с самого начала при следующем /start")
@@ -65,37 +68,11 @@ def delete_user_completely(user_id):
     finally:
         conn.close()
 
-def delete_user_files(user_id, username):
-    """Удаляет файлы отчетов и профилей пользователя"""
-    
-    # Удаление файлов отчетов
-    reports_dir = Path("user_reports")
-    if reports_dir.exists():
-        # Поиск файлов отчетов по username
-        if username:
-            safe_username = "".join(c if c.isalnum() else "_" for c in str(username))
-            for report_file in reports_dir.glob(f"report_{safe_username}_*.json"):
-                try:
-                    report_file.unlink()
-                    print(f"🗑️  Удален файл отчета: {report_file}")
-                except Exception as e:
-                    print(f"⚠️  Не удалось удалить файл отчета {report_file}: {e}")
-    
-    # Удаление файлов профилей
-    profiles_dir = Path("user_profile")
-    if profiles_dir.exists():
-        profile_file = profiles_dir / f"{user_id}_profile.json"
-        if profile_file.exists():
-            try:
-                profile_file.unlink()
-                print(f"🗑️  Удален файл профиля: {profile_file}")
-            except Exception as e:
-                print(f"⚠️  Не удалось удалить файл профиля {profile_file}: {e}")
-
 def main():
     if len(sys.argv) != 2:
         print("Использование: python delete_user_completely.py <user_id>")
         print("Пример: python delete_user_completely.py 456355303")
+        print("Много пользователей сразу: python -m hexaco_bot.src.data.purge --users <id> ... [--dry-run]")
         sys.exit(1)
     
     try:
@@ -0,0 +1,3 @@
+"""
+Local load-testing tools: a fake Telegram Bot API server and a virtual-user load generator.
+"""
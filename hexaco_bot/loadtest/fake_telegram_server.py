@@ -0,0 +1,255 @@
+"""
+Fake Telegram Bot API server for local load testing.
+
+Implements the subset of the Bot API used by HEXACOBot (getUpdates, sendMessage,
+editMessageText, deleteMessage, answerCallbackQuery, sendDocument plus getMe and the
+webhook housekeeping calls made by telebot) with configurable latency and 429 injection.
+
+Point telebot at it with:
+    telebot.apihelper.API_URL = server.api_url
+
+Updates are injected in-process through FakeTelegramState.push_message/push_callback,
+see load_generator.py.
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1000000001, "is_bot": True, "first_name": "FakeHexacoBot", "username": "fake_hexaco_bot"}
+
+# Methods that may be answered with an injected 429 (getUpdates is excluded so polling keeps running)
+THROTTLED_METHODS = {"sendMessage", "editMessageText", "deleteMessage", "answerCallbackQuery", "sendDocument"}
+
+
+class FakeTelegramState:
+    """In-memory state of the fake Bot API: pending updates, sent messages and call statistics."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._cond = threading.Condition()
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._next_callback_id = 1
+        self.listeners: List[Callable[[str, int, Dict[str, Any]], None]] = []
+        self.calls = Counter()
+        self.errors_injected = Counter()
+
+    # --- Client side (virtual users) ---
+
+    def push_message(self, user: Dict[str, Any], text: str) -> int:
+        """Queues an incoming text message from a user and returns its update_id."""
+        message = {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": text,
+        }
+        if text.startswith('/'):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return self._push_update({"message": message})
+
+    def push_callback(self, user: Dict[str, Any], message: Dict[str, Any], data: str) -> int:
+        """Queues a callback query (inline button press) on a previously sent bot message."""
+        with self._cond:
+            callback_id = str(self._next_callback_id)
+            self._next_callback_id += 1
+        callback = {
+            "id": callback_id,
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "message": message,
+            "data": data,
+        }
+        return self._push_update({"callback_query": callback})
+
+    def _push_update(self, payload: Dict[str, Any]) -> int:
+        with self._cond:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            payload["update_id"] = update_id
+            self._updates.append(payload)
+            self._cond.notify_all()
+        return update_id
+
+    def _new_message_id(self) -> int:
+        with self._cond:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        return message_id
+
+    # --- Bot side (HTTP API) ---
+
+    def get_updates(self, offset: int = 0, limit: int = 100, timeout: float = 0) -> List[Dict[str, Any]]:
+        """Long-polls for updates, confirming (dropping) everything below offset like Telegram does."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return list(self._updates[:limit])
+
+    def handle(self, method: str, params: Dict[str, Any]):
+        """
+        Executes an API method.
+
+        Returns:
+            (http_status, response_body) tuple.
+        """
+        self.calls[method] += 1
+        if method != "getUpdates":
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                time.sleep(delay)
+            if method in THROTTLED_METHODS and self.error_rate and self._random.random() < self.error_rate:
+                self.errors_injected[method] += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+
+        if method == "getUpdates":
+            updates = self.get_updates(
+                offset=int(params.get("offset") or 0),
+                limit=int(params.get("limit") or 100),
+                timeout=float(params.get("timeout") or 0),
+            )
+            return 200, {"ok": True, "result": updates}
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+        if method in ("deleteWebhook", "setWebhook"):
+            return 200, {"ok": True, "result": True}
+        if method == "getWebhookInfo":
+            return 200, {"ok": True, "result": {"url": "", "has_custom_certificate": False, "pending_update_count": 0}}
+        if method in ("sendMessage", "sendDocument", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            message = {
+                "message_id": int(params["message_id"]) if method == "editMessageText" else self._new_message_id(),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+            }
+            if method == "sendDocument":
+                message["document"] = {"file_id": f"doc{message['message_id']}", "file_unique_id": f"u{message['message_id']}"}
+                if params.get("caption"):
+                    message["caption"] = params["caption"]
+            else:
+                message["text"] = params.get("text", "")
+            reply_markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+            if reply_markup and "inline_keyboard" in reply_markup:
+                message["reply_markup"] = reply_markup
+            # Telegram echoes only inline keyboards in Message objects; listeners still see any markup
+            self._notify(method, chat_id, dict(message, reply_markup=reply_markup) if reply_markup else message)
+            return 200, {"ok": True, "result": message}
+        if method == "deleteMessage":
+            self._notify(method, int(params["chat_id"]), {"message_id": int(params["message_id"])})
+            return 200, {"ok": True, "result": True}
+        if method == "answerCallbackQuery":
+            return 200, {"ok": True, "result": True}
+
+        return 404, {"ok": False, "error_code": 404, "description": f"Not Found: method {method} is not implemented by the fake server"}
+
+    def _notify(self, method: str, chat_id: int, message: Dict[str, Any]):
+        for listener in self.listeners:
+            try:
+                listener(method, chat_id, message)
+            except Exception as e:
+                logger.error(f"Fake server listener failed for {method}: {e}")
+
+
+class _BotApiRequestHandler(BaseHTTPRequestHandler):
+    """Routes /bot<token>/<method> requests to FakeTelegramState."""
+
+    state: FakeTelegramState = None  # set on the subclass created by FakeTelegramServer
+
+    def _dispatch(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            return
+
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if body and content_type.startswith('application/x-www-form-urlencoded'):
+            params.update({k: v[-1] for k, v in parse_qs(body.decode('utf-8')).items()})
+        elif body and content_type.startswith('application/json'):
+            params.update(json.loads(body))
+        # multipart (sendDocument) body is read and discarded: only the query params matter
+
+        try:
+            status, payload = self.state.handle(parts[1], params)
+        except (KeyError, ValueError) as e:
+            status, payload = 400, {"ok": False, "error_code": 400, "description": f"Bad Request: {e}"}
+        self._reply(status, payload)
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class FakeTelegramServer:
+    """Threaded HTTP server wrapping FakeTelegramState."""
+
+    def __init__(self, state: Optional[FakeTelegramState] = None, host: str = '127.0.0.1', port: int = 0):
+        self.state = state or FakeTelegramState()
+        handler_class = type('BoundBotApiRequestHandler', (_BotApiRequestHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self) -> str:
+        """Value for telebot.apihelper.API_URL."""
+        return self.base_url + "/bot{0}/{1}"
+
+    def start(self) -> 'FakeTelegramServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-telegram-api", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Telegram Bot API listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
@@ -0,0 +1,379 @@
+"""
+Load generator for HEXACOBot.
+
+Starts the fake Telegram Bot API server, runs a real HEXACOBot instance against it with a
+throwaway database and report directories, and drives N virtual users through registration
+and all eight instruments. Reports updates/sec, p50/p99 handler latency (update pushed ->
+first bot reply), per-method DatabaseManager timings and SQLite lock errors.
+
+With --workers N the bot runs as a cluster instead (src/cluster/launcher.py in a subprocess: N worker
+processes behind the polling front, sessions in a shared SQLite store); DB method timings are then
+not collected and lock errors are counted from the worker logs.
+
+Usage (from the repository root):
+    python -m hexaco_bot.loadtest.load_generator --users 20 --latency-ms 30 --error-rate 0.01
+    python -m hexaco_bot.loadtest.load_generator --users 20 --workers 3
+"""
+
+import os
+import sys
+import time
+import queue
+import glob
+import random
+import socket
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+import functools
+import subprocess
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+project_grandparent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_grandparent_dir not in sys.path:
+    sys.path.insert(0, project_grandparent_dir)
+
+from hexaco_bot.loadtest.fake_telegram_server import FakeTelegramServer, FakeTelegramState
+
+logger = logging.getLogger(__name__)
+
+# Bot texts the virtual user reacts to
+GENDER_BUTTON_TEXT = "👨 Мужской"
+NAME_PROMPT_MARKER = "введите ваше имя и фамилию"
+PAEI_PROMPT_MARKER = "введите ваш PAEI-индекс"
+NEXT_TEST_MARKER = "начать следующий тест командой /test"
+ALL_DONE_MARKER = "Вы завершили все доступные тесты"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class VirtualUser(threading.Thread):
+    """Simulates one Telegram user clicking through registration and every test."""
+
+    def __init__(self, index: int, state: FakeTelegramState, seed: int, reply_timeout: float, deadline: float):
+        super().__init__(name=f"vuser-{index}", daemon=True)
+        self.user = {
+            "id": 500000000 + index,
+            "is_bot": False,
+            "first_name": f"Load{index}",
+            "username": f"load_user_{index}",
+        }
+        self.state = state
+        self.random = random.Random(seed + index)
+        self.reply_timeout = reply_timeout
+        self.deadline = deadline
+        self.inbox: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.latencies: List[float] = []
+        self.updates_sent = 0
+        self.stalls = 0
+        self.registered = False
+        self.done = False
+        self._pushed_at: Optional[float] = None
+
+    def deliver(self, message: Dict[str, Any]):
+        """Called from the fake server thread for every message the bot sends to this chat."""
+        if self._pushed_at is not None:
+            self.latencies.append(time.perf_counter() - self._pushed_at)
+            self._pushed_at = None
+        self.inbox.put(message)
+
+    def _send_text(self, text: str):
+        self.updates_sent += 1
+        self._pushed_at = time.perf_counter()
+        self.state.push_message(self.user, text)
+
+    def _click(self, message: Dict[str, Any], data: str):
+        self.updates_sent += 1
+        self._pushed_at = time.perf_counter()
+        self.state.push_callback(self.user, message, data)
+
+    def run(self):
+        self._send_text("/start")
+        while not self.done and time.monotonic() < self.deadline:
+            try:
+                message = self.inbox.get(timeout=self.reply_timeout)
+            except queue.Empty:
+                # Сообщение потерялось (например, из-за инъекции 429) - ведем себя как живой пользователь
+                self.stalls += 1
+                self._send_text("/test" if self.registered else "/start")
+                continue
+            self._react(message)
+
+    def _react(self, message: Dict[str, Any]):
+        text = message.get("text") or ""
+        markup = message.get("reply_markup") or {}
+
+        if ALL_DONE_MARKER in text:
+            self.done = True
+            return
+        if NEXT_TEST_MARKER in text:
+            self._send_text("/test")
+            return
+
+        inline_rows = markup.get("inline_keyboard")
+        if inline_rows:
+            buttons = [b for row in inline_rows for b in row if b.get("callback_data")]
+            answers = [b for b in buttons if b["callback_data"].startswith("answer_")]
+            if answers:
+                self._click(message, self.random.choice(answers)["callback_data"])
+                return
+            flow = [b for b in buttons if b["callback_data"].startswith(("start_", "select_test_"))]
+            if flow:
+                self._click(message, flow[0]["callback_data"])
+                return
+            # Клавиатура MBTI: callback_data - это сам тип
+            self.registered = True
+            self._click(message, self.random.choice(buttons)["callback_data"])
+            return
+
+        if markup.get("keyboard"):
+            self._send_text(GENDER_BUTTON_TEXT)
+        elif NAME_PROMPT_MARKER in text:
+            self._send_text(f"Нагрузка Пользователь{self.user['id']}")
+        elif PAEI_PROMPT_MARKER in text:
+            self._send_text("PAEI")
+
+
+def _instrument_database(db, timings: Dict[str, List[float]], lock: threading.Lock):
+    """Wraps every public DatabaseManager method on this instance to record call durations."""
+    for name in dir(db):
+        if name.startswith('_') or name == 'get_connection':
+            continue
+        method = getattr(db, name)
+        if not callable(method):
+            continue
+
+        def make_wrapper(method_name, original):
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        timings[method_name].append(elapsed)
+            return wrapper
+
+        setattr(db, name, make_wrapper(name, method))
+
+
+class _LockErrorCounter(logging.Handler):
+    """Counts log records that report SQLite lock contention."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if "database is locked" in record.getMessage():
+            self.count += 1
+
+
+def _free_port_range(count: int) -> int:
+    """First port of `count` consecutive ports that are free right now."""
+    for _ in range(50):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            base = probe.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            sockets = []
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(('127.0.0.1', port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError("No free port range for cluster workers")
+
+
+def _start_cluster(workers: int, num_threads: int, api_url: str, workdir: str) -> subprocess.Popen:
+    """Starts src/cluster/launcher.py against the fake server; settings go through the environment."""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [project_grandparent_dir, env.get("PYTHONPATH")])),
+        "TELEGRAM_API_URL": api_url,
+        "SESSION_STORE": "sqlite",
+        "SESSION_STORE_PATH": os.path.join(workdir, "sessions.db"),
+        "WORKER_BASE_PORT": str(_free_port_range(workers)),
+        "LEADER_LEASE_SECONDS": "5",
+        "BOT_THREADS": str(num_threads),
+    })
+    return subprocess.Popen([sys.executable, "-m", "hexaco_bot.src.cluster.launcher", "--workers", str(workers)],
+                            env=env)
+
+
+def _count_lock_errors_in_logs(workdir: str) -> int:
+    count = 0
+    for path in glob.glob(os.path.join(workdir, "bot*.log*")):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            count += sum(1 for line in f if "database is locked" in line)
+    return count
+
+
+def run_load_test(users: int = 10, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                  retry_after: int = 1, seed: int = 42, reply_timeout: float = 10.0, max_duration: float = 600.0,
+                  num_threads: int = 2, workdir: Optional[str] = None, workers: int = 0) -> Dict[str, Any]:
+    """Runs the scenario and returns a summary dict (also logged)."""
+    workdir = workdir or tempfile.mkdtemp(prefix="hexaco_loadtest_")
+    os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+    os.environ.setdefault("METRICS_PORT", "0")  # эндпоинт метрик не нужен, реестр доступен в процессе
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "loadtest.db")
+    os.environ["LOG_FILE"] = os.path.join(workdir, "bot.log")
+    os.environ.setdefault("TRACE_JSONL_PATH", os.path.join(workdir, "traces.jsonl"))
+    os.environ["USER_REPORTS_DIR"] = os.path.join(workdir, "user_reports")
+    os.environ["USER_PROFILES_DIR"] = os.path.join(workdir, "user_profile")
+
+    state = FakeTelegramState(latency=latency_ms / 1000, jitter=jitter_ms / 1000,
+                              error_rate=error_rate, retry_after=retry_after, seed=seed)
+    server = FakeTelegramServer(state).start()
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    lock_errors = _LockErrorCounter()
+    if workers:
+        bot = None
+        cluster = _start_cluster(workers, num_threads, server.api_url, workdir)
+    else:
+        import telebot
+        telebot.apihelper.API_URL = server.api_url
+
+        # Импорт после настройки окружения: settings читает переменные при импорте
+        from hexaco_bot.src.main import HEXACOBot
+
+        bot = HEXACOBot()
+        if bot.bot.threaded:
+            # TeleBot создает пул воркеров в конструкторе, поэтому для другого размера пул пересоздаем
+            bot.bot.worker_pool.close()
+            bot.bot.worker_pool = telebot.util.ThreadPool(bot.bot, num_threads=num_threads)
+        _instrument_database(bot.db, timings, threading.Lock())
+        logging.getLogger().addHandler(lock_errors)
+
+    deadline = time.monotonic() + max_duration
+    virtual_users = [VirtualUser(i, state, seed, reply_timeout, deadline) for i in range(users)]
+    by_chat = {vu.user["id"]: vu for vu in virtual_users}
+
+    def route(method, chat_id, message):
+        vu = by_chat.get(chat_id)
+        if vu is not None and method in ("sendMessage", "sendDocument"):
+            vu.deliver(message)
+
+    state.listeners.append(route)
+
+    if bot is not None:
+        polling = threading.Thread(
+            target=bot.bot.infinity_polling,
+            kwargs={"timeout": 5, "long_polling_timeout": 1, "logger_level": logging.ERROR},
+            name="bot-polling",
+            daemon=True,
+        )
+        polling.start()
+
+    started = time.perf_counter()
+    for vu in virtual_users:
+        vu.start()
+    for vu in virtual_users:
+        vu.join(timeout=max(0.0, deadline - time.monotonic()))
+    elapsed = time.perf_counter() - started
+
+    if bot is not None:
+        bot.bot.stop_polling()
+        logging.getLogger().removeHandler(lock_errors)
+    else:
+        cluster.send_signal(signal.SIGTERM)
+        try:
+            cluster.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            cluster.kill()
+        lock_errors.count = _count_lock_errors_in_logs(workdir)
+    server.stop()
+
+    latencies = [lat for vu in virtual_users for lat in vu.latencies]
+    updates = sum(vu.updates_sent for vu in virtual_users)
+    summary = {
+        "users": users,
+        "workers": workers,
+        "users_completed": sum(1 for vu in virtual_users if vu.done),
+        "updates": updates,
+        "elapsed_seconds": elapsed,
+        "updates_per_second": updates / elapsed if elapsed > 0 else 0.0,
+        "handler_latency_p50_ms": percentile(latencies, 50) * 1000,
+        "handler_latency_p99_ms": percentile(latencies, 99) * 1000,
+        "stalls": sum(vu.stalls for vu in virtual_users),
+        "api_calls": dict(state.calls),
+        "injected_429": dict(state.errors_injected),
+        "db_lock_errors": lock_errors.count,
+        "db_methods": {
+            name: {
+                "calls": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "total_ms": sum(values) * 1000,
+            }
+            for name, values in sorted(timings.items())
+        },
+        "workdir": workdir,
+    }
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print("--- Load Test Summary ---")
+    if summary.get("workers"):
+        print(f"Cluster workers: {summary['workers']}")
+    print(f"Users completed: {summary['users_completed']}/{summary['users']}")
+    print(f"Updates: {summary['updates']} in {summary['elapsed_seconds']:.2f}s "
+          f"({summary['updates_per_second']:.1f} updates/s)")
+    print(f"Handler latency: p50 {summary['handler_latency_p50_ms']:.1f} ms, p99 {summary['handler_latency_p99_ms']:.1f} ms")
+    print(f"Stalls (no reply within timeout): {summary['stalls']}")
+    print(f"API calls: {summary['api_calls']}")
+    print(f"Injected 429: {summary['injected_429']}")
+    print(f"SQLite 'database is locked' errors: {summary['db_lock_errors']}")
+    if summary["db_methods"]:
+        print("DB method timings:")
+    for name, stats in summary["db_methods"].items():
+        print(f"  {name:<32} calls={stats['calls']:<6} p50={stats['p50_ms']:.2f}ms "
+              f"p99={stats['p99_ms']:.2f}ms total={stats['total_ms']:.0f}ms")
+    print(f"Artifacts: {summary['workdir']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive HEXACOBot with virtual users against a fake Telegram API.")
+    parser.add_argument("--users", type=int, default=10, help="Number of virtual users.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake API base latency per call.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Fake API random extra latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected 429 on send/edit/delete calls.")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=2, help="telebot worker threads (per process).")
+    parser.add_argument("--workers", type=int, default=0, help="Run the bot as a cluster of N worker processes.")
+    parser.add_argument("--reply-timeout", type=float, default=10.0, help="Seconds a user waits for a reply before retrying.")
+    parser.add_argument("--max-duration", type=float, default=600.0, help="Hard limit for the whole run, seconds.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="Directory for the throwaway DB, logs and reports.")
+    args = parser.parse_args()
+
+    summary = run_load_test(
+        users=args.users, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        retry_after=args.retry_after, seed=args.seed, reply_timeout=args.reply_timeout,
+        max_duration=args.max_duration, num_threads=args.threads, workdir=args.workdir, workers=args.workers,
+    )
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Minimal OTLP/HTTP (JSON) collector stub for local tracing runs.
+
+Accepts POST /v1/traces with an ExportTraceServiceRequest JSON body, appends every span to a JSONL
+file and keeps simple counters. Not a real collector: protobuf payloads are rejected with 415.
+
+Usage (from the repository root):
+    python -m hexaco_bot.loadtest.otlp_collector_stub --port 4318 --output ./logs/otlp_spans.jsonl
+    TRACE_EXPORT=otlp TRACE_SAMPLE_RATE=1 python hexaco_bot/src/main.py
+"""
+
+import json
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def iter_spans(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Flattens resourceSpans/scopeSpans/spans of an OTLP JSON request."""
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            yield from scope_spans.get('spans', [])
+
+
+class _CollectorRequestHandler(BaseHTTPRequestHandler):
+    collector: 'OtlpCollectorStub' = None
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/traces':
+            self.send_error(404)
+            return
+        if 'json' not in (self.headers.get('Content-Type') or ''):
+            self.send_error(415, "Only OTLP/JSON is supported")
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error(400, "Invalid JSON")
+            return
+        self.collector.record(payload)
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("otlp-stub: " + format, *args)
+
+
+class OtlpCollectorStub:
+    """Threaded HTTP server that stores received spans."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 4318, output: Optional[str] = None):
+        self.output = output
+        self.requests = 0
+        self.spans = 0
+        self._lock = threading.Lock()
+        handler_class = type('BoundCollectorRequestHandler', (_CollectorRequestHandler,), {'collector': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/traces"
+
+    def record(self, payload: Dict[str, Any]):
+        spans = list(iter_spans(payload))
+        with self._lock:
+            self.requests += 1
+            self.spans += len(spans)
+            if self.output:
+                with open(self.output, 'a', encoding='utf-8') as f:
+                    for span in spans:
+                        f.write(json.dumps(span, ensure_ascii=False) + '\n')
+
+    def start(self) -> 'OtlpCollectorStub':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="otlp-collector-stub", daemon=True)
+        self._thread.start()
+        logger.info(f"OTLP collector stub listening on {self.endpoint}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive OTLP/JSON traces and write spans to a JSONL file.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default="otlp_spans.jsonl", help="File the received spans are appended to.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    collector = OtlpCollectorStub(args.host, args.port, args.output)
+    logger.info(f"OTLP collector stub listening on {collector.endpoint}, writing spans to {args.output}")
+    try:
+        collector.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.httpd.server_close()
+        logger.info(f"Received {collector.requests} requests, {collector.spans} spans")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 import os
 import sys
+import json
+import time
+import hashlib
 import logging
+import argparse
+from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # --- Path Setup ---
 # Определяем путь к текущему скрипту
 SCRIPT_DIR = Path(__file__).resolve().parent
 # Определяем корневую директорию проекта (предполагается, что scripts/ находится внутри hexaco_bot/, а hexaco_bot/ в корне проекта)
-PROJECT_ROOT = SCRIPT_DIR.parent.parent 
+PROJECT_ROOT = SCRIPT_DIR.parent.parent
 # Добавляем корневую директорию проекта в sys.path для корректного импорта модулей
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
@@ -30,6 +36,9 @@ PROFILES_DIR_NAME = "user_profile"
 REPORTS_DIR = PROJECT_ROOT / REPORTS_BASE_DIR_NAME / REPORTS_DIR_NAME
 PROFILES_DIR = PROJECT_ROOT / REPORTS_BASE_DIR_NAME / PROFILES_DIR_NAME
 
+# Манифест хранит состояние предыдущих запусков, чтобы повторный запуск обрабатывал только оставшиеся отчеты
+MANIFEST_FILENAME = ".backfill_manifest.json"
+
 # --- Logging Setup ---
 logging.basicConfig(
     level=logging.INFO,
@@ -41,49 +50,236 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def process_all_existing_reports():
-    """Processes all existing .json user reports to generate psychoprofiles."""
+def file_sha256(filepath: Path) -> str:
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    """Loads the checkpoint manifest, returning an empty one if it is missing or corrupt."""
+    if not manifest_path.exists():
+        return {"reports": {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get("reports"), dict):
+            return manifest
+        logger.warning(f"Manifest {manifest_path} has unexpected structure. Starting from scratch.")
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"Could not read manifest {manifest_path}: {e}. Starting from scratch.")
+    return {"reports": {}}
+
+
+def save_manifest(manifest: dict, manifest_path: Path):
+    """Atomically writes the checkpoint manifest (write to temp file, then replace)."""
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def read_report_user_id(report_filepath: Path):
+    """Reads the user_id stored in a report, falling back to the file stem like process_single_report_file does."""
+    try:
+        with open(report_filepath, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error(f"Could not read report {report_filepath.name}: {e}")
+        return None
+    if not isinstance(content, dict):
+        return None
+    return str(content.get("user_id", report_filepath.stem))
+
+
+def parse_since(value: str) -> float:
+    """argparse type: converts YYYY-MM-DD or an ISO timestamp into a POSIX timestamp."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid --since value '{value}'. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS.")
+
+
+def collect_candidates(reports_dir: Path, profiles_dir: Path, manifest: dict, since: float = None, force: bool = False):
+    """
+    Builds the list of reports that still need processing.
+
+    Only the newest report of each user is considered, because every run of the profiler
+    overwrites `<user_id>_profile.json`. A report is skipped as up to date when the manifest
+    has already recorded a successful run for the same content hash, or when the user's
+    profile file is newer than the report.
+
+    Returns:
+        (candidates, skipped) where candidates is a list of (report_path, user_id, sha256)
+        and skipped is a dict of skip reason -> count.
+    """
+    known = manifest["reports"]
+    skipped = {"up_to_date": 0, "superseded": 0, "before_since": 0, "unreadable": 0}
+    latest_per_user = {}
+
+    for report_filepath in reports_dir.glob("*.json"):
+        stat = report_filepath.stat()
+        if since is not None and stat.st_mtime < since:
+            skipped["before_since"] += 1
+            continue
+
+        entry = known.get(report_filepath.name)
+        sha256 = file_sha256(report_filepath)
+        # user_id берем из манифеста, если содержимое не менялось, чтобы не парсить JSON повторно
+        if entry and entry.get("sha256") == sha256 and entry.get("user_id"):
+            user_id = entry["user_id"]
+        else:
+            user_id = read_report_user_id(report_filepath)
+        if user_id is None:
+            skipped["unreadable"] += 1
+            continue
+
+        current = latest_per_user.get(user_id)
+        # При равных mtime (например, после git checkout) решает имя файла: в нем есть timestamp отчета
+        if current is None or (stat.st_mtime, report_filepath.name) > (current[3], current[0].name):
+            if current is not None:
+                skipped["superseded"] += 1
+            latest_per_user[user_id] = (report_filepath, user_id, sha256, stat.st_mtime)
+        else:
+            skipped["superseded"] += 1
+
+    candidates = []
+    for report_filepath, user_id, sha256, report_mtime in sorted(latest_per_user.values(), key=lambda c: (c[3], c[0].name)):
+        if not force:
+            entry = known.get(report_filepath.name)
+            profile_filepath = profiles_dir / f"{user_id}_profile.json"
+            if entry and entry.get("status") == "ok" and entry.get("sha256") == sha256:
+                skipped["up_to_date"] += 1
+                continue
+            if profile_filepath.exists() and profile_filepath.stat().st_mtime >= report_mtime:
+                skipped["up_to_date"] += 1
+                continue
+        candidates.append((report_filepath, user_id, sha256))
+
+    return candidates, skipped
+
+
+def _process_report(report_filepath: Path, profiles_dir: Path) -> bool:
+    """Pool worker: module-level so that it can be pickled by ProcessPoolExecutor."""
+    return process_single_report_file(report_filepath, profiles_dir)
+
+
+def process_all_existing_reports(workers: int = 4, executor: str = "thread", since: float = None,
+                                 limit: int = None, dry_run: bool = False, force: bool = False,
+                                 manifest_path: Path = None) -> dict:
+    """
+    Incrementally processes existing .json user reports to generate psychoprofiles.
+
+    Returns:
+        Summary dict with counters and throughput, or an empty dict if nothing could be started.
+    """
     logger.info(f"Starting processing of existing reports in: {REPORTS_DIR}")
     logger.info(f"Profiles will be saved to: {PROFILES_DIR}")
 
     if not REPORTS_DIR.exists() or not REPORTS_DIR.is_dir():
         logger.error(f"Reports directory {REPORTS_DIR} does not exist or is not a directory. Aborting.")
-        return
+        return {}
 
     # Создаем директорию для профилей, если она не существует
     PROFILES_DIR.mkdir(parents=True, exist_ok=True)
 
-    processed_files = 0
+    manifest_path = manifest_path or (PROFILES_DIR / MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+
+    started_at = time.perf_counter()
+    candidates, skipped = collect_candidates(REPORTS_DIR, PROFILES_DIR, manifest, since=since, force=force)
+    if limit is not None:
+        candidates = candidates[:limit]
+
+    logger.info(f"{len(candidates)} report(s) need processing. Skipped: {skipped}")
+
+    if dry_run:
+        for report_filepath, user_id, _ in candidates:
+            logger.info(f"[dry-run] Would process {report_filepath.name} (user {user_id})")
+        return {"candidates": len(candidates), "skipped": skipped, "dry_run": True}
+
     successful_processing = 0
     failed_processing = 0
 
-    report_files = list(REPORTS_DIR.glob("*.json"))
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    if candidates:
+        with pool_class(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(_process_report, report_filepath, PROFILES_DIR): (report_filepath, user_id, sha256)
+                for report_filepath, user_id, sha256 in candidates
+            }
+            for future in as_completed(futures):
+                report_filepath, user_id, sha256 = futures[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    logger.error(f"Worker crashed on {report_filepath.name}: {e}")
+                    success = False
 
-    if not report_files:
-        logger.info("No .json report files found to process.")
-        return
+                if success:
+                    logger.info(f"Successfully processed and generated profile for: {report_filepath.name}")
+                    successful_processing += 1
+                else:
+                    logger.error(f"Failed to process report file: {report_filepath.name}")
+                    failed_processing += 1
 
-    logger.info(f"Found {len(report_files)} .json files to process.")
+                # Чекпоинт после каждого файла: при сбое повторный запуск продолжит с оставшихся
+                manifest["reports"][report_filepath.name] = {
+                    "sha256": sha256,
+                    "user_id": user_id,
+                    "status": "ok" if success else "failed",
+                    "processed_at": datetime.now().isoformat(timespec='seconds'),
+                }
+                save_manifest(manifest, manifest_path)
+
+    elapsed = time.perf_counter() - started_at
+    attempted = successful_processing + failed_processing
+    throughput = attempted / elapsed if elapsed > 0 else 0.0
 
-    for report_filepath in report_files:
-        logger.info(f"--- Processing file: {report_filepath.name} ---")
-        processed_files += 1
-        # Передаем абсолютный путь к директории профилей
-        success = process_single_report_file(report_filepath, PROFILES_DIR) 
-        if success:
-            logger.info(f"Successfully processed and generated profile for: {report_filepath.name}")
-            successful_processing += 1
-        else:
-            logger.error(f"Failed to process report file: {report_filepath.name}")
-            failed_processing += 1
-        logger.info("-------------------------------------")
-    
     logger.info("--- Batch Processing Summary ---")
-    logger.info(f"Total files found: {len(report_files)}")
-    logger.info(f"Files attempted to process: {processed_files}")
+    logger.info(f"Files attempted to process: {attempted}")
     logger.info(f"Successfully processed: {successful_processing}")
     logger.info(f"Failed to process: {failed_processing}")
+    logger.info(f"Skipped: {skipped}")
+    logger.info(f"Elapsed: {elapsed:.2f}s, throughput: {throughput:.2f} reports/s ({executor} pool, {workers} workers)")
     logger.info("Batch processing complete.")
 
+    return {
+        "attempted": attempted,
+        "successful": successful_processing,
+        "failed": failed_processing,
+        "skipped": skipped,
+        "elapsed_seconds": elapsed,
+        "reports_per_second": throughput,
+    }
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Incremental backfill of psychoprofiles from existing user reports.")
+    parser.add_argument("--workers", type=int, default=4, help="Pool size (default: 4).")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Pool type. Profile generation is network-bound, so threads are the default.")
+    parser.add_argument("--since", type=parse_since, default=None,
+                        help="Only consider reports modified at or after this date (YYYY-MM-DD or ISO timestamp).")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most N reports in this run.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the reports that would be processed.")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and profile mtimes, reprocess everything.")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help=f"Checkpoint manifest path (default: {PROFILES_DIR / MANIFEST_FILENAME}).")
+    return parser
+
+
 if __name__ == "__main__":
-    process_all_existing_reports() 
\ No newline at end of file
+    args = build_arg_parser().parse_args()
+    process_all_existing_reports(
+        workers=args.workers,
+        executor=args.executor,
+        since=args.since,
+        limit=args.limit,
+        dry_run=args.dry_run,
+        force=args.force,
+        manifest_path=args.manifest,
+    )
@@ -0,0 +1,4 @@
+"""
+Multi-process deployment: an intake front that partitions updates by user id across worker processes,
+and leader election for jobs that must run in exactly one of them.
+"""
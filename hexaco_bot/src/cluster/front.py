@@ -0,0 +1,214 @@
+"""
+Update intake for a multi-process deployment.
+
+The front is the only process that talks to Telegram for incoming updates: it long-polls getUpdates
+(or receives webhook POSTs) and forwards every update to worker `user_id % N` over local HTTP. All
+updates of one user go to the same worker, in order, so a user's session is never changed by two
+processes at once. Each worker has its own queue and sender thread: a slow or restarting worker does
+not hold up the others, and its updates wait in the queue (with retries) until it is back.
+
+On shutdown the front first stops taking updates from Telegram (stop_intake), then waits until every
+update already taken is accepted by its worker (drain), and only then are the workers stopped.
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_FORWARD_BATCH = 100
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Sender of a raw update (message, callback_query, ...); chat id if there is no sender."""
+    for key, payload in update.items():
+        if key == 'update_id' or not isinstance(payload, dict):
+            continue
+        sender = payload.get('from') or payload.get('user')
+        if isinstance(sender, dict) and 'id' in sender:
+            return sender['id']
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def worker_for(update: Dict[str, Any], workers: int) -> int:
+    user_id = update_user_id(update)
+    return user_id % workers if user_id is not None else 0
+
+
+class _WorkerChannel:
+    """Queue and sender thread forwarding updates to one worker's UpdateReceiver."""
+
+    def __init__(self, index: int, url: str, retry_delay: float = 0.2, max_retry_delay: float = 5.0):
+        self.index = index
+        self.url = url
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.forwarded = 0
+        self.failures = 0
+        self.busy = False  # пачка взята из очереди, но еще не принята воркером
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"front-worker-{index}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self._thread.join(timeout=timeout)
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            self.busy = True
+            while len(batch) < MAX_FORWARD_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(batch)
+            finally:
+                self.busy = False
+
+    @property
+    def idle(self) -> bool:
+        return not self.busy and self.queue.empty()
+
+    def _deliver(self, batch: List[Dict[str, Any]]):
+        body = json.dumps(batch, ensure_ascii=False).encode('utf-8')
+        delay = self.retry_delay
+        while not self._stop_event.is_set():
+            request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+                self.forwarded += len(batch)
+                return
+            except (urllib.error.URLError, OSError) as e:
+                # Воркер перезапускается или перегружен: повторяем ту же пачку, порядок сохраняется
+                self.failures += 1
+                logger.warning(f"Worker {self.index} did not accept {len(batch)} update(s): {e}; retrying in {delay:.1f}s")
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        logger.error(f"Front stopped with {len(batch) + self.queue.qsize()} update(s) undelivered to worker {self.index}")
+
+
+class UpdateFront:
+    """Routes raw Telegram updates to `len(worker_urls)` workers by user id."""
+
+    def __init__(self, worker_urls: List[str]):
+        self.channels = [_WorkerChannel(i, url) for i, url in enumerate(worker_urls)]
+        self._stop_event = threading.Event()
+        self._webhook: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> 'UpdateFront':
+        for channel in self.channels:
+            channel.start()
+        return self
+
+    def dispatch(self, updates: List[Dict[str, Any]]):
+        for update in updates:
+            self.channels[worker_for(update, len(self.channels))].queue.put(update)
+
+    def poll(self, token: str, long_polling_timeout: int = 20, allowed_updates: Optional[List[str]] = None):
+        """Long-polls getUpdates until stop(); blocks the calling thread."""
+        from telebot import apihelper
+
+        offset = None
+        error_delay = 1.0
+        logger.info(f"Front polling Telegram for {len(self.channels)} worker(s)")
+        while not self._stop_event.is_set():
+            try:
+                updates = apihelper.get_updates(token, offset=offset, limit=100, timeout=long_polling_timeout + 5,
+                                                allowed_updates=allowed_updates,
+                                                long_polling_timeout=long_polling_timeout)
+                error_delay = 1.0
+            except Exception as e:
+                logger.error(f"getUpdates failed: {e}")
+                self._stop_event.wait(error_delay)
+                error_delay = min(error_delay * 2, 30.0)
+                continue
+            if updates:
+                self.dispatch(updates)
+                # Подтверждаем обновления только после того, как они разложены по очередям воркеров
+                offset = updates[-1]['update_id'] + 1
+        if offset is not None:
+            # Последнюю пачку подтверждаем явно, иначе после перезапуска Telegram пришлет ее снова
+            try:
+                apihelper.get_updates(token, offset=offset, limit=1, timeout=5, long_polling_timeout=0)
+            except Exception as e:
+                logger.error(f"Failed to confirm the last updates: {e}")
+        logger.info("Front stopped polling")
+
+    def serve_webhook(self, host: str, port: int, path: str, secret_token: Optional[str] = None):
+        """Receives Telegram webhook POSTs on http://host:port/path until stop(); blocks the calling thread."""
+        front = self
+
+        class _WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split('?')[0] != path:
+                    self.send_error(404)
+                    return
+                if secret_token and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+                    self.send_error(403)
+                    return
+                try:
+                    update = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                except ValueError:
+                    self.send_error(400)
+                    return
+                front.dispatch([update])
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+        self._webhook = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._webhook.daemon_threads = True
+        logger.info(f"Front receiving webhook updates on http://{host}:{port}{path} for {len(self.channels)} worker(s)")
+        self._webhook.serve_forever()
+
+    def stop_intake(self):
+        """Stops taking updates from Telegram; poll() returns after the long poll in progress."""
+        self._stop_event.set()
+        if self._webhook is not None:
+            self._webhook.shutdown()
+            self._webhook.server_close()
+            self._webhook = None
+
+    def drain(self, timeout: float) -> bool:
+        """Waits until every queued update has been accepted by its worker; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(channel.idle for channel in self.channels):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self, drain_timeout: float = 0.0):
+        self.stop_intake()
+        if drain_timeout and not self.drain(drain_timeout):
+            logger.warning(f"Front drain timed out: {self.stats()}")
+        for channel in self.channels:
+            channel.stop()
+
+    def stats(self) -> Dict[int, Dict[str, int]]:
+        return {channel.index: {'forwarded': channel.forwarded, 'queued': channel.queue.qsize(),
+                                'failures': channel.failures}
+                for channel in self.channels}
@@ -0,0 +1,262 @@
+"""
+Runs the bot as N worker processes behind one update intake.
+
+The launcher applies the blocking schema migrations once, starts N copies of src/main.py with
+WORKER_INDEX=0..N-1 (sessions in the shared SESSION_STORE_PATH file, each worker with its own log file
+and metrics port), restarts workers that exit, and runs the front (front.py) that polls Telegram or
+receives webhooks and partitions updates by user_id % N. Online migrations, backups and other
+background jobs run in whichever worker holds the leader lease (leader.py).
+
+SIGTERM/SIGINT stop the intake, wait until the front has handed every taken update to its worker and
+then stop the workers, each of which finishes its handlers and saves its sessions (see
+HEXACOBot.shutdown). SIGHUP restarts the workers one at a time (rolling restart, e.g. after a deploy):
+updates for a restarting worker wait in the front's queue.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.cluster.launcher --workers 4
+    python -m hexaco_bot.src.cluster.launcher --workers 4 --intake webhook
+"""
+
+import os
+import sys
+import time
+import signal
+import sqlite3
+import logging
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+project_grandparent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+if project_grandparent_dir not in sys.path:
+    sys.path.insert(0, project_grandparent_dir)
+
+from hexaco_bot.config.settings import (
+    BOT_TOKEN, DATABASE_PATH, LOG_LEVEL, LOG_FILE, LOG_MODE, METRICS_PORT, SESSION_STORE,
+    CLUSTER_WORKERS, WORKER_BASE_PORT, CLUSTER_INTAKE, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+    WEBHOOK_URL, WEBHOOK_SECRET, TELEGRAM_API_URL, SHUTDOWN_TIMEOUT_SECONDS, POLLING_TIMEOUT_SECONDS
+)
+from hexaco_bot.src.cluster.front import UpdateFront
+from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.utils.logging_setup import configure_logging
+
+logger = logging.getLogger(__name__)
+
+RESTART_BACKOFF_MAX = 30.0
+# Воркер, проработавший столько секунд, снова перезапускается без задержки
+HEALTHY_UPTIME = 60.0
+
+
+def suffixed_path(path: str, suffix: str) -> str:
+    """./logs/bot.log + worker0 -> ./logs/bot.worker0.log"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{suffix}{ext}"
+
+
+def prepare_database(db_path: str) -> bool:
+    """Blocking migrations once, before any worker starts, and WAL so workers read while one writes."""
+    db = DatabaseManager(db_path)
+    if not db.initialize_database(run_online_migrations=False):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        # Режим WAL сохраняется в файле базы: читатели из других процессов не ждут писателя
+        mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        logger.info(f"Database {db_path} journal mode: {mode}")
+    finally:
+        conn.close()
+    return True
+
+
+class WorkerProcess:
+    def __init__(self, index: int, env: Dict[str, str]):
+        self.index = index
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.next_start_at = 0.0
+        self.started_at = 0.0
+        self.restarting = False  # перезапуск идет через WorkerPool.rolling_restart, супервизор не вмешивается
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{WORKER_BASE_PORT + self.index}/update"
+
+    def start(self):
+        # Своя группа процессов: Ctrl+C в терминале получает только лаунчер, он и останавливает воркеры
+        self.process = subprocess.Popen([sys.executable, '-m', 'hexaco_bot.src.main'], env=self.env,
+                                        start_new_session=True)
+        self.started_at = time.monotonic()
+        logger.info(f"Worker {self.index} started (pid {self.process.pid})")
+
+    def terminate(self, timeout: float) -> Optional[int]:
+        """SIGTERM and wait for the graceful shutdown; killed if it takes longer than `timeout`."""
+        if self.process is None:
+            return None
+        if self.process.poll() is None:
+            self.process.terminate()
+        try:
+            return self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Worker {self.index} did not exit in {timeout:.0f}s, killing it")
+            self.process.kill()
+            return self.process.wait()
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_ready():
+                return True
+            if self.process is not None and self.process.poll() is not None:
+                return False
+            time.sleep(0.2)
+        return False
+
+    def is_ready(self) -> bool:
+        try:
+            with urllib.request.urlopen(self.url[:-len('/update')] + '/health', timeout=1) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+
+class WorkerPool:
+    """Starts the worker processes and restarts the ones that exit until stop()."""
+
+    def __init__(self, workers: int):
+        self.workers = [WorkerProcess(i, self._worker_env(i, workers)) for i in range(workers)]
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _worker_env(index: int, workers: int) -> Dict[str, str]:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_grandparent_dir, env.get('PYTHONPATH')]))
+        env['WORKER_INDEX'] = str(index)
+        env['CLUSTER_WORKERS'] = str(workers)
+        env['LOG_FILE'] = suffixed_path(LOG_FILE, f"worker{index}")
+        env['METRICS_PORT'] = str(METRICS_PORT + index if METRICS_PORT else 0)
+        if SESSION_STORE == 'memory':
+            # Сессии в памяти процесса не видны другим воркерам
+            env['SESSION_STORE'] = 'sqlite'
+        return env
+
+    @property
+    def urls(self) -> List[str]:
+        return [worker.url for worker in self.workers]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+        self._thread.start()
+
+    def wait_ready(self, timeout: float = 60.0) -> bool:
+        deadline = time.monotonic() + timeout
+        pending = [worker for worker in self.workers if not worker.wait_ready(max(0.0, deadline - time.monotonic()))]
+        if pending:
+            logger.warning(f"Workers not ready after {timeout:.0f}s: {[worker.index for worker in pending]}")
+        return not pending
+
+    def _supervise(self):
+        while not self._stop_event.wait(1.0):
+            for worker in self.workers:
+                if worker.restarting or worker.process is None or worker.process.poll() is None:
+                    continue
+                if worker.next_start_at == 0.0:
+                    if time.monotonic() - worker.started_at > HEALTHY_UPTIME:
+                        worker.restarts = 0
+                    delay = min(2 ** worker.restarts, RESTART_BACKOFF_MAX)
+                    worker.next_start_at = time.monotonic() + delay
+                    logger.error(f"Worker {worker.index} exited with code {worker.process.returncode}, "
+                                 f"restarting in {delay:.0f}s")
+                elif time.monotonic() >= worker.next_start_at:
+                    worker.restarts += 1
+                    worker.next_start_at = 0.0
+                    worker.start()
+
+    def rolling_restart(self, timeout: float):
+        """Restarts the workers one by one, each after the previous one is accepting updates again."""
+        logger.info("Rolling restart of workers")
+        for worker in self.workers:
+            worker.restarting = True
+            try:
+                worker.terminate(timeout)
+                worker.start()
+                if not worker.wait_ready(60.0):
+                    logger.error(f"Worker {worker.index} is not ready after restart, stopping the rolling restart")
+                    return
+            finally:
+                worker.restarting = False
+        logger.info("Rolling restart finished")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        # SIGTERM всем сразу: воркеры завершают обработчики параллельно
+        for worker in self.workers:
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.terminate(max(0.1, deadline - time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several worker processes behind one update intake.")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS, help="Number of worker processes.")
+    parser.add_argument("--intake", choices=("polling", "webhook"), default=CLUSTER_INTAKE)
+    args = parser.parse_args()
+
+    configure_logging(level=LOG_LEVEL, log_file=suffixed_path(LOG_FILE, "front"), mode=LOG_MODE)
+    if TELEGRAM_API_URL:
+        from telebot import apihelper
+        apihelper.API_URL = TELEGRAM_API_URL
+
+    if not prepare_database(DATABASE_PATH):
+        logger.error("Failed to initialize database")
+        return 1
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    pool.wait_ready()
+    front = UpdateFront(pool.urls).start()
+
+    stop_event = threading.Event()
+    restart_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: restart_event.set())
+    if args.intake == 'webhook':
+        if WEBHOOK_URL:
+            from telebot import apihelper
+            apihelper.set_webhook(BOT_TOKEN, WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None)
+        intake = threading.Thread(target=front.serve_webhook, name="front-intake", daemon=True,
+                                  args=(WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET or None))
+    else:
+        intake = threading.Thread(target=front.poll, args=(BOT_TOKEN, POLLING_TIMEOUT_SECONDS),
+                                  name="front-intake", daemon=True)
+    intake.start()
+    logger.info(f"Cluster running: {args.workers} worker(s), {args.intake} intake")
+
+    while not stop_event.wait(1.0):
+        if restart_event.is_set():
+            restart_event.clear()
+            pool.rolling_restart(SHUTDOWN_TIMEOUT_SECONDS + 5)
+
+    logger.info("Stopping cluster: intake first, then workers")
+    front.stop_intake()
+    intake.join(POLLING_TIMEOUT_SECONDS + 10)
+    front.stop(drain_timeout=SHUTDOWN_TIMEOUT_SECONDS)
+    logger.info(f"Front stats: {front.stats()}")
+    pool.stop(SHUTDOWN_TIMEOUT_SECONDS + 5)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+"""
+Single-leader election between bot processes on one machine.
+
+Every candidate tries to take a named lease row in a shared SQLite file; the holder renews it every
+lease/3 seconds, and a lease that was not renewed for `lease_seconds` can be taken over by another
+process. Acquire and renew are one conditional UPSERT, so two processes can never both hold it.
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """Holds the lease `name` while possible; calls on_elected/on_lost from its own thread."""
+
+    def __init__(self, path: str, name: str, lease_seconds: float = 30.0,
+                 on_elected: Optional[Callable[[], None]] = None, on_lost: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leader_leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def try_acquire(self) -> bool:
+        """Takes or renews the lease; returns whether this process holds it now."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO leader_leases (name, holder, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                    WHERE leader_leases.holder = excluded.holder OR leader_leases.expires_at < ?
+                ''', (self.name, self.holder, now + self.lease_seconds, now))
+                return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logger.error(f"Leader lease '{self.name}' check failed: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def release(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM leader_leases WHERE name = ? AND holder = ?', (self.name, self.holder))
+        except sqlite3.Error as e:
+            logger.error(f"Failed to release leader lease '{self.name}': {e}")
+        finally:
+            conn.close()
+
+    def start(self) -> threading.Thread:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 10.0):
+        """Stops campaigning; a leader runs on_lost and gives the lease up for the next candidate."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        if self.is_leader:
+            self._set_leader(False)
+            self.release()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self._set_leader(self.try_acquire())
+            # Лидер продлевает аренду заранее, остальные проверяют ее примерно с той же частотой
+            self._stop_event.wait(self.lease_seconds / 3)
+
+    def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        callback = self.on_elected if leader else self.on_lost
+        logger.info(f"{'Acquired' if leader else 'Lost'} leader lease '{self.name}' ({self.holder})")
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Leader {'election' if leader else 'loss'} callback for '{self.name}' failed: {e}")
@@ -0,0 +1,106 @@
+"""
+Worker side of a multi-process deployment: accepts updates forwarded by the front (front.py).
+
+POST /update takes a JSON list of raw Telegram updates and hands them to TeleBot.process_new_updates,
+exactly as polling would; GET /health answers 200 while the worker is up. Once stop() is called new
+batches get 503 (the front keeps them and retries), and stop() returns only after the batches already
+accepted have been handed to the bot, so a shutdown drain never misses one.
+"""
+
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _UpdateRequestHandler(BaseHTTPRequestHandler):
+    receiver = None  # set on the subclass created by UpdateReceiver
+
+    def do_POST(self):
+        from telebot.types import Update
+
+        if self.path.split('?')[0] != '/update':
+            self.send_error(404)
+            return
+        if not self.receiver.enter():
+            self.send_error(503)
+            return
+        try:
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+                updates = [Update.de_json(update) for update in payload]
+            except (ValueError, TypeError, KeyError) as e:
+                logger.error(f"Rejected malformed update batch: {e}")
+                self.send_error(400)
+                return
+            self.receiver.bot.process_new_updates(updates)
+        finally:
+            self.receiver.exit()
+        self._reply(200, b'{"ok":true}')
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/health':
+            self.send_error(404)
+            return
+        self._reply(200, b'{"ok":true}')
+
+    def _reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class UpdateReceiver:
+    """Serves /update for one TeleBot instance from a daemon thread."""
+
+    def __init__(self, bot, host: str = '127.0.0.1', port: int = 0):
+        self.bot = bot
+        handler_class = type('BoundUpdateRequestHandler', (_UpdateRequestHandler,), {'receiver': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._accepting = True
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        with self._lock:
+            if not self._accepting:
+                return False
+            self._active += 1
+            return True
+
+    def exit(self):
+        with self._lock:
+            self._active -= 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/update"
+
+    def start(self) -> 'UpdateReceiver':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="update-receiver", daemon=True)
+        self._thread.start()
+        logger.info(f"Worker accepting updates on {self.url}")
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            self._accepting = False
+        deadline = time.monotonic() + timeout
+        while self._active and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -0,0 +1,199 @@
+"""
+Materialized completion counters, so menus and statistics never count rows of `results`.
+
+    user_test_counts        (user_id, test_type) -> completions, first/last completion, last result_id
+    test_completion_counts  test_type -> completions, users who completed it at least once
+    daily_completions       (day, test_type) -> completions on that day (UTC, like results.created_at)
+
+record_completion() updates all three in the transaction that inserts the result (see
+DatabaseManager.save_test_result); reading a user's counts is a primary key range lookup and the
+global counts are a table of one row per instrument. Code that deletes results calls
+remove_results() in the same transaction before the DELETE. add_results() counts a rowid range of existing results (the
+migration fills the tables with it, batch by batch). reconcile() recomputes the counters from
+`results` and writes only the rows that differ: it repairs them after results were changed behind the
+bot's back.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+AGGREGATE_TABLES = ('user_test_counts', 'test_completion_counts', 'daily_completions')
+
+
+def create_tables(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_test_counts (
+            user_id INTEGER NOT NULL,
+            test_type TEXT NOT NULL,
+            completions INTEGER NOT NULL,
+            first_completed_at TIMESTAMP,
+            last_completed_at TIMESTAMP,
+            last_result_id INTEGER,
+            PRIMARY KEY (user_id, test_type)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS test_completion_counts (
+            test_type TEXT PRIMARY KEY,
+            completions INTEGER NOT NULL,
+            users INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_completions (
+            day TEXT NOT NULL,
+            test_type TEXT NOT NULL,
+            completions INTEGER NOT NULL,
+            PRIMARY KEY (day, test_type)
+        ) WITHOUT ROWID
+    ''')
+
+
+def record_completion(conn: sqlite3.Connection, user_id: int, test_type: str, result_id: int, created_at: str):
+    """Counts the just inserted result `result_id` (created at `created_at`); runs in the caller's transaction."""
+    # Счетчик после upsert равен 1 - первое прохождение теста пользователем
+    completions = conn.execute('''
+        INSERT INTO user_test_counts (user_id, test_type, completions, first_completed_at, last_completed_at, last_result_id)
+        VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT(user_id, test_type) DO UPDATE SET completions = completions + 1,
+            last_completed_at = excluded.last_completed_at, last_result_id = excluded.last_result_id
+        RETURNING completions
+    ''', (user_id, test_type, created_at, created_at, result_id)).fetchone()[0]
+    conn.execute('''
+        INSERT INTO test_completion_counts (test_type, completions, users) VALUES (?, 1, ?)
+        ON CONFLICT(test_type) DO UPDATE SET completions = completions + 1, users = users + excluded.users
+    ''', (test_type, int(completions == 1)))
+    conn.execute('''
+        INSERT INTO daily_completions (day, test_type, completions) VALUES (date(?), ?, 1)
+        ON CONFLICT(day, test_type) DO UPDATE SET completions = completions + 1
+    ''', (created_at, test_type))
+
+
+def add_results(conn: sqlite3.Connection, first_rowid: int, last_rowid: int):
+    """
+    Counts the results with first_rowid < rowid <= last_rowid on top of what the counters hold;
+    runs in the caller's transaction. Merges with completions recorded meanwhile by record_completion.
+    """
+    pairs = conn.execute('''
+        SELECT user_id, test_type, COUNT(*), MIN(created_at), MAX(created_at), MAX(rowid) FROM results
+        WHERE rowid > ? AND rowid <= ? GROUP BY user_id, test_type
+    ''', (first_rowid, last_rowid)).fetchall()
+    totals: Dict[str, List[int]] = {}
+    for user_id, test_type, count, _, _, _ in pairs:
+        new_user = conn.execute('SELECT 1 FROM user_test_counts WHERE user_id = ? AND test_type = ?',
+                                (user_id, test_type)).fetchone() is None
+        total = totals.setdefault(test_type, [0, 0])
+        total[0] += count
+        total[1] += int(new_user)
+    conn.executemany('''
+        INSERT INTO user_test_counts (user_id, test_type, completions, first_completed_at, last_completed_at, last_result_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, test_type) DO UPDATE SET completions = completions + excluded.completions,
+            first_completed_at = COALESCE(MIN(first_completed_at, excluded.first_completed_at),
+                                          first_completed_at, excluded.first_completed_at),
+            last_completed_at = COALESCE(MAX(last_completed_at, excluded.last_completed_at),
+                                         last_completed_at, excluded.last_completed_at),
+            last_result_id = MAX(last_result_id, excluded.last_result_id)
+    ''', pairs)
+    conn.executemany('''
+        INSERT INTO test_completion_counts (test_type, completions, users) VALUES (?, ?, ?)
+        ON CONFLICT(test_type) DO UPDATE SET completions = completions + excluded.completions,
+            users = users + excluded.users
+    ''', [(test_type, completions, users) for test_type, (completions, users) in totals.items()])
+    conn.execute('''
+        INSERT INTO daily_completions (day, test_type, completions)
+        SELECT date(created_at), test_type, COUNT(*) FROM results
+        WHERE rowid > ? AND rowid <= ? AND created_at IS NOT NULL GROUP BY 1, 2
+        ON CONFLICT(day, test_type) DO UPDATE SET completions = completions + excluded.completions
+    ''', (first_rowid, last_rowid))
+
+
+def remove_results(conn: sqlite3.Connection, user_ids: Iterable[int], test_type: Optional[str] = None):
+    """
+    Takes all results of `user_ids` (of one test type, if given) out of the counters. Call it in the
+    transaction that deletes those results, before the DELETE.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), 500):
+        batch = user_ids[start:start + 500]
+        where = f"user_id IN ({', '.join('?' for _ in batch)})" + (" AND test_type = ?" if test_type else "")
+        params = (*batch, test_type) if test_type else tuple(batch)
+        daily = conn.execute(f'''
+            SELECT date(created_at), test_type, COUNT(*) FROM results
+            WHERE {where} AND created_at IS NOT NULL GROUP BY 1, 2
+        ''', params).fetchall()
+        conn.executemany('UPDATE daily_completions SET completions = completions - ? WHERE day = ? AND test_type = ?',
+                         [(count, day, row_test_type) for day, row_test_type, count in daily])
+        totals = conn.execute(f'''
+            SELECT test_type, COUNT(*), COUNT(DISTINCT user_id) FROM results WHERE {where} GROUP BY test_type
+        ''', params).fetchall()
+        conn.executemany('''
+            UPDATE test_completion_counts SET completions = completions - ?, users = users - ? WHERE test_type = ?
+        ''', [(count, users, row_test_type) for row_test_type, count, users in totals])
+        conn.execute(f'DELETE FROM user_test_counts WHERE {where}', params)
+    conn.execute('DELETE FROM daily_completions WHERE completions <= 0')
+    conn.execute('DELETE FROM test_completion_counts WHERE completions <= 0')
+
+
+def _expected(conn: sqlite3.Connection) -> Dict[str, Dict[tuple, tuple]]:
+    return {
+        'user_test_counts': {row[:2]: tuple(row[2:]) for row in conn.execute('''
+            SELECT user_id, test_type, COUNT(*), MIN(created_at), MAX(created_at), MAX(result_id)
+            FROM results GROUP BY user_id, test_type
+        ''')},
+        'test_completion_counts': {row[:1]: tuple(row[1:]) for row in conn.execute('''
+            SELECT test_type, COUNT(*), COUNT(DISTINCT user_id) FROM results GROUP BY test_type
+        ''')},
+        'daily_completions': {row[:2]: tuple(row[2:]) for row in conn.execute('''
+            SELECT date(created_at), test_type, COUNT(*) FROM results WHERE created_at IS NOT NULL GROUP BY 1, 2
+        ''')},
+    }
+
+
+_KEYS = {
+    'user_test_counts': (('user_id', 'test_type'),
+                         ('completions', 'first_completed_at', 'last_completed_at', 'last_result_id')),
+    'test_completion_counts': (('test_type',), ('completions', 'users')),
+    'daily_completions': (('day', 'test_type'), ('completions',)),
+}
+
+
+def reconcile(conn: sqlite3.Connection) -> int:
+    """Makes the counters match `results`; returns the number of rows written or deleted (caller commits)."""
+    changed = 0
+    for table, expected in _expected(conn).items():
+        key_columns, value_columns = _KEYS[table]
+        actual = {row[:len(key_columns)]: tuple(row[len(key_columns):]) for row in conn.execute(
+            f"SELECT {', '.join(key_columns + value_columns)} FROM {table}")}
+        stale = [key for key in actual if key not in expected]
+        upserts = [key + values for key, values in expected.items() if actual.get(key) != values]
+        conn.executemany(f"DELETE FROM {table} WHERE {' AND '.join(f'{c} = ?' for c in key_columns)}", stale)
+        conn.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(key_columns + value_columns)}) "
+                         f"VALUES ({', '.join('?' for _ in key_columns + value_columns)})", upserts)
+        changed += len(stale) + len(upserts)
+    return changed
+
+
+def user_test_counts(conn: sqlite3.Connection, user_id: int) -> Dict[str, int]:
+    return dict(conn.execute('SELECT test_type, completions FROM user_test_counts WHERE user_id = ?', (user_id,)))
+
+
+def completion_counts(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    return {test_type: {'completions': completions, 'users': users} for test_type, completions, users in
+            conn.execute('SELECT test_type, completions, users FROM test_completion_counts ORDER BY test_type')}
+
+
+def daily_completions(conn: sqlite3.Connection, since: Optional[str] = None,
+                      test_type: Optional[str] = None) -> List[Tuple[str, str, int]]:
+    """[(day, test_type, completions)] from `since` (YYYY-MM-DD) on, oldest first."""
+    where, params = [], []
+    if since:
+        where.append('day >= ?')
+        params.append(since)
+    if test_type:
+        where.append('test_type = ?')
+        params.append(test_type)
+    return [tuple(row) for row in conn.execute(f'''
+        SELECT day, test_type, completions FROM daily_completions
+        {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY day, test_type
+    ''', params)]
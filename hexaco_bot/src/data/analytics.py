@@ -0,0 +1,263 @@
+"""
+Cohort analytics over stored results: distributions of every scale by user attributes.
+
+CohortAnalytics.aggregate() groups the per-scale values of result_scales by any of GROUP_COLUMNS
+(users.gender, mbti_type, paei_index and the completion date of the result) and returns count, mean,
+sample standard deviation, min, max and quantiles per (test, scale, group). By default only the latest
+result of each user per test is counted, so retaking a test does not weigh a user twice.
+
+The rows are streamed from SQLite ordered by test, scale, group and value, one scale at a time: only
+the values of the scale being reduced are held in memory, and because every group arrives sorted,
+the reductions (np.add.reduceat for sums, index interpolation for quantiles) run over all groups of
+the scale at once. Results are memoized per query and reused until the results table changes (new,
+deleted or re-attributed results; see results_version()).
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.analytics --by mbti_type --test hexaco
+    python -m hexaco_bot.src.data.analytics --by gender --by month --format csv > cohorts.csv
+    python -m hexaco_bot.src.data.analytics --by paei_index --scale sds_index --quantiles 0.1,0.5,0.9
+"""
+
+import sys
+import json
+import sqlite3
+import logging
+import argparse
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from hexaco_bot.src.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Ключ группировки -> SQL-выражение (r - results, u - users)
+GROUP_COLUMNS = {
+    'gender': "u.gender",
+    'mbti_type': "u.mbti_type",
+    'paei_index': "u.paei_index",
+    'day': "date(r.created_at)",
+    'week': "strftime('%Y-W%W', r.created_at)",
+    'month': "strftime('%Y-%m', r.created_at)",
+    'year': "strftime('%Y', r.created_at)",
+}
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+STAT_COLUMNS = ('n', 'mean', 'sd', 'min', 'max')
+
+
+def quantile_name(q: float) -> str:
+    """0.5 -> 'q50', 0.025 -> 'q2.5'"""
+    return f"q{q * 100:g}"
+
+
+class CohortAnalytics:
+    """Grouped scale statistics over a bot database; safe to share between threads."""
+
+    def __init__(self, db_path: str, cache_size: int = 32, fetch_size: int = 5000):
+        self.db_path = db_path
+        self.fetch_size = fetch_size
+        # Значения в кэше сверяются с results_version(), TTL лишь ограничивает время жизни
+        self._cache = LRUCache(cache_size, ttl=24 * 3600)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Только чтение: аналитику можно запускать рядом с работающим ботом
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def results_version(self, conn: Optional[sqlite3.Connection] = None) -> Tuple:
+        """
+        Fingerprint of the data the aggregates depend on: the newest result id and the number of
+        results change on insert and delete, users.updated_at when a user's MBTI/PAEI is edited.
+        """
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            return conn.execute('''
+                SELECT (SELECT MAX(result_id) FROM results), (SELECT COUNT(*) FROM results),
+                       (SELECT MAX(updated_at) FROM users)
+            ''').fetchone()
+        finally:
+            if own:
+                conn.close()
+
+    def aggregate(self, group_by: Sequence[str] = (), test_type: Optional[str] = None,
+                  scales: Sequence[str] = (), quantiles: Sequence[float] = DEFAULT_QUANTILES,
+                  latest_only: bool = True, min_count: int = 1) -> List[Dict[str, Any]]:
+        """
+        One row per (test_type, scale_code, group): the group keys, n, mean, sd (None for n < 2),
+        min, max and one 'q<percent>' entry per quantile (linear interpolation, as numpy.quantile).
+        Groups with fewer than `min_count` values are left out.
+        """
+        if isinstance(group_by, str):
+            group_by = (group_by,)
+        unknown = [key for key in group_by if key not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown group key(s) {unknown}, expected some of {sorted(GROUP_COLUMNS)}")
+        if any(not 0 <= q <= 1 for q in quantiles):
+            raise ValueError(f"Quantiles must be within [0, 1], got {list(quantiles)}")
+        query = (tuple(group_by), test_type, tuple(scales), tuple(quantiles), latest_only, min_count)
+
+        conn = self._connect()
+        try:
+            version = self.results_version(conn)
+            cached = self._cache.get(query)
+            if cached is not None and cached[0] == version:
+                return [dict(row) for row in cached[1]]
+            rows = self._aggregate(conn, *query)
+        finally:
+            conn.close()
+        self._cache.set(query, (version, rows))
+        return [dict(row) for row in rows]
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _select(self, group_by: Tuple[str, ...], test_type: Optional[str], scales: Tuple[str, ...],
+                latest_only: bool) -> Tuple[str, list]:
+        group_exprs = [f"{GROUP_COLUMNS[key]} AS g{i}" for i, key in enumerate(group_by)]
+        where, params = [], []
+        if test_type:
+            where.append("rs.test_type = ?")
+            params.append(test_type)
+        if scales:
+            where.append(f"rs.scale_code IN ({', '.join('?' for _ in scales)})")
+            params.extend(scales)
+        if latest_only:
+            where.append("rs.result_id IN (SELECT MAX(result_id) FROM results GROUP BY user_id, test_type)")
+        order = ["rs.test_type", "rs.scale_code"] + [f"g{i}" for i in range(len(group_by))] + ["rs.value"]
+        sql = f'''
+            SELECT rs.test_type, rs.scale_code, {', '.join(group_exprs + ['rs.value'])}
+            FROM result_scales rs
+            JOIN results r ON r.result_id = rs.result_id
+            LEFT JOIN users u ON u.user_id = r.user_id
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY {', '.join(order)}
+        '''
+        return sql, params
+
+    def _aggregate(self, conn: sqlite3.Connection, group_by: Tuple[str, ...], test_type: Optional[str],
+                   scales: Tuple[str, ...], quantiles: Tuple[float, ...], latest_only: bool,
+                   min_count: int) -> List[Dict[str, Any]]:
+        sql, params = self._select(group_by, test_type, scales, latest_only)
+        cursor = conn.execute(sql, params)
+        rows = []
+        # Строки идут отсортированными: в памяти держим только значения текущей шкалы
+        for (scale_test_type, scale_code), scale_rows in groupby(self._stream(cursor), key=lambda row: row[:2]):
+            for group_key, stats in _reduce_scale(scale_rows, len(group_by), quantiles):
+                if stats['n'] < min_count:
+                    continue
+                row = {'test_type': scale_test_type, 'scale_code': scale_code}
+                row.update(zip(group_by, group_key))
+                row.update(stats)
+                rows.append(row)
+        return rows
+
+    def _stream(self, cursor: sqlite3.Cursor) -> Iterable[tuple]:
+        while True:
+            batch = cursor.fetchmany(self.fetch_size)
+            if not batch:
+                return
+            yield from batch
+
+
+def _reduce_scale(rows: Iterable[tuple], group_count: int,
+                  quantiles: Sequence[float]) -> List[Tuple[tuple, Dict[str, Any]]]:
+    """Statistics of every group of one scale; `rows` are sorted by group keys, then value."""
+    import numpy as np
+
+    keys, values = [], []
+    for row in rows:
+        keys.append(row[2:2 + group_count])
+        values.append(row[-1])
+    if not values:
+        return []
+    values = np.asarray(values, dtype=np.float64)
+    # Начала групп: строки, где ключ отличается от предыдущего
+    starts = np.array([0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]], dtype=np.intp)
+    counts = np.diff(np.append(starts, len(values)))
+    means = np.add.reduceat(values, starts) / counts
+    deviations = values - np.repeat(means, counts)
+    squares = np.add.reduceat(deviations * deviations, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sds = np.sqrt(squares / (counts - 1))
+    ends = starts + counts - 1
+    quantile_values = []
+    for q in quantiles:
+        # Значения группы отсортированы: квантиль - интерполяция между соседними элементами
+        position = q * (counts - 1)
+        lower = np.floor(position).astype(np.intp)
+        upper = np.minimum(lower + 1, counts - 1)
+        low_values, high_values = values[starts + lower], values[starts + upper]
+        quantile_values.append(low_values + (high_values - low_values) * (position - lower))
+
+    results = []
+    columns = [counts.tolist(), means.tolist(), sds.tolist(), values[starts].tolist(), values[ends].tolist()]
+    columns += [column.tolist() for column in quantile_values]
+    for index, start in enumerate(starts.tolist()):
+        n, mean, sd, minimum, maximum = (column[index] for column in columns[:5])
+        stats = {'n': n, 'mean': mean, 'sd': sd if n > 1 else None, 'min': minimum, 'max': maximum}
+        for q, column in zip(quantiles, columns[5:]):
+            stats[quantile_name(q)] = column[index]
+        results.append((keys[start], stats))
+    return results
+
+
+def format_table(rows: List[Dict[str, Any]], group_by: Sequence[str], quantiles: Sequence[float]) -> str:
+    columns = ['test_type', 'scale_code', *group_by, *STAT_COLUMNS, *(quantile_name(q) for q in quantiles)]
+
+    def cell(value) -> str:
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
+
+    cells = [[cell(row[column]) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells]) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines += ["  ".join(value.ljust(width) for value, width in zip(line, widths)) for line in cells]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import DATABASE_PATH
+
+    parser = argparse.ArgumentParser(description="Scale distributions (n, mean, sd, quantiles) by user cohort.")
+    parser.add_argument("--by", action="append", default=[], choices=sorted(GROUP_COLUMNS),
+                        help="Group key (repeatable; day/week/month/year - when the result was saved).")
+    parser.add_argument("--test", help="Only this test type (e.g. hexaco).")
+    parser.add_argument("--scale", action="append", default=[], help="Only this scale code (repeatable).")
+    parser.add_argument("--quantiles", default=",".join(str(q) for q in DEFAULT_QUANTILES),
+                        help="Comma-separated quantiles (default: 0.25,0.5,0.75).")
+    parser.add_argument("--all-results", action="store_true",
+                        help="Count every result, not only the latest one of each user per test.")
+    parser.add_argument("--min-count", type=int, default=1, help="Hide groups with fewer values.")
+    parser.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    try:
+        quantiles = tuple(float(q) for q in args.quantiles.split(",") if q.strip())
+    except ValueError:
+        parser.error(f"--quantiles must be comma-separated numbers, got {args.quantiles!r}")
+    analytics = CohortAnalytics(args.db)
+    try:
+        rows = analytics.aggregate(args.by, args.test, args.scale, quantiles,
+                                   latest_only=not args.all_results, min_count=args.min_count)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.format == "json":
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    elif args.format == "csv":
+        import csv
+        columns = ['test_type', 'scale_code', *args.by, *STAT_COLUMNS, *(quantile_name(q) for q in quantiles)]
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print(format_table(rows, args.by, quantiles) if rows else "No results.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
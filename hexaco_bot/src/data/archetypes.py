@@ -0,0 +1,417 @@
+"""
+Archetypes: k-means clusters of users over the scale scores of all eight instruments.
+
+The batch job (main() / fit_archetypes) reads the latest value of every scale in ARCHETYPE_FEATURES
+for each user from result_scales, standardizes the features and clusters the users with mini-batch k-means written in NumPy: every
+iteration moves the centroids towards a random batch of users with a per-centroid learning rate of
+1 / (users seen so far), so a fit costs O(iterations * batch * k) instead of passes over every user.
+Only users with most of the scales take part in the fit (a missing scale counts as the mean there);
+everyone is then assigned by the distance over the scales they do have, rescaled to all features, so
+a user who has taken only HEXACO is not pulled towards the cluster closest to the average. The best of `n_init` runs is stored in archetype_models as the active model together with one row
+per user in archetype_assignments. Clusters are numbered by size, largest first, and labelled by the
+scales where their centroid deviates most from the average.
+
+New results do not need a refit: DatabaseManager.save_test_result calls ArchetypeAssigner.assign(),
+which standardizes the user's scales with the stored mean/std and picks the nearest of the k
+centroids the same way (O(k * features), plain Python), so the archetype is in the report right after the test.
+The assignment keeps the scales it was computed from (archetype_assignments.inputs); the next one
+merges the scales of the new result into them instead of reading all of the user's results again.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.archetypes --k 8
+    python -m hexaco_bot.src.data.archetypes --k 6 --seed 1 --dry-run
+"""
+
+import json
+import math
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (test_type, scale_code): шкалы восьми методик без итоговых сумм, которые дублируют подшкалы
+ARCHETYPE_FEATURES: Tuple[Tuple[str, str], ...] = (
+    ('hexaco', 'honesty_humility'), ('hexaco', 'emotionality'), ('hexaco', 'extraversion'),
+    ('hexaco', 'agreeableness'), ('hexaco', 'conscientiousness'), ('hexaco', 'openness'),
+    ('hexaco', 'altruism'),
+    ('sds', 'self_contact'), ('sds', 'choiceful_action'),
+    ('svs', 'value_type_scores.Power'), ('svs', 'value_type_scores.Achievement'),
+    ('svs', 'value_type_scores.Hedonism'), ('svs', 'value_type_scores.Stimulation'),
+    ('svs', 'value_type_scores.Self-Direction'), ('svs', 'value_type_scores.Universalism'),
+    ('svs', 'value_type_scores.Benevolence'), ('svs', 'value_type_scores.Tradition'),
+    ('svs', 'value_type_scores.Conformity'), ('svs', 'value_type_scores.Security'),
+    ('panas', 'Позитивный аффект (ПА)'), ('panas', 'Негативный аффект (НА)'),
+    ('self_efficacy', 'Общая самоэффективность (ОСЭ)'), ('self_efficacy', 'Социальная самоэффективность (ССЭ)'),
+    ('cdrisc', 'subscale_personal_competence_persistence'), ('cdrisc', 'subscale_instincts_stress_as_hardening'),
+    ('cdrisc', 'subscale_acceptance_of_change_support'), ('cdrisc', 'subscale_control'),
+    ('cdrisc', 'subscale_spiritual_beliefs'),
+    ('rfq', 'promotion_score'), ('rfq', 'prevention_score'),
+    ('pid5bfm', 'Негативный_аффект'), ('pid5bfm', 'Отчуждение'), ('pid5bfm', 'Антагонизм'),
+    ('pid5bfm', 'Дизингибиция'), ('pid5bfm', 'Ананкастия'), ('pid5bfm', 'Психотицизм'),
+)
+ARCHETYPE_TEST_TYPES = frozenset(test_type for test_type, _ in ARCHETYPE_FEATURES)
+
+
+@dataclass
+class ArchetypeModel:
+    features: Tuple[Tuple[str, str], ...]
+    mean: List[float]
+    std: List[float]
+    centroids: List[List[float]]  # k x len(features), в стандартизованных единицах
+    labels: List[str]
+    inertia: float = 0.0
+    users: int = 0
+    model_id: Optional[int] = None
+
+    @property
+    def k(self) -> int:
+        return len(self.centroids)
+
+    def standardize(self, values: Dict[Tuple[str, str], float]) -> List[Optional[float]]:
+        """Standardized features in model order, None for scales the user has not taken."""
+        return [(values[feature] - mean) / std if feature in values else None
+                for feature, mean, std in zip(self.features, self.mean, self.std)]
+
+    def nearest(self, vector: Sequence[Optional[float]]) -> Tuple[int, float]:
+        """(cluster, Euclidean distance) of the closest centroid over the features present in `vector`."""
+        present = [(i, x) for i, x in enumerate(vector) if x is not None]
+        if not present:
+            raise ValueError("No features to compare")
+        scale = len(vector) / len(present)
+        best, best_distance = 0, math.inf
+        for cluster, centroid in enumerate(self.centroids):
+            distance = sum((x - centroid[i]) * (x - centroid[i]) for i, x in present)
+            if distance < best_distance:
+                best, best_distance = cluster, distance
+        return best, math.sqrt(best_distance * scale)
+
+
+def load_features(db_path: str, features: Sequence[Tuple[str, str]] = ARCHETYPE_FEATURES, fetch_size: int = 5000):
+    """(user_ids, raw matrix users x features with NaN for scales not taken) from the latest results."""
+    import numpy as np
+    from hexaco_bot.src.data.similarity import load_latest_scales
+
+    rows: Dict[int, int] = {}
+    user_ids: List[int] = []
+    cells: Dict[Tuple[int, int], float] = {}
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for chunk in load_latest_scales(conn, features, fetch_size=fetch_size):
+            for user_id, column, value in chunk:
+                row = rows.get(user_id)
+                if row is None:
+                    row = rows[user_id] = len(user_ids)
+                    user_ids.append(user_id)
+                cells[(row, column)] = value
+    finally:
+        conn.close()
+    raw = np.full((len(user_ids), len(features)), np.nan)
+    if cells:
+        index, values = zip(*cells.items())
+        raw_rows, raw_columns = zip(*index)
+        raw[list(raw_rows), list(raw_columns)] = values
+    return user_ids, raw
+
+
+def _squared_distances(points, centroids):
+    import numpy as np
+    distances = (np.einsum('ij,ij->i', points, points)[:, None] - 2 * points @ centroids.T
+                 + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+    return np.maximum(distances, 0)
+
+
+def _kmeans_plus_plus(points, k: int, rng):
+    import numpy as np
+    centroids = [points[rng.integers(len(points))]]
+    closest = _squared_distances(points, centroids[0][None, :])[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        index = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centroids.append(points[index])
+        closest = np.minimum(closest, _squared_distances(points, points[index][None, :])[:, 0])
+    return np.array(centroids)
+
+
+def assign_clusters(points, centroids, mask=None, chunk_size: int = 10000):
+    """
+    Nearest centroid and squared distance for every row, `chunk_size` rows at a time. With a boolean
+    `mask` (features present) only those features count, rescaled to the full dimension; masked-out
+    entries of `points` must be 0.
+    """
+    import numpy as np
+    labels = np.empty(len(points), dtype=np.intp)
+    distances = np.empty(len(points))
+    squared_centroids = centroids * centroids
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        if mask is None:
+            chunk = _squared_distances(block, centroids)
+        else:
+            block_mask = mask[start:start + chunk_size].astype(np.float64)
+            chunk = (np.einsum('ij,ij->i', block, block)[:, None] - 2 * block @ centroids.T
+                     + block_mask @ squared_centroids.T)
+            present = np.maximum(block_mask.sum(axis=1), 1)
+            chunk = np.maximum(chunk, 0) * (points.shape[1] / present)[:, None]
+        labels[start:start + chunk_size] = chunk.argmin(axis=1)
+        distances[start:start + chunk_size] = chunk[np.arange(len(chunk)), labels[start:start + chunk_size]]
+    return labels, distances
+
+
+def minibatch_kmeans(points, k: int, batch_size: int = 256, max_iter: int = 300, tol: float = 1e-4,
+                     patience: int = 10, seed: int = 0):
+    """
+    Mini-batch k-means (Sculley, 2010): returns (centroids, labels, inertia). Stops after `max_iter`
+    batches or when the centroids moved less than `tol` (mean squared shift) `patience` times in a row.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    init_sample = points[rng.choice(n, min(n, max(3 * batch_size, 10 * k)), replace=False)]
+    centroids = _kmeans_plus_plus(init_sample, k, rng)
+    counts = np.zeros(k)
+    calm = 0
+    for _ in range(max_iter):
+        batch = points[rng.integers(0, n, min(batch_size, n))]
+        labels = _squared_distances(batch, centroids).argmin(axis=1)
+        batch_counts = np.bincount(labels, minlength=k).astype(np.float64)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, batch)
+        moved = batch_counts > 0
+        counts += batch_counts
+        previous = centroids.copy()
+        # Шаг к среднему батча с темпом 1/(сколько точек центр уже видел): центры стабилизируются
+        centroids[moved] += (sums[moved] - batch_counts[moved, None] * centroids[moved]) / counts[moved, None]
+        shift = float(((centroids - previous) ** 2).sum(axis=1).mean())
+        calm = calm + 1 if shift < tol else 0
+        if calm >= patience:
+            break
+    labels, distances = assign_clusters(points, centroids)
+    return centroids, labels, float(distances.sum())
+
+
+def label_clusters(centroids, features: Sequence[Tuple[str, str]], top: int = 3) -> List[str]:
+    """'+extraversion, +openness, -Негативный аффект (НА)': the scales furthest from the average."""
+    import numpy as np
+    labels = []
+    for centroid in centroids:
+        order = np.argsort(-np.abs(centroid), kind='stable')[:top]
+        labels.append(", ".join(f"{'+' if centroid[i] >= 0 else '-'}{features[i][1]}" for i in order))
+    return labels
+
+
+def fit_archetypes(user_ids: Sequence[int], raw, k: int = 8, features: Sequence[Tuple[str, str]] = ARCHETYPE_FEATURES,
+                   min_coverage: float = 0.5, n_init: int = 3, batch_size: int = 256, max_iter: int = 300,
+                   seed: int = 0) -> Tuple[ArchetypeModel, List[Tuple[int, int, float]]]:
+    """
+    Fits the model on users with at least `min_coverage` of the features and assigns every user;
+    returns (model, [(user_id, cluster, distance)]).
+    """
+    import numpy as np
+    raw = np.asarray(raw, dtype=np.float64)
+    present = ~np.isnan(raw)
+    fit_rows = present.mean(axis=1) >= min_coverage if len(raw) else np.zeros(0, dtype=bool)
+    if fit_rows.sum() < k:
+        raise ValueError(f"Only {int(fit_rows.sum())} users have {min_coverage:.0%} of the scales, need at least k={k}")
+    fit_raw = raw[fit_rows]
+    mean = np.nanmean(fit_raw, axis=0)
+    std = np.nanstd(fit_raw, axis=0)
+    # Шкала, которой нет ни у кого из обучающей выборки, не влияет на расстояния
+    mean = np.nan_to_num(mean, nan=0.0)
+    std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+    points = np.nan_to_num((raw - mean) / std, nan=0.0)
+
+    best = None
+    for run in range(n_init):
+        centroids, _, inertia = minibatch_kmeans(points[fit_rows], k, batch_size, max_iter, seed=seed + run)
+        if best is None or inertia < best[1]:
+            best = (centroids, inertia)
+    centroids, inertia = best
+    labels, distances = assign_clusters(points, centroids, mask=present)
+    # Нумерация по размеру кластера: 0 - самый многочисленный архетип
+    order = np.argsort(-np.bincount(labels, minlength=k), kind='stable')
+    centroids = centroids[order]
+    labels = np.argsort(order)[labels]
+
+    model = ArchetypeModel(tuple(features), mean.tolist(), std.tolist(), centroids.tolist(),
+                           label_clusters(centroids, features), inertia, int(fit_rows.sum()))
+    assignments = list(zip(user_ids, labels.tolist(), np.sqrt(distances).tolist()))
+    return model, assignments
+
+
+def save_model(conn: sqlite3.Connection, model: ArchetypeModel, assignments: List[Tuple[int, int, float]]) -> int:
+    """Stores the model as the only active one and replaces all assignments, in one transaction."""
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO archetype_models (k, features, mean, std, centroids, labels, inertia, users, active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+        ''', (model.k, json.dumps(model.features, ensure_ascii=False), json.dumps(model.mean),
+              json.dumps(model.std), json.dumps(model.centroids), json.dumps(model.labels, ensure_ascii=False),
+              model.inertia, model.users))
+        model.model_id = cursor.lastrowid
+        conn.execute('UPDATE archetype_models SET active = (model_id = ?)', (model.model_id,))
+        conn.execute('DELETE FROM archetype_assignments')
+        conn.executemany('INSERT INTO archetype_assignments (user_id, model_id, cluster, distance) VALUES (?, ?, ?, ?)',
+                         [(user_id, model.model_id, cluster, distance) for user_id, cluster, distance in assignments])
+    return model.model_id
+
+
+def load_active_model(conn: sqlite3.Connection) -> Optional[ArchetypeModel]:
+    row = conn.execute('''
+        SELECT model_id, features, mean, std, centroids, labels, inertia, users
+        FROM archetype_models WHERE active = 1 ORDER BY model_id DESC LIMIT 1
+    ''').fetchone()
+    if row is None:
+        return None
+    model_id, features, mean, std, centroids, labels, inertia, users = tuple(row)
+    return ArchetypeModel(tuple(tuple(feature) for feature in json.loads(features)), json.loads(mean),
+                          json.loads(std), json.loads(centroids), json.loads(labels), inertia, users, model_id)
+
+
+class ArchetypeAssigner:
+    """
+    Assigns one user to the nearest centroid of the active model. The model is cached and looked up
+    again at most every `check_interval` seconds, so a refit by the batch job reaches every worker.
+    """
+
+    def __init__(self, check_interval: float = 60.0):
+        self.check_interval = check_interval
+        self._model: Optional[ArchetypeModel] = None
+        self._checked_at = -math.inf
+        self._lock = threading.Lock()
+
+    def model(self, conn: sqlite3.Connection) -> Optional[ArchetypeModel]:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._model
+        with self._lock:
+            if now - self._checked_at >= self.check_interval:
+                row = conn.execute('SELECT MAX(model_id) FROM archetype_models WHERE active = 1').fetchone()
+                active_id = row[0] if row else None
+                if active_id is None:
+                    self._model = None
+                elif self._model is None or self._model.model_id != active_id:
+                    self._model = load_active_model(conn)
+                self._checked_at = now
+        return self._model
+
+    def assign(self, conn: sqlite3.Connection, user_id: int, test_type: Optional[str] = None,
+               scales: Optional[Sequence[Tuple[str, float]]] = None) -> Optional[Tuple[int, float]]:
+        """
+        Upserts the user's archetype on `conn` (the caller commits); returns (cluster, distance), or
+        None when there is no model yet or the user has no scales of the model. `scales` are the
+        (scale_code, value) pairs of a `test_type` result just saved.
+        """
+        try:
+            return self._assign(conn, user_id, test_type, scales)
+        except (sqlite3.Error, ValueError) as e:
+            # Архетип не должен мешать сохранению результата: его пересчитает следующий запуск задачи
+            logger.warning(f"Failed to assign archetype for user {user_id}: {e}")
+            return None
+
+    def _assign(self, conn: sqlite3.Connection, user_id: int, test_type: Optional[str],
+                scales: Optional[Sequence[Tuple[str, float]]]) -> Optional[Tuple[int, float]]:
+        model = self.model(conn)
+        if model is None:
+            return None
+        values = self._stored_inputs(conn, user_id, model) if scales is not None else None
+        if values is None:
+            values = self._latest_scales(conn, user_id, model)
+        else:
+            # Новый результат - самый поздний: его шкалы перезаписывают сохраненные
+            features = set(model.features)
+            values.update(((test_type, code), value) for code, value in scales if (test_type, code) in features)
+        if not values:
+            return None
+        cluster, distance = model.nearest(model.standardize(values))
+        conn.execute('''
+            INSERT INTO archetype_assignments (user_id, model_id, cluster, distance, inputs, assigned_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET model_id = excluded.model_id, cluster = excluded.cluster,
+                distance = excluded.distance, inputs = excluded.inputs, assigned_at = excluded.assigned_at
+        ''', (user_id, model.model_id, cluster, distance, json.dumps([values.get(feature) for feature in model.features])))
+        return cluster, distance
+
+    @staticmethod
+    def _stored_inputs(conn: sqlite3.Connection, user_id: int,
+                       model: ArchetypeModel) -> Optional[Dict[Tuple[str, str], float]]:
+        """Scales of the user's current assignment, None if it is missing or made by another model."""
+        row = conn.execute('SELECT model_id, inputs FROM archetype_assignments WHERE user_id = ?',
+                           (user_id,)).fetchone()
+        if row is None or row[0] != model.model_id or row[1] is None:
+            return None
+        return {feature: value for feature, value in zip(model.features, json.loads(row[1])) if value is not None}
+
+    @staticmethod
+    def _latest_scales(conn: sqlite3.Connection, user_id: int, model: ArchetypeModel) -> Dict[Tuple[str, str], float]:
+        """The latest value of every model scale over all of the user's results."""
+        features = set(model.features)
+        test_types = sorted({test_type for test_type, _ in model.features})
+        values = {}
+        for test_type, scale_code, value in conn.execute(f'''
+                SELECT rs.test_type, rs.scale_code, rs.value
+                FROM results r JOIN result_scales rs ON rs.result_id = r.result_id
+                WHERE r.user_id = ? AND r.test_type IN ({', '.join('?' for _ in test_types)})
+                ORDER BY r.result_id''', (user_id, *test_types)):
+            if (test_type, scale_code) in features:
+                values[(test_type, scale_code)] = value  # более поздний результат перезаписывает ранний
+        return values
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import DATABASE_PATH
+    from hexaco_bot.src.data.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Fit archetypes (mini-batch k-means over all scales) and assign users.")
+    parser.add_argument("--k", type=int, default=8, help="Number of archetypes (default: 8).")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-iter", type=int, default=300)
+    parser.add_argument("--n-init", type=int, default=3, help="Runs with different seeds, the best is kept.")
+    parser.add_argument("--min-coverage", type=float, default=0.5,
+                        help="Share of scales a user needs to take part in the fit (default: 0.5).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true", help="Fit and print, do not store the model.")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    started = time.perf_counter()
+    try:
+        user_ids, raw = load_features(args.db)
+        model, assignments = fit_archetypes(user_ids, raw, args.k, min_coverage=args.min_coverage,
+                                            n_init=args.n_init, batch_size=args.batch_size,
+                                            max_iter=args.max_iter, seed=args.seed)
+    except (ValueError, sqlite3.Error) as e:
+        logger.error(f"Archetype fit failed: {e}")
+        return 1
+    sizes = [0] * model.k
+    for _, cluster, _ in assignments:
+        sizes[cluster] += 1
+    print(f"{len(assignments)} users, fitted on {model.users}, inertia {model.inertia:.1f}, "
+          f"{time.perf_counter() - started:.2f}s")
+    for cluster, (size, label) in enumerate(zip(sizes, model.labels)):
+        print(f"  {cluster:>2}  {size:>7}  {label}")
+    if args.dry_run:
+        return 0
+
+    db = DatabaseManager(args.db)
+    if not db.initialize_database(run_online_migrations=False):
+        return 1
+    conn = db.get_connection()
+    try:
+        model_id = save_model(conn, model, assignments)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save archetype model: {e}")
+        return 1
+    finally:
+        conn.close()
+    print(f"Model {model_id} is active")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,286 @@
+"""
+Hot backups of the bot database.
+
+Snapshots are taken with the SQLite online backup API (sqlite3.Connection.backup) in steps of a few
+hundred pages with a short sleep between steps: the copy never holds a lock for longer than one step,
+so the bot keeps reading and writing while a backup runs, and the result is a consistent
+point-in-time image of the database (unlike copying a live file).
+
+BackupScheduler runs in its own daemon thread. Every snapshot is written to a temporary file,
+checked with PRAGMA integrity_check, gzip-compressed and then rotated by retention policy: the newest
+`keep_last` snapshots plus the newest snapshot of each of the last `keep_daily` days are kept.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.backup --now                    # take one snapshot
+    python -m hexaco_bot.src.data.backup --list
+    python -m hexaco_bot.src.data.backup --restore SNAPSHOT --output ./data/restored.db
+"""
+
+import os
+import gzip
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.db.gz'
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_database(source_path: str, destination_path: str, pages: int = 256, step_sleep: float = 0.005,
+                    max_restarts: int = 5):
+    """
+    Copies a live database file with the online backup API, `pages` pages per step.
+
+    A write from another connection between two steps makes SQLite restart the copy from the first
+    page. After `max_restarts` restarts the rest is copied in a single step, which holds a read lock
+    (and so delays writers) for the duration of that one copy.
+    """
+    source = sqlite3.connect(source_path)
+    destination = sqlite3.connect(destination_path)
+    progress_state = {'remaining': None, 'restarts': 0}
+
+    def _progress(status, remaining, total):
+        previous = progress_state['remaining']
+        if previous is not None and remaining > previous:
+            progress_state['restarts'] += 1
+            if progress_state['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        progress_state['remaining'] = remaining
+
+    try:
+        try:
+            # Между шагами блокировка отпускается: остальные соединения продолжают читать и писать
+            source.backup(destination, pages=pages, progress=_progress, sleep=step_sleep)
+        except _TooManyRestarts:
+            logger.warning(f"Backup of {source_path} restarted {max_restarts} times by concurrent writes, "
+                           f"copying in one step")
+            source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+
+def check_integrity(path: str) -> Optional[str]:
+    """Runs PRAGMA integrity_check on a database file; returns None if it is ok, otherwise the report."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    return None if rows == ['ok'] else '; '.join(rows)
+
+
+@dataclass
+class Snapshot:
+    path: str
+    created_at: datetime
+    size: int
+
+
+@dataclass
+class BackupResult:
+    path: Optional[str]
+    ok: bool
+    duration: float
+    size: int = 0
+    error: Optional[str] = None
+
+
+class BackupScheduler:
+    """Takes a verified, compressed snapshot every `interval` seconds and rotates old ones."""
+
+    def __init__(self, db_path: str, backup_dir: Optional[str] = None, interval: float = 6 * 3600,
+                 keep_last: int = 8, keep_daily: int = 7, pages: int = 256, step_sleep: float = 0.005,
+                 compress_level: int = 6):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+        self.interval = interval
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.pages = pages
+        self.step_sleep = step_sleep
+        self.compress_level = compress_level
+        self.name = os.path.splitext(os.path.basename(db_path))[0]
+        self.last_result: Optional[BackupResult] = None
+        self.last_success_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def prefix(self) -> str:
+        return f"{self.name}_snapshot_"
+
+    def start(self) -> Optional[threading.Thread]:
+        """Starts the scheduler thread; the first snapshot is taken one interval after start."""
+        if self.db_path == ':memory:' or self.interval <= 0:
+            return None
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="db-backup", daemon=True)
+        self._thread.start()
+        logger.info(f"Backup scheduler started: every {self.interval / 3600:.1f}h into {self.backup_dir}")
+        return self._thread
+
+    def stop(self, timeout: float = 30.0):
+        """Stops the scheduler; a snapshot in progress is finished first."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_backup()
+
+    def run_backup(self) -> BackupResult:
+        """Takes one snapshot now (in the calling thread). Never raises."""
+        with self._lock:
+            started = time.perf_counter()
+            created_at = datetime.now()
+            final_path = os.path.join(self.backup_dir, f"{self.prefix}{created_at.strftime(TIMESTAMP_FORMAT)}{SNAPSHOT_SUFFIX}")
+            tmp_path = final_path[:-len('.gz')] + '.tmp'
+            try:
+                if not os.path.exists(self.db_path):
+                    raise FileNotFoundError(self.db_path)
+                os.makedirs(self.backup_dir, exist_ok=True)
+                backup_database(self.db_path, tmp_path, self.pages, self.step_sleep)
+                problem = check_integrity(tmp_path)
+                if problem:
+                    raise sqlite3.DatabaseError(f"integrity_check failed: {problem}")
+                self._compress(tmp_path, final_path)
+                result = BackupResult(final_path, True, time.perf_counter() - started, os.path.getsize(final_path))
+                self.last_success_at = time.time()
+                logger.info(f"Database snapshot saved to {final_path} ({result.size} bytes, {result.duration:.1f}s)")
+                self.rotate()
+            except (sqlite3.Error, OSError) as e:
+                if os.path.exists(final_path + '.part'):
+                    os.remove(final_path + '.part')
+                result = BackupResult(None, False, time.perf_counter() - started, error=str(e))
+                logger.error(f"Database backup failed: {e}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.last_result = result
+            return result
+
+    def _compress(self, source_path: str, final_path: str):
+        # Пишем во временный файл и переименовываем: в каталоге не бывает недописанных снимков
+        part_path = final_path + '.part'
+        with open(source_path, 'rb') as source, gzip.open(part_path, 'wb', compresslevel=self.compress_level) as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        os.replace(part_path, final_path)
+
+    def list_snapshots(self) -> List[Snapshot]:
+        """Snapshots made by this scheduler, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        snapshots = []
+        for filename in os.listdir(self.backup_dir):
+            if not (filename.startswith(self.prefix) and filename.endswith(SNAPSHOT_SUFFIX)):
+                continue
+            stamp = filename[len(self.prefix):-len(SNAPSHOT_SUFFIX)]
+            try:
+                created_at = datetime.strptime(stamp, TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            path = os.path.join(self.backup_dir, filename)
+            snapshots.append(Snapshot(path, created_at, os.path.getsize(path)))
+        snapshots.sort(key=lambda snapshot: snapshot.created_at, reverse=True)
+        return snapshots
+
+    def rotate(self) -> List[str]:
+        """Deletes snapshots outside the retention policy; returns the deleted paths."""
+        snapshots = self.list_snapshots()
+        keep = {snapshot.path for snapshot in snapshots[:self.keep_last]}
+        days = []
+        for snapshot in snapshots:
+            day = snapshot.created_at.date()
+            if day not in days:
+                days.append(day)
+                if len(days) <= self.keep_daily:
+                    keep.add(snapshot.path)
+        deleted = []
+        for snapshot in snapshots:
+            if snapshot.path in keep:
+                continue
+            try:
+                os.remove(snapshot.path)
+                deleted.append(snapshot.path)
+            except OSError as e:
+                logger.warning(f"Failed to delete old snapshot {snapshot.path}: {e}")
+        if deleted:
+            logger.info(f"Rotated {len(deleted)} old database snapshot(s)")
+        return deleted
+
+
+def restore_snapshot(snapshot_path: str, output_path: str) -> bool:
+    """Unpacks a snapshot into output_path (never over an existing file) and verifies it."""
+    if os.path.exists(output_path):
+        logger.error(f"Refusing to overwrite existing file {output_path}")
+        return False
+    part_path = output_path + '.part'
+    try:
+        with gzip.open(snapshot_path, 'rb') as source, open(part_path, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        problem = check_integrity(part_path)
+        if problem:
+            logger.error(f"Snapshot {snapshot_path} failed integrity_check: {problem}")
+            os.remove(part_path)
+            return False
+        os.replace(part_path, output_path)
+        logger.info(f"Snapshot {snapshot_path} restored to {output_path}")
+        return True
+    except (sqlite3.Error, OSError) as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        logger.error(f"Failed to restore snapshot {snapshot_path}: {e}")
+        return False
+
+
+def main():
+    from hexaco_bot.config.settings import (
+        DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP_LAST, BACKUP_KEEP_DAILY, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS
+    )
+
+    parser = argparse.ArgumentParser(description="Take, list and restore hot backups of the bot database.")
+    parser.add_argument("--now", action="store_true", help="Take a snapshot now.")
+    parser.add_argument("--list", action="store_true", help="List existing snapshots.")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="Snapshot (.db.gz) to restore.")
+    parser.add_argument("--output", help="Where to write the restored database (must not exist).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    scheduler = BackupScheduler(DATABASE_PATH, BACKUP_DIR or None, keep_last=BACKUP_KEEP_LAST,
+                                keep_daily=BACKUP_KEEP_DAILY, pages=BACKUP_PAGES_PER_STEP,
+                                step_sleep=BACKUP_STEP_SLEEP_MS / 1000)
+    if args.restore:
+        if not args.output:
+            parser.error("--restore requires --output")
+        return 0 if restore_snapshot(args.restore, args.output) else 1
+    if args.now:
+        if not scheduler.run_backup().ok:
+            return 1
+    if args.list or args.now:
+        for snapshot in scheduler.list_snapshots():
+            print(f"{snapshot.created_at:%Y-%m-%d %H:%M:%S}  {snapshot.size:>12}  {snapshot.path}")
+        return 0
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -8,17 +8,71 @@ import logging
 import os
 from datetime import datetime
 from typing import Optional, Dict, List, Any
-from hexaco_bot.config.settings import DATABASE_PATH
+from hexaco_bot.config.settings import (
+    DATABASE_PATH, MIGRATION_BATCH_SIZE, MIGRATION_BATCH_PAUSE_MS, MIGRATION_BACKUP_DIR,
+    USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+)
+from hexaco_bot.src.data.response_codec import encode_responses, decode_responses, responses_as_json
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.data.archetypes import ARCHETYPE_TEST_TYPES, ArchetypeAssigner
+from hexaco_bot.src.data.purge import EVICT_USERS, publish_admin_event
+from hexaco_bot.src.utils.cache import LRUCache
 import json
 
 logger = logging.getLogger(__name__)
 
+# Ключи scores_json, которые не являются шкалами (ответы по пунктам и служебные счетчики)
+NON_SCALE_KEYS = {'raw_scores', 'raw_responses', 'ipsatized_scores', 'answered_questions', 'answered_questions_count'}
+
+
+def flatten_scores(scores: Dict[str, Any], prefix: str = '') -> List[tuple]:
+    """
+    Turns a scores dict into (scale_code, value) pairs for result_scales. Nested dicts become dotted
+    codes (e.g. 'value_type_scores.Benevolence'); strings, lists and NON_SCALE_KEYS are skipped.
+    """
+    pairs = []
+    for key, value in scores.items():
+        if key in NON_SCALE_KEYS:
+            continue
+        code = f"{prefix}{key}"
+        if isinstance(value, dict):
+            pairs.extend(flatten_scores(value, code + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            pairs.append((code, float(value)))
+    return pairs
+
+
+# Бит test_type в users.completed_tests_mask. Порядок менять нельзя: маски уже лежат в базе
+COMPLETED_TEST_BITS = {
+    test_type: 1 << index for index, test_type in enumerate(
+        ('hexaco', 'sds', 'svs', 'panas', 'self_efficacy', 'cdrisc', 'rfq', 'pid5bfm', 'urica', 'dweck'))
+}
+
+
+def completed_tests_mask(test_types) -> int:
+    """Bitmask of the given test types (unknown types are ignored)."""
+    mask = 0
+    for test_type in test_types:
+        mask |= COMPLETED_TEST_BITS.get(test_type, 0)
+    return mask
+
+
+def _with_completed_test(user: Dict[str, Any], bit: int) -> Dict[str, Any]:
+    mask = user.get('completed_tests_mask')
+    return user if mask is None else dict(user, completed_tests_mask=mask | bit)
+
+
 class DatabaseManager:
     """Manages SQLite database operations for HEXACO bot."""
     
     def __init__(self, db_path: str = DATABASE_PATH):
         """Initialize database manager with path."""
         self.db_path = db_path
+        self._runner = None  # MigrationRunner, создается при первой инициализации
+        # Строки users по user_id; сбрасывается методами, которые меняют пользователя
+        self.user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+        # Архетип пользователя пересчитывается при сохранении результата, без переобучения модели
+        self.archetypes = ArchetypeAssigner()
         self._ensure_database_directory()
         
     def _ensure_database_directory(self):
@@ -34,81 +88,40 @@ class DatabaseManager:
         conn.row_factory = sqlite3.Row  # Enable dict-like access
         return conn
     
-    def initialize_database(self) -> bool:
-        """Initialize database with required tables."""
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Create users table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT NOT NULL,
-                        last_name TEXT NOT NULL,
-                        gender TEXT NOT NULL CHECK (gender IN ('male', 'female')),
-                        paei_index TEXT,
-                        mbti_type TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        overall_completion_status_set_at TIMESTAMP DEFAULT NULL
-                    )
-                ''')
-                
-                # Create test_sessions table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS test_sessions (
-                        session_id TEXT PRIMARY KEY,
-                        user_id INTEGER NOT NULL,
-                        status TEXT NOT NULL CHECK (status IN ('active', 'completed', 'abandoned')),
-                        current_question INTEGER DEFAULT 1,
-                        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        completed_at TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (user_id)
-                    )
-                ''')
-                
-                # Create results table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS results (
-                        result_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT NOT NULL,
-                        user_id INTEGER NOT NULL,
-                        test_type TEXT NOT NULL CHECK (test_type IN ('hexaco', 'sds', 'svs', 'panas', 'self_efficacy', 'cdrisc', 'rfq', 'pid5bfm')),
-                        honesty_humility REAL,
-                        emotionality REAL,
-                        extraversion REAL,
-                        agreeableness REAL,
-                        conscientiousness REAL,
-                        openness REAL,
-                        altruism REAL,
-                        self_contact REAL,
-                        choiceful_action REAL,
-                        sds_index REAL,
-                        scores_json TEXT,
-                        responses TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (session_id) REFERENCES test_sessions (session_id),
-                        FOREIGN KEY (user_id) REFERENCES users (user_id)
-                    )
-                ''')
-                
-                # Create indexes for better performance
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_user_id ON users (user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON test_sessions (user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_status ON test_sessions (status)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_user_id ON results (user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_results_session_id ON results (session_id)')
-                
-                conn.commit()
-                logger.info("Database initialized successfully")
-                return True
-                
-        except sqlite3.Error as e:
-            logger.error(f"Database initialization failed: {e}")
+    def initialize_database(self, run_online_migrations: bool = True) -> bool:
+        """
+        Brings the schema up to date through the migration runner (see migrations.py).
+        With run_online_migrations=False only the migrations required before serving are applied;
+        call start_background_migrations() afterwards for the rest.
+        """
+        runner = self._migration_runner()
+        if not runner.run(include_online=run_online_migrations):
+            logger.error("Database initialization failed")
             return False
-    
+        logger.info(f"Database initialized successfully (schema version {runner.current_version()})")
+        return True
+
+    def start_background_migrations(self):
+        """Applies the remaining online migrations in a background thread while the bot is serving."""
+        return self._migration_runner().run_in_background()
+
+    def stop_background_migrations(self, timeout: float = 10.0):
+        """Interrupts background migrations between batches; they resume on the next start."""
+        if self._runner is not None:
+            self._runner.stop(timeout)
+
+    def _migration_runner(self):
+        from hexaco_bot.src.data.migrations import MigrationRunner
+
+        if self._runner is None:
+            self._runner = MigrationRunner(
+                self,
+                batch_size=MIGRATION_BATCH_SIZE,
+                batch_pause=MIGRATION_BATCH_PAUSE_MS / 1000,
+                backup_dir=MIGRATION_BACKUP_DIR or None,
+            )
+        return self._runner
+
     def create_user(self, user_id: int, username: Optional[str], 
                    first_name: str, last_name: str, gender: str) -> bool:
         """Create new user record."""
@@ -121,20 +134,30 @@ class DatabaseManager:
                     VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (user_id, username, first_name, last_name, gender))
                 conn.commit()
-                logger.info(f"User created/updated: {user_id}")
+                logger.info("User created/updated: %s", user_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to create user {user_id}: {e}")
             return False
+        finally:
+            self.user_cache.invalidate(user_id)
     
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Get user by ID."""
+        """Get user by ID (served from user_cache when possible; callers get their own copy)."""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        generation = self.user_cache.generation(user_id)
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
                 row = cursor.fetchone()
-                return dict(row) if row else None
+                if not row:
+                    return None
+                user = dict(row)
+                self.user_cache.set(user_id, user, generation)
+                return dict(user)
         except sqlite3.Error as e:
             logger.error(f"Failed to get user {user_id}: {e}")
             return None
@@ -149,7 +172,7 @@ class DatabaseManager:
                     VALUES (?, ?, 'active')
                 ''', (session_id, user_id))
                 conn.commit()
-                logger.info(f"Test session created: {session_id}")
+                logger.info("Test session created: %s", session_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to create session {session_id}: {e}")
@@ -199,7 +222,7 @@ class DatabaseManager:
                     'session_id': session_id,
                     'user_id': user_id,
                     'test_type': test_type,
-                    'responses': responses_json,
+                    'responses': encode_responses(responses_json),
                     'scores_json': json.dumps(scores) # Store all scores as JSON for flexibility
                 }
                 
@@ -220,14 +243,30 @@ class DatabaseManager:
                 # Construct query dynamically (safer with placeholders)
                 columns = ", ".join(data.keys())
                 placeholders = ", ".join(["?" for _ in data])
-                sql = f"INSERT INTO results ({columns}) VALUES ({placeholders})"
-                
-                cursor.execute(sql, tuple(data.values()))
+                sql = f"INSERT INTO results ({columns}) VALUES ({placeholders}) RETURNING result_id, created_at"
+                result_id, created_at = cursor.execute(sql, tuple(data.values())).fetchone()
+                scale_values = flatten_scores(scores)
+                cursor.executemany(
+                    'INSERT INTO result_scales (result_id, test_type, scale_code, value) VALUES (?, ?, ?, ?)',
+                    [(result_id, test_type, code, value) for code, value in scale_values]
+                )
+                # NULL маска означает "неизвестно" и пересчитывается по results при следующем чтении
+                bit = COMPLETED_TEST_BITS.get(test_type, 0)
+                cursor.execute('''
+                    UPDATE users SET completed_tests_mask = completed_tests_mask | ?
+                    WHERE user_id = ? AND completed_tests_mask IS NOT NULL
+                ''', (bit, user_id))
+                aggregates.record_completion(conn, user_id, test_type, result_id, created_at)
+                if test_type in ARCHETYPE_TEST_TYPES:
+                    self.archetypes.assign(conn, user_id, test_type, scale_values)
                 conn.commit()
-                logger.info(f"Results for test {test_type} saved for session {session_id}")
+                # Та же операция над строкой в кэше: меню после теста не перечитывает пользователя
+                self.user_cache.update(user_id, lambda user: _with_completed_test(user, bit))
+                logger.info("Results for test %s saved for session %s", test_type, session_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to save {test_type} results for session {session_id}: {e}")
+            self.user_cache.invalidate(user_id)
             return False
     
     def get_user_test_results(self, user_id: int, test_type: str) -> List[Dict[str, Any]]:
@@ -243,11 +282,98 @@ class DatabaseManager:
                 ''', (user_id, test_type))
                 rows = cursor.fetchall()
                 # Parse scores_json back to dict if needed or return raw
-                return [dict(row) for row in rows]
+                results = [dict(row) for row in rows]
+                for result in results:
+                    result['responses'] = responses_as_json(result['responses'])
+                return results
         except sqlite3.Error as e:
             logger.error(f"Failed to get {test_type} results for user {user_id}: {e}")
             return []
 
+    def get_scale_statistics(self, test_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Count/mean/min/max of every scale across all users, computed in SQL from result_scales."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                sql = '''
+                    SELECT test_type, scale_code, COUNT(*) AS n, AVG(value) AS mean,
+                           MIN(value) AS min, MAX(value) AS max
+                    FROM result_scales
+                '''
+                params: tuple = ()
+                if test_type:
+                    sql += ' WHERE test_type = ?'
+                    params = (test_type,)
+                sql += ' GROUP BY test_type, scale_code ORDER BY test_type, scale_code'
+                cursor.execute(sql, params)
+                return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get scale statistics: {e}")
+            return []
+
+    def get_user_test_counts(self, user_id: int) -> Dict[str, int]:
+        """{test_type: how many times the user completed it}, from the materialized counters."""
+        try:
+            with self.get_connection() as conn:
+                return aggregates.user_test_counts(conn, user_id)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get test counts for user {user_id}: {e}")
+            return {}
+
+    def get_completion_counts(self) -> Dict[str, Dict[str, int]]:
+        """{test_type: {'completions': N, 'users': M}} over all users."""
+        try:
+            with self.get_connection() as conn:
+                return aggregates.completion_counts(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get completion counts: {e}")
+            return {}
+
+    def get_daily_completions(self, since: Optional[str] = None, test_type: Optional[str] = None) -> List[tuple]:
+        """[(day, test_type, completions)] from `since` (YYYY-MM-DD) on."""
+        try:
+            with self.get_connection() as conn:
+                return aggregates.daily_completions(conn, since, test_type)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get daily completions: {e}")
+            return []
+
+    def reconcile_aggregates(self) -> int:
+        """Repairs the completion counters from results (e.g. after a script deleted results); -1 on error."""
+        try:
+            with self.get_connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                fixed = aggregates.reconcile(conn)
+                conn.commit()
+            if fixed:
+                logger.warning(f"Aggregate counters reconciliation corrected {fixed} row(s)")
+            return fixed
+        except sqlite3.Error as e:
+            logger.error(f"Failed to reconcile aggregate counters: {e}")
+            return -1
+
+    def get_latest_admin_event_id(self) -> int:
+        """Id of the newest admin event (0 if there are none); a process starts listening after it."""
+        try:
+            with self.get_connection() as conn:
+                return conn.execute('SELECT COALESCE(MAX(event_id), 0) FROM admin_events').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get latest admin event id: {e}")
+            return 0
+
+    def get_admin_events(self, after_id: int) -> List[Dict[str, Any]]:
+        """Admin events newer than `after_id`, oldest first ({'event_id', 'kind', 'payload'} with payload decoded)."""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT event_id, kind, payload FROM admin_events WHERE event_id > ? ORDER BY event_id
+                ''', (after_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get admin events after {after_id}: {e}")
+            return []
+        return [{'event_id': row['event_id'], 'kind': row['kind'], 'payload': json.loads(row['payload'])}
+                for row in rows]
+
     def get_all_user_results(self, user_id: int) -> Dict[str, List[Dict[str, Any]]]:
         """Get all test results for a user, grouped by test_type."""
         all_results = {}
@@ -285,16 +411,20 @@ class DatabaseManager:
                     WHERE user_id = ?
                 ''', (user_id,))
                 conn.commit()
-                logger.info(f"Overall completion status set for user {user_id}")
+                logger.info("Overall completion status set for user %s", user_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to set overall completion status for user {user_id}: {e}")
             return False
+        finally:
+            self.user_cache.invalidate(user_id)
 
     def get_completed_tests_for_user(self, user_id: int) -> Dict[str, bool]:
         """
         Get precise information about which tests have been completed by the user.
         Returns a dictionary with test names as keys and completion status as values.
+        Reads users.completed_tests_mask (usually from user_cache); results are scanned only when
+        the mask is unknown (NULL), and the computed mask is stored back.
         """
         completed_tests = {
             'hexaco': False,
@@ -306,29 +436,88 @@ class DatabaseManager:
             'rfq': False,
             'pid5bfm': False
         }
-        
+
+        user = self.get_user(user_id)
+        mask = user.get('completed_tests_mask') if user else None
+        if mask is None:
+            mask = self._refresh_completed_tests_mask(user_id)
+            if mask is None:
+                return completed_tests  # Return default (all False) on error
+
+        for test_type in completed_tests:
+            completed_tests[test_type] = bool(mask & COMPLETED_TEST_BITS[test_type])
+        logger.debug("Completed tests for user %s: %s", user_id, completed_tests)
+        return completed_tests
+
+    def _refresh_completed_tests_mask(self, user_id: int) -> Optional[int]:
+        """Recomputes the user's mask from results and stores it; None on error."""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                # Get all test types that have results for this user
-                cursor.execute('''
-                    SELECT DISTINCT test_type 
-                    FROM results 
-                    WHERE user_id = ?
-                ''', (user_id,))
-                rows = cursor.fetchall()
-                
-                for row in rows:
-                    test_type = row['test_type']
-                    if test_type in completed_tests:
-                        completed_tests[test_type] = True
-                
-                logger.info(f"Completed tests for user {user_id}: {completed_tests}")
-                return completed_tests
-                
+                # BEGIN IMMEDIATE: save_test_result не может вклиниться между чтением results и записью маски
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('SELECT DISTINCT test_type FROM results WHERE user_id = ?', (user_id,))
+                mask = completed_tests_mask(row['test_type'] for row in cursor.fetchall())
+                cursor.execute('UPDATE users SET completed_tests_mask = ? WHERE user_id = ?', (mask, user_id))
+                conn.commit()
+                return mask
         except sqlite3.Error as e:
             logger.error(f"Failed to get completed tests for user {user_id}: {e}")
-            return completed_tests  # Return default (all False) on error
+            return None
+        finally:
+            self.user_cache.invalidate(user_id)
+
+    def reconcile_completed_tests(self, batch_size: int = 500) -> int:
+        """
+        Compares users.completed_tests_mask with results for every user and fixes the masks that differ
+        (e.g. after results were deleted by a script). Users are processed in batches, each batch in
+        its own short write transaction; the corrected users are announced as a cache-only
+        'evict_users' admin event, so every bot process drops their cached rows, not only this one.
+        Returns the number of corrected users, or -1 on error.
+        """
+        fixed = 0
+        last_user_id = None
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                while True:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.execute('''
+                        SELECT user_id, completed_tests_mask FROM users
+                        WHERE ? IS NULL OR user_id > ? ORDER BY user_id LIMIT ?
+                    ''', (last_user_id, last_user_id, batch_size))
+                    users = cursor.fetchall()
+                    if not users:
+                        conn.commit()
+                        break
+                    first_user_id, last_user_id = users[0]['user_id'], users[-1]['user_id']
+                    cursor.execute('''
+                        SELECT DISTINCT user_id, test_type FROM results WHERE user_id BETWEEN ? AND ?
+                    ''', (first_user_id, last_user_id))
+                    test_types: Dict[int, List[str]] = {}
+                    for row in cursor.fetchall():
+                        test_types.setdefault(row['user_id'], []).append(row['test_type'])
+                    updates = []
+                    for user in users:
+                        mask = completed_tests_mask(test_types.get(user['user_id'], ()))
+                        if user['completed_tests_mask'] != mask:
+                            updates.append((mask, user['user_id']))
+                    cursor.executemany('UPDATE users SET completed_tests_mask = ? WHERE user_id = ?', updates)
+                    if updates:
+                        publish_admin_event(conn, EVICT_USERS,
+                                            {'user_ids': [user_id for _, user_id in updates], 'cache_only': True})
+                    conn.commit()
+                    for _, user_id in updates:
+                        self.user_cache.invalidate(user_id)
+                    fixed += len(updates)
+            if fixed:
+                logger.warning(f"Completed tests reconciliation corrected {fixed} user(s)")
+            else:
+                logger.info("Completed tests reconciliation: all masks match results")
+            return fixed
+        except sqlite3.Error as e:
+            logger.error(f"Failed to reconcile completed tests: {e}")
+            return -1
 
     def update_user_paei(self, user_id: int, paei_index: str) -> bool:
         """Update user's PAEI index."""
@@ -341,11 +530,13 @@ class DatabaseManager:
                     WHERE user_id = ?
                 ''', (paei_index, user_id))
                 conn.commit()
-                logger.info(f"PAEI index updated for user {user_id}")
+                logger.info("PAEI index updated for user %s", user_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to update PAEI index for user {user_id}: {e}")
             return False
+        finally:
+            self.user_cache.invalidate(user_id)
 
     def update_user_mbti(self, user_id: int, mbti_type: str) -> bool:
         """Update user's MBTI type."""
@@ -358,11 +549,30 @@ class DatabaseManager:
                     WHERE user_id = ?
                 ''', (mbti_type, user_id))
                 conn.commit()
-                logger.info(f"MBTI type updated for user {user_id}")
+                logger.info("MBTI type updated for user %s", user_id)
                 return True
         except sqlite3.Error as e:
             logger.error(f"Failed to update MBTI type for user {user_id}: {e}")
             return False
+        finally:
+            self.user_cache.invalidate(user_id)
+
+    def _get_archetype(self, conn: sqlite3.Connection, user_id: int) -> Optional[Dict[str, Any]]:
+        row = conn.execute('''
+            SELECT a.model_id, a.cluster, a.distance, a.assigned_at, m.labels
+            FROM archetype_assignments a JOIN archetype_models m ON m.model_id = a.model_id
+            WHERE a.user_id = ?
+        ''', (user_id,)).fetchone()
+        if row is None:
+            return None
+        labels = json.loads(row['labels'])
+        return {
+            'model_id': row['model_id'],
+            'cluster': row['cluster'],
+            'label': labels[row['cluster']] if row['cluster'] < len(labels) else None,
+            'distance': row['distance'],
+            'assigned_at': row['assigned_at'],
+        }
 
     def get_user_data_for_report(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get all user data and test results for reporting."""
@@ -397,10 +607,17 @@ class DatabaseManager:
                     
                     result_entry = {
                         "scores": json.loads(row['scores_json']) if row['scores_json'] else None,
-                        "responses": json.loads(row['responses']) if row['responses'] else None,
+                        "responses": decode_responses(row['responses']),
                         "completed_at": row['created_at'] # Assuming created_at of result is completion time
                     }
                     test_results[test_type].append(result_entry)
+
+                # Архетип необязателен: ошибка его чтения не должна терять уже прочитанные результаты
+                try:
+                    report_data['archetype'] = self._get_archetype(conn, user_id)
+                except (sqlite3.Error, ValueError) as e:
+                    logger.error(f"Failed to get archetype of user {user_id} for report: {e}")
+                    report_data['archetype'] = None
             
             report_data['tests'] = test_results
             return report_data
@@ -410,7 +627,7 @@ class DatabaseManager:
             # Return user_data even if results fetching fails, or handle as per requirements
             report_data['tests'] = {} # or None, or an error message
             return report_data # Or return None if results are critical
-        except json.JSONDecodeError as e:
+        except ValueError as e:  # json.JSONDecodeError or an unknown responses encoding
             logger.error(f"Failed to parse JSON for user {user_id} results: {e}")
             report_data['tests'] = {"error": "Failed to parse test results JSON."}
             return report_data 
\ No newline at end of file
@@ -0,0 +1,415 @@
+"""
+Columnar export of users and results for offline analysis.
+
+Instead of reading user_reports/*.json one by one, notebooks load the whole dataset from a few
+columnar files:
+
+    <output>/users.<ext>                      every user, rewritten on each export
+    <output>/<test_type>/part-<first>-<last>.<ext>
+                                              results of one test: result_id, user_id, session_id,
+                                              created_at, one column per scale_code (float) and one
+                                              column per question, q1..qN (answer or null)
+    <output>/watermark.json                   the highest exported result_id, the format and the
+                                              columns of every test
+
+The format is Parquet or Arrow IPC (both need pyarrow) with CSV as the fallback. Rows are read from
+SQLite with fetchmany and written chunk by chunk (a Parquet row group / an Arrow record batch per
+chunk), so memory stays bounded by `chunk_size` whatever the size of the database. The database is
+opened read-only and read in one transaction: the export can run next to a working bot and sees a
+consistent snapshot.
+
+Each run appends only results with result_id above the watermark, as a new part file per test; the
+watermark is advanced after all parts are in place, and parts left by an interrupted run are removed
+by the next one. --full drops the previous export and starts from zero.
+
+All parts of a test have the same columns: the first part fixes the scale codes and the number of
+questions and the watermark keeps them, later parts are written with that list. A scale first saved
+after that is left out with a warning until the next --full export.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.export                      # incremental, to EXPORT_DIR
+    python -m hexaco_bot.src.data.export --format csv --output ./exports
+    python -m hexaco_bot.src.data.export --full
+
+Loading (pyarrow):
+    import pyarrow.dataset as ds
+    hexaco = ds.dataset('exports/hexaco', format='parquet').to_table().to_pandas()
+
+CSV parts carry no types; the columns stored in the watermark give one schema for all parts:
+    import json, pyarrow as pa
+    layout = json.load(open('exports/watermark.json'))['columns']['hexaco']
+    schema = pa.schema([('result_id', pa.int64()), ('user_id', pa.int64()), ('session_id', pa.string()),
+                        ('created_at', pa.string())]
+                       + [(code, pa.float64()) for code in layout['scales']]
+                       + [(f"q{n}", pa.int16()) for n in range(1, layout['items'] + 1)])
+    hexaco = ds.dataset('exports/hexaco', format='csv', schema=schema).to_table().to_pandas()
+"""
+
+import os
+import re
+import importlib
+import csv
+import json
+import shutil
+import sqlite3
+import logging
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from hexaco_bot.src.data.response_codec import RESPONSES_CODEC_VERSION, MISSING_ANSWER, decode_responses
+
+try:
+    import pyarrow
+except ImportError:  # pyarrow не обязателен: без него экспорт пишет CSV
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('parquet', 'arrow', 'csv')
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+WATERMARK_FILE = 'watermark.json'
+RESULT_COLUMNS = ('result_id', 'user_id', 'session_id', 'created_at')
+PART_RE = re.compile(r'^part-(\d+)-(\d+)\.')
+
+
+def default_format() -> str:
+    return 'parquet' if pyarrow is not None else 'csv'
+
+
+def question_counts() -> Dict[str, Optional[int]]:
+    """
+    Number of questions of every instrument in COMPLETED_TEST_BITS, i.e. how many q<N> columns its
+    results get; None for an instrument without a question bank in this tree (its count is then taken
+    from the stored responses, see _stored_question_count).
+    """
+    from hexaco_bot.src.data.database import COMPLETED_TEST_BITS
+
+    counts = {}
+    for test_type in COMPLETED_TEST_BITS:
+        # hexaco_questions.get_total_questions, у остальных <test>_questions.get_total_<test>_questions
+        function_name = 'get_total_questions' if test_type == 'hexaco' else f"get_total_{test_type}_questions"
+        try:
+            module = importlib.import_module(f"hexaco_bot.src.data.{test_type}_questions")
+            counts[test_type] = getattr(module, function_name)()
+        except (ImportError, AttributeError):
+            counts[test_type] = None
+    return counts
+
+
+def _stored_question_count(conn: sqlite3.Connection, test_type: str, upper: int) -> int:
+    """Highest question number among the stored responses of `test_type` (up to result_id `upper`)."""
+    # BLOB v1: байт версии и по байту на вопрос, длина дает номер последнего вопроса
+    count = conn.execute(
+        "SELECT COALESCE(MAX(length(responses)) - 1, 0) FROM results "
+        "WHERE test_type = ? AND result_id <= ? AND typeof(responses) = 'blob'", (test_type, upper)).fetchone()[0]
+    for result_id, stored in conn.execute(
+            "SELECT result_id, responses FROM results "
+            "WHERE test_type = ? AND result_id <= ? AND typeof(responses) = 'text'", (test_type, upper)):
+        try:
+            numbers = [int(question) for question in (decode_responses(stored) or {})]
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Result {result_id}: responses not counted ({e})")
+            continue
+        count = max([count] + numbers)
+    return count
+
+
+def _column_kind(declared_type: str) -> str:
+    """SQLite declared type -> 'int' | 'float' | 'str' (type affinity rules, simplified)."""
+    declared_type = (declared_type or '').upper()
+    if 'INT' in declared_type:
+        return 'int'
+    if any(name in declared_type for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'float'
+    return 'str'
+
+
+class _PartWriter:
+    """Writes one file chunk by chunk; the file appears under its final name only after close()."""
+
+    def __init__(self, path: str, fmt: str, columns: Sequence[Tuple[str, str]]):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.fmt = fmt
+        self.names = [name for name, _ in columns]
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        if fmt == 'csv':
+            self._file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.names)
+            return
+        types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string(),
+                 'item': pyarrow.int16()}
+        self._schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression='zstd')
+        else:
+            from pyarrow import ipc
+            self._file = pyarrow.OSFile(self.tmp_path, 'wb')
+            self._writer = ipc.new_file(self._file, self._schema)
+
+    def write(self, columns: List[list]):
+        if not columns or not columns[0]:
+            return
+        self.rows += len(columns[0])
+        if self.fmt == 'csv':
+            self._writer.writerows(zip(*columns))
+            return
+        self._writer.write_batch(pyarrow.record_batch(columns, schema=self._schema))
+
+    def close(self):
+        if self.fmt != 'csv':
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        try:
+            if self.fmt != 'csv':
+                self._writer.close()
+            if self._file is not None:
+                self._file.close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+
+@dataclass
+class ExportResult:
+    output_dir: str
+    fmt: str
+    from_result_id: int  # экспортированы результаты с result_id > from_result_id ...
+    to_result_id: int  # ... и <= to_result_id
+    users: int = 0
+    results: Dict[str, int] = field(default_factory=dict)  # test_type -> строк
+    files: List[str] = field(default_factory=list)
+    # test_type -> {'scales': [scale_code, ...], 'items': N}: колонки всех частей теста
+    columns: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+class ColumnarExporter:
+    """Incremental export of a bot database into `output_dir` (see the module docstring)."""
+
+    def __init__(self, db_path: str, output_dir: str, fmt: Optional[str] = None, chunk_size: int = 5000):
+        fmt = fmt or default_format()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}, expected one of {FORMATS}")
+        if fmt != 'csv' and pyarrow is None:
+            raise ValueError(f"Format {fmt!r} requires pyarrow (pip install pyarrow), use --format csv")
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.ext = EXTENSIONS[fmt]
+
+    @property
+    def watermark_path(self) -> str:
+        return os.path.join(self.output_dir, WATERMARK_FILE)
+
+    def read_watermark(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.watermark_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_watermark(self, result: ExportResult):
+        state = {'result_id': result.to_result_id, 'format': self.fmt,
+                 'exported_at': datetime.now().isoformat(timespec='seconds'), 'columns': result.columns}
+        tmp_path = self.watermark_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.watermark_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def export(self, full: bool = False) -> ExportResult:
+        if full and os.path.isdir(self.output_dir):
+            shutil.rmtree(self.output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = self.read_watermark()
+        if state and state.get('format') != self.fmt:
+            raise ValueError(f"{self.output_dir} holds a {state.get('format')} export, "
+                             f"use --format {state.get('format')} or --full")
+        watermark = int(state['result_id']) if state else 0
+        self._remove_unfinished_parts(watermark)
+
+        conn = self._connect()
+        try:
+            # Одна читающая транзакция: пользователи и результаты из одного снимка базы
+            conn.execute('BEGIN')
+            upper = conn.execute('SELECT COALESCE(MAX(result_id), 0) FROM results').fetchone()[0]
+            result = ExportResult(self.output_dir, self.fmt, watermark, max(upper, watermark),
+                                  columns=dict(state.get('columns', {})) if state else {})
+            result.users = self._export_users(conn, result)
+            if upper > watermark:
+                test_types = [row[0] for row in conn.execute(
+                    'SELECT DISTINCT test_type FROM results WHERE result_id > ? AND result_id <= ? ORDER BY 1',
+                    (watermark, upper))]
+                counts = question_counts()
+                for test_type in test_types:
+                    if test_type not in result.columns:
+                        # Первая часть теста задает его колонки, следующие части пишутся с теми же
+                        result.columns[test_type] = self._result_layout(conn, test_type, upper, counts)
+                    result.results[test_type] = self._export_results(conn, test_type, watermark, upper, result)
+        finally:
+            conn.close()
+        self._write_watermark(result)
+        logger.info(f"Exported {result.users} users and {sum(result.results.values())} results "
+                    f"(result_id {watermark + 1}..{result.to_result_id}) to {self.output_dir} as {self.fmt}")
+        return result
+
+    def _remove_unfinished_parts(self, watermark: int):
+        """Parts beyond the watermark come from a run that did not finish; it is repeated in full."""
+        for test_dir in os.scandir(self.output_dir):
+            if not test_dir.is_dir():
+                continue
+            for entry in os.scandir(test_dir.path):
+                match = PART_RE.match(entry.name)
+                if entry.name.endswith('.tmp') or (match and int(match.group(1)) > watermark):
+                    logger.warning(f"Removing unfinished export part {entry.path}")
+                    os.remove(entry.path)
+
+    def _export_users(self, conn: sqlite3.Connection, result: ExportResult) -> int:
+        columns = [(row[1], _column_kind(row[2])) for row in conn.execute('PRAGMA table_info(users)')]
+        path = os.path.join(self.output_dir, 'users' + self.ext)
+        writer = _PartWriter(path, self.fmt, columns)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(name for name, _ in columns)} FROM users ORDER BY user_id")
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                writer.write([list(column) for column in zip(*rows)])
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        result.files.append(path)
+        return writer.rows
+
+    @staticmethod
+    def _result_layout(conn: sqlite3.Connection, test_type: str, upper: int,
+                       counts: Dict[str, Optional[int]]) -> Dict[str, Any]:
+        """Scale and question columns for the first part of `test_type`; stored in the watermark."""
+        scale_codes = [row[0] for row in conn.execute(
+            'SELECT DISTINCT scale_code FROM result_scales WHERE test_type = ? AND result_id <= ? ORDER BY scale_code',
+            (test_type, upper))]
+        item_count = counts.get(test_type)
+        if item_count is None:
+            item_count = _stored_question_count(conn, test_type, upper)
+        return {'scales': scale_codes, 'items': item_count}
+
+    def _export_results(self, conn: sqlite3.Connection, test_type: str, watermark: int, upper: int,
+                        result: ExportResult) -> int:
+        layout = result.columns[test_type]
+        scale_codes, item_count = layout['scales'], layout['items']
+        scale_index = {code: i for i, code in enumerate(scale_codes)}
+        new_codes = [row[0] for row in conn.execute(
+            'SELECT DISTINCT scale_code FROM result_scales WHERE result_id > ? AND result_id <= ? AND test_type = ?',
+            (watermark, upper, test_type)) if row[0] not in scale_index]
+        if new_codes:
+            logger.warning(f"{test_type}: scales {sorted(new_codes)} are not in the columns of the previous parts "
+                           f"and are not exported, run with --full to add them")
+        columns = [('result_id', 'int'), ('user_id', 'int'), ('session_id', 'str'), ('created_at', 'str')]
+        columns += [(code, 'float') for code in scale_codes]
+        columns += [(f"q{number}", 'item') for number in range(1, item_count + 1)]
+
+        test_dir = os.path.join(self.output_dir, test_type)
+        os.makedirs(test_dir, exist_ok=True)
+        # Имя части - диапазон result_id, который она покрывает
+        path = os.path.join(test_dir, f"part-{watermark + 1:010d}-{upper:010d}{self.ext}")
+        writer = _PartWriter(path, self.fmt, columns)
+        try:
+            cursor = conn.execute(f'''
+                SELECT {', '.join(RESULT_COLUMNS)}, responses FROM results
+                WHERE test_type = ? AND result_id > ? AND result_id <= ?
+                ORDER BY result_id
+            ''', (test_type, watermark, upper))
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                writer.write(self._result_columns(conn, test_type, rows, scale_index, item_count))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        result.files.append(path)
+        return writer.rows
+
+    def _result_columns(self, conn: sqlite3.Connection, test_type: str, rows: List[tuple],
+                        scale_index: Dict[str, int], item_count: int) -> List[list]:
+        base = [list(column) for column in zip(*(row[:4] for row in rows))]
+        position = {row[0]: i for i, row in enumerate(rows)}
+        scales = [[None] * len(rows) for _ in scale_index]
+        # Строки отсортированы по result_id: шкалы всего чанка - один диапазон первичного ключа
+        for result_id, scale_code, value in conn.execute(
+                'SELECT result_id, scale_code, value FROM result_scales '
+                'WHERE result_id BETWEEN ? AND ? AND test_type = ?', (rows[0][0], rows[-1][0], test_type)):
+            row_index = position.get(result_id)
+            column_index = scale_index.get(scale_code)
+            if row_index is not None and column_index is not None:
+                scales[column_index][row_index] = value
+
+        if not item_count:
+            return base + scales
+        answers = [_answers(row[0], row[4], item_count) for row in rows]
+        items = [[None if value == MISSING_ANSWER else value for value in column] for column in zip(*answers)]
+        return base + scales + items
+
+
+def _answers(result_id: int, stored, item_count: int) -> List[int]:
+    """Answers to questions 1..item_count, MISSING_ANSWER where there is none."""
+    if isinstance(stored, bytes) and stored and stored[0] == RESPONSES_CODEC_VERSION:
+        # BLOB v1: байт i+1 - ответ на вопрос i+1, разбирать словарь не нужно
+        values = list(memoryview(stored)[1:item_count + 1].cast('b'))
+        return values + [MISSING_ANSWER] * (item_count - len(values))
+    values = [MISSING_ANSWER] * item_count
+    try:
+        for question, answer in (decode_responses(stored) or {}).items():
+            number = int(question)
+            if 1 <= number <= item_count:
+                values[number - 1] = int(answer)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Result {result_id}: responses not exported ({e})")
+    return values
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import DATABASE_PATH, EXPORT_DIR
+
+    parser = argparse.ArgumentParser(description="Export users and results into columnar files (Parquet/Arrow/CSV).")
+    parser.add_argument("--output", default=EXPORT_DIR or None,
+                        help="Export directory (default: EXPORT_DIR or <db dir>/exports).")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="File format (default: parquet with pyarrow installed, else csv).")
+    parser.add_argument("--full", action="store_true", help="Drop the previous export and export everything.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows read and written at a time.")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    output_dir = args.output or os.path.join(os.path.dirname(os.path.abspath(args.db)), 'exports')
+    try:
+        exporter = ColumnarExporter(args.db, output_dir, args.format, args.chunk_size)
+        result = exporter.export(full=args.full)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        logger.error(f"Export failed: {e}")
+        return 1
+    for test_type, rows in result.results.items():
+        print(f"{test_type:<16} {rows:>8} results")
+    print(f"{'users':<16} {result.users:>8}")
+    print(f"watermark: result_id {result.to_result_id} ({result.fmt}, {output_dir})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
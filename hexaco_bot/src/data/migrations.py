@@ -0,0 +1,564 @@
+"""
+Versioned schema migrations for the bot database.
+
+Applied migrations are recorded in the `schema_version` table. A migration either runs as one short
+transaction (`apply`) or processes `results` in bounded batches (`batch`), each batch in its own
+transaction with a pause in between, so the bot's own queries never wait on the database lock for
+long. Migrations marked `online` may run in a background thread after the bot has started serving:
+every reader already understands both the old and the new data layout.
+
+Before the first pending migration the database is copied with the online backup API
+(sqlite3.Connection.backup), page by page, without blocking other connections.
+
+An interrupted migration (status 'running') resumes on the next start from the last rowid recorded
+in schema_version.progress: `apply` ran in the transaction that created the row and is not repeated,
+and every batch commits together with its progress. stop() interrupts a background run between two
+batches.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from hexaco_bot.src.data.backup import backup_database
+from hexaco_bot.src.data.response_codec import encode_responses
+
+logger = logging.getLogger(__name__)
+
+# (conn, last_rowid, upper_rowid, batch_size) -> last processed rowid, or None when nothing is left.
+# Batched migrations walk `results` by rowid up to the max rowid seen when the migration started:
+# rows inserted later are already written in the new format by the running code.
+BatchStep = Callable[[sqlite3.Connection, int, int, int], Optional[int]]
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    apply: Optional[Callable[[sqlite3.Connection], None]] = None
+    batch: Optional[BatchStep] = None
+    finalize: Optional[Callable[[sqlite3.Connection, int], None]] = None
+    online: bool = False  # можно выполнять в фоне, когда бот уже обслуживает пользователей
+
+
+# ---------------------------------------------------------------------------------------------
+# v1: исходная схема (совпадает с тем, что раньше создавал initialize_database)
+# ---------------------------------------------------------------------------------------------
+
+def _v1_baseline(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            gender TEXT NOT NULL CHECK (gender IN ('male', 'female')),
+            paei_index TEXT,
+            mbti_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            overall_completion_status_set_at TIMESTAMP DEFAULT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS test_sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('active', 'completed', 'abandoned')),
+            current_question INTEGER DEFAULT 1,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS results (
+            result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            test_type TEXT NOT NULL CHECK (test_type IN ('hexaco', 'sds', 'svs', 'panas', 'self_efficacy', 'cdrisc', 'rfq', 'pid5bfm')),
+            honesty_humility REAL,
+            emotionality REAL,
+            extraversion REAL,
+            agreeableness REAL,
+            conscientiousness REAL,
+            openness REAL,
+            altruism REAL,
+            self_contact REAL,
+            choiceful_action REAL,
+            sds_index REAL,
+            scores_json TEXT,
+            responses TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES test_sessions (session_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_user_id ON users (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON test_sessions (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_status ON test_sessions (status)')
+    _create_results_indexes(conn)
+
+
+def _create_results_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_results_user_id ON results (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_results_session_id ON results (session_id)')
+
+
+# ---------------------------------------------------------------------------------------------
+# v2/v3: result_scales и его заполнение для старых результатов
+# ---------------------------------------------------------------------------------------------
+
+def _v2_result_scales(conn: sqlite3.Connection):
+    # result_id is the rowid of results (same as results.result_id)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_scales (
+            result_id INTEGER NOT NULL,
+            test_type TEXT NOT NULL,
+            scale_code TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (result_id, scale_code)
+        ) WITHOUT ROWID
+    ''')
+    # Covering index for cross-user aggregation by scale
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_result_scales_scale ON result_scales (test_type, scale_code, value)')
+
+
+def _v3_drop_orphan_scales(conn: sqlite3.Connection):
+    conn.execute('DELETE FROM result_scales WHERE result_id NOT IN (SELECT rowid FROM results)')
+
+
+def _v3_backfill_scales_batch(conn: sqlite3.Connection, last_rowid: int, upper_rowid: int,
+                              batch_size: int) -> Optional[int]:
+    from hexaco_bot.src.data.database import flatten_scores
+
+    rows = conn.execute('''
+        SELECT r.rowid, r.test_type, r.scores_json FROM results r
+        WHERE r.rowid > ? AND r.rowid <= ? ORDER BY r.rowid LIMIT ?
+    ''', (last_rowid, upper_rowid, batch_size)).fetchall()
+    if not rows:
+        return None
+    values = []
+    for result_id, test_type, scores_json in rows:
+        if not scores_json:
+            continue
+        try:
+            scores = json.loads(scores_json)
+        except ValueError:
+            logger.warning(f"Skipping result {result_id}: scores_json is not valid JSON")
+            continue
+        if isinstance(scores, dict):
+            values.extend((result_id, test_type, code, value) for code, value in flatten_scores(scores))
+    conn.executemany(
+        'INSERT OR IGNORE INTO result_scales (result_id, test_type, scale_code, value) VALUES (?, ?, ?, ?)', values
+    )
+    return rows[-1][0]
+
+
+# ---------------------------------------------------------------------------------------------
+# v4: responses -> компактный BLOB (см. response_codec)
+# ---------------------------------------------------------------------------------------------
+
+def _v4_encode_responses_batch(conn: sqlite3.Connection, last_rowid: int, upper_rowid: int,
+                               batch_size: int) -> Optional[int]:
+    rows = conn.execute('''
+        SELECT rowid, responses FROM results
+        WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?
+    ''', (last_rowid, upper_rowid, batch_size)).fetchall()
+    if not rows:
+        return None
+    updates = []
+    for rowid, responses in rows:
+        if not isinstance(responses, str):
+            continue
+        try:
+            encoded = encode_responses(responses)
+        except ValueError:
+            logger.warning(f"Result {rowid}: responses are not valid JSON, left as is")
+            continue
+        if isinstance(encoded, bytes):
+            updates.append((encoded, rowid))
+    conn.executemany('UPDATE results SET responses = ? WHERE rowid = ?', updates)
+    return rows[-1][0]
+
+
+# ---------------------------------------------------------------------------------------------
+# v5: пересборка results без жесткого списка test_type в CHECK.
+# Заодно чинит старые базы, где result_id был обычной колонкой INT (а не INTEGER PRIMARY KEY):
+# новым result_id становится rowid, на который уже ссылается result_scales.
+# ---------------------------------------------------------------------------------------------
+
+RESULTS_COLUMNS = (
+    'session_id, user_id, test_type, honesty_humility, emotionality, extraversion, agreeableness, '
+    'conscientiousness, openness, altruism, self_contact, choiceful_action, sds_index, scores_json, '
+    'responses, created_at'
+)
+
+
+def _v5_create_results_new(conn: sqlite3.Connection):
+    conn.execute('DROP TABLE IF EXISTS results_new')
+    conn.execute('''
+        CREATE TABLE results_new (
+            result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            test_type TEXT NOT NULL,
+            honesty_humility REAL,
+            emotionality REAL,
+            extraversion REAL,
+            agreeableness REAL,
+            conscientiousness REAL,
+            openness REAL,
+            altruism REAL,
+            self_contact REAL,
+            choiceful_action REAL,
+            sds_index REAL,
+            scores_json TEXT,
+            responses TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES test_sessions (session_id),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+
+
+def _v5_copy_results_batch(conn: sqlite3.Connection, last_rowid: int, upper_rowid: int,
+                           batch_size: int) -> Optional[int]:
+    row = conn.execute('''
+        SELECT MAX(rowid) FROM (SELECT rowid FROM results WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?)
+    ''', (last_rowid, upper_rowid, batch_size)).fetchone()
+    if row[0] is None:
+        return None
+    conn.execute(f'''
+        INSERT INTO results_new (result_id, {RESULTS_COLUMNS})
+        SELECT rowid, {RESULTS_COLUMNS} FROM results WHERE rowid > ? AND rowid <= ?
+    ''', (last_rowid, row[0]))
+    return row[0]
+
+
+def _v5_swap_results(conn: sqlite3.Connection, last_rowid: int):
+    # Короткая финальная транзакция: догоняем строки, добавленные/удаленные во время копирования
+    conn.execute(f'''
+        INSERT INTO results_new (result_id, {RESULTS_COLUMNS})
+        SELECT rowid, {RESULTS_COLUMNS} FROM results WHERE rowid > ?
+    ''', (last_rowid,))
+    conn.execute('DELETE FROM results_new WHERE result_id NOT IN (SELECT rowid FROM results)')
+    conn.execute('DROP TABLE results')
+    conn.execute('ALTER TABLE results_new RENAME TO results')
+    _create_results_indexes(conn)
+
+
+# ---------------------------------------------------------------------------------------------
+# v6: users.completed_tests_mask - пройденные тесты битами (см. COMPLETED_TEST_BITS в database.py).
+# NULL означает "неизвестно": такая маска пересчитывается по results при первом чтении
+# (get_completed_tests_for_user) или пачками фоновой сверкой (reconcile_completed_tests),
+# поэтому миграция только добавляет колонку и не сканирует results под блокировкой
+# ---------------------------------------------------------------------------------------------
+
+def _v6_completed_tests_mask(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    if 'completed_tests_mask' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN completed_tests_mask INTEGER')
+
+
+# ---------------------------------------------------------------------------------------------
+# v7: архетипы - модели k-means (archetypes.py) и назначение пользователей кластерам
+# ---------------------------------------------------------------------------------------------
+
+def _v7_archetypes(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archetype_models (
+            model_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            k INTEGER NOT NULL,
+            features TEXT NOT NULL,
+            mean TEXT NOT NULL,
+            std TEXT NOT NULL,
+            centroids TEXT NOT NULL,
+            labels TEXT NOT NULL,
+            inertia REAL,
+            users INTEGER NOT NULL,
+            active INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archetype_assignments (
+            user_id INTEGER PRIMARY KEY,
+            model_id INTEGER NOT NULL,
+            cluster INTEGER NOT NULL,
+            distance REAL NOT NULL,
+            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# ---------------------------------------------------------------------------------------------
+# v8: материализованные счетчики прохождений (aggregates.py), заполняются по results пачками.
+# Результаты, сохраненные во время миграции, уже учтены record_completion и лежат за upper_rowid
+# ---------------------------------------------------------------------------------------------
+
+def _v8_aggregates(conn: sqlite3.Connection):
+    from hexaco_bot.src.data import aggregates
+
+    aggregates.create_tables(conn)
+    for table in aggregates.AGGREGATE_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+
+
+def _v8_count_results_batch(conn: sqlite3.Connection, last_rowid: int, upper_rowid: int,
+                            batch_size: int) -> Optional[int]:
+    from hexaco_bot.src.data import aggregates
+
+    row = conn.execute('''
+        SELECT MAX(rowid) FROM (SELECT rowid FROM results WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?)
+    ''', (last_rowid, upper_rowid, batch_size)).fetchone()
+    if row[0] is None:
+        return None
+    aggregates.add_results(conn, last_rowid, row[0])
+    return row[0]
+
+
+# ---------------------------------------------------------------------------------------------
+# v9: admin_events - команды администраторских скриптов работающим процессам бота (purge.py)
+# ---------------------------------------------------------------------------------------------
+
+def _v9_admin_events(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS admin_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# ---------------------------------------------------------------------------------------------
+# v10: ipsatized_scores SVS (значения по пунктам, не шкалы) попадали в result_scales, 57 строк на результат
+# ---------------------------------------------------------------------------------------------
+
+def _v10_drop_ipsatized_scales_batch(conn: sqlite3.Connection, last_rowid: int, upper_rowid: int,
+                                     batch_size: int) -> Optional[int]:
+    row = conn.execute('''
+        SELECT MAX(rowid) FROM (SELECT rowid FROM results WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?)
+    ''', (last_rowid, upper_rowid, batch_size)).fetchone()
+    if row[0] is None:
+        return None
+    conn.execute('''
+        DELETE FROM result_scales WHERE result_id > ? AND result_id <= ? AND scale_code LIKE 'ipsatized_scores.%'
+    ''', (last_rowid, row[0]))
+    return row[0]
+
+
+# ---------------------------------------------------------------------------------------------
+# v11: archetype_assignments.inputs - шкалы, по которым назначен архетип (archetypes.py).
+# NULL (назначения пакетной задачи и старые строки) - шкалы читаются по results при следующем назначении
+# ---------------------------------------------------------------------------------------------
+
+def _v11_archetype_inputs(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(archetype_assignments)')}
+    if 'inputs' not in columns:
+        conn.execute('ALTER TABLE archetype_assignments ADD COLUMN inputs TEXT')
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'baseline schema', apply=_v1_baseline),
+    Migration(2, 'result_scales table', apply=_v2_result_scales),
+    Migration(3, 'backfill result_scales', apply=_v3_drop_orphan_scales, batch=_v3_backfill_scales_batch, online=True),
+    Migration(4, 'compact responses encoding', batch=_v4_encode_responses_batch, online=True),
+    Migration(5, 'results without hard-coded test_type list', apply=_v5_create_results_new,
+              batch=_v5_copy_results_batch, finalize=_v5_swap_results, online=True),
+    Migration(6, 'completed tests bitmask on users', apply=_v6_completed_tests_mask),
+    Migration(7, 'archetype models and assignments', apply=_v7_archetypes),
+    Migration(8, 'materialized completion counters', apply=_v8_aggregates, batch=_v8_count_results_batch),
+    Migration(9, 'admin events', apply=_v9_admin_events),
+    Migration(10, 'drop SVS item values from result_scales', batch=_v10_drop_ipsatized_scales_batch, online=True),
+    Migration(11, 'archetype assignment inputs', apply=_v11_archetype_inputs),
+]
+
+
+class MigrationInterrupted(Exception):
+    """Raised between batches after MigrationRunner.stop(); the migration resumes on the next start."""
+
+
+class MigrationRunner:
+    """Applies pending MIGRATIONS to the database of a DatabaseManager."""
+
+    def __init__(self, db, migrations: Optional[List[Migration]] = None, batch_size: int = 500,
+                 batch_pause: float = 0.02, backup_dir: Optional[str] = None):
+        self.db = db
+        self.migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.backup_dir = backup_dir
+        self._lock = threading.Lock()
+        self._backup_done = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def _connection(self):
+        conn = self.db.get_connection()
+        previous_isolation = conn.isolation_level
+        conn.isolation_level = None  # транзакции управляются явно (BEGIN IMMEDIATE ... COMMIT)
+        try:
+            yield conn
+        finally:
+            conn.isolation_level = previous_isolation
+
+    @staticmethod
+    @contextmanager
+    def _transaction(conn: sqlite3.Connection):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _ensure_version_table(self, conn: sqlite3.Connection):
+        if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+            # Новая база: auto_vacuum можно включить только до первой таблицы (иначе нужен полный VACUUM),
+            # с ним retention.py возвращает освобожденные страницы через incremental_vacuum
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL CHECK (status IN ('running', 'applied')),
+                progress INTEGER DEFAULT 0,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                applied_at TIMESTAMP
+            )
+        ''')
+
+    def applied_versions(self) -> List[int]:
+        with self._connection() as conn:
+            self._ensure_version_table(conn)
+            rows = conn.execute("SELECT version FROM schema_version WHERE status = 'applied' ORDER BY version").fetchall()
+        return [row[0] for row in rows]
+
+    def current_version(self) -> int:
+        applied = set(self.applied_versions())
+        version = 0
+        for migration in self.migrations:
+            if migration.version not in applied:
+                break
+            version = migration.version
+        return version
+
+    def pending(self) -> List[Migration]:
+        applied = set(self.applied_versions())
+        return [m for m in self.migrations if m.version not in applied]
+
+    def backup(self) -> Optional[str]:
+        """Online copy of the database file before migrating; skipped for in-memory and empty databases."""
+        db_path = getattr(self.db, 'db_path', ':memory:')
+        if db_path == ':memory:' or not os.path.exists(db_path):
+            return None
+        with self._connection() as conn:
+            has_data = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone()
+        if not has_data:
+            return None
+        backup_dir = self.backup_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+        os.makedirs(backup_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(db_path))[0]
+        target_version = self.pending()[-1].version
+        backup_path = os.path.join(backup_dir, f"{name}_pre_v{target_version}_{datetime.now():%Y%m%d_%H%M%S}.db")
+        backup_database(db_path, backup_path)
+        logger.info(f"Database backup before migration saved to {backup_path}")
+        return backup_path
+
+    def _apply(self, conn: sqlite3.Connection, migration: Migration):
+        started = time.perf_counter()
+        row = conn.execute("SELECT progress FROM schema_version WHERE version = ? AND status = 'running'",
+                           (migration.version,)).fetchone()
+        if row is not None:
+            # Прерванная миграция: apply уже закоммичен вместе со строкой schema_version, продолжаем с progress
+            progress = row[0] or 0
+            logger.info(f"Resuming migration v{migration.version}: {migration.name} after rowid {progress}")
+        else:
+            progress = 0
+            logger.info(f"Applying migration v{migration.version}: {migration.name}")
+            with self._transaction(conn):
+                conn.execute('''
+                    INSERT INTO schema_version (version, name, status, progress) VALUES (?, ?, 'running', 0)
+                ''', (migration.version, migration.name))
+                if migration.apply:
+                    migration.apply(conn)
+
+        batches = 0
+        if migration.batch:
+            upper = conn.execute('SELECT IFNULL(MAX(rowid), 0) FROM results').fetchone()[0]
+            while True:
+                with self._transaction(conn):
+                    last = migration.batch(conn, progress, upper, self.batch_size)
+                    if last is not None:
+                        progress = last
+                        conn.execute('UPDATE schema_version SET progress = ? WHERE version = ?',
+                                     (progress, migration.version))
+                if last is None:
+                    break
+                if self._stop_event.is_set():
+                    raise MigrationInterrupted(f"v{migration.version} stopped at rowid {progress}")
+                batches += 1
+                if self.batch_pause:
+                    time.sleep(self.batch_pause)
+
+        with self._transaction(conn):
+            if migration.finalize:
+                migration.finalize(conn, progress)
+            conn.execute('''
+                UPDATE schema_version SET status = 'applied', applied_at = CURRENT_TIMESTAMP WHERE version = ?
+            ''', (migration.version,))
+        logger.info(f"Migration v{migration.version} applied in {time.perf_counter() - started:.2f}s ({batches} batches)")
+
+    def run(self, include_online: bool = True) -> bool:
+        """
+        Applies pending migrations in order. With include_online=False online migrations are skipped
+        (apply them later with run_in_background()) and only the blocking ones run, so a blocking
+        migration must not depend on what an earlier online one produces. Returns False on error.
+        """
+        with self._lock:
+            try:
+                pending = self.pending()
+                if not pending:
+                    return True
+                if not self._backup_done:
+                    self.backup()
+                    self._backup_done = True
+                with self._connection() as conn:
+                    for migration in pending:
+                        if migration.online and not include_online:
+                            continue
+                        self._apply(conn, migration)
+                return True
+            except MigrationInterrupted as e:
+                logger.info(f"Database migration interrupted: {e}")
+                return False
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"Database migration failed: {e}")
+                return False
+
+    def stop(self, timeout: float = 10.0):
+        """Stops a background run after its current batch (each batch is its own transaction)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def run_in_background(self) -> Optional[threading.Thread]:
+        """Applies the remaining (online) migrations in a daemon thread."""
+        if not self.pending():
+            return None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="db-migrations", daemon=True)
+        self._thread.start()
+        return self._thread
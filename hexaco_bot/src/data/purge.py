@@ -0,0 +1,265 @@
+"""
+Bulk deletion of users, or of their results of one test, for administrators.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.purge --users 123 456 --dry-run
+    python -m hexaco_bot.src.data.purge --users-file ids.txt
+    python -m hexaco_bot.src.data.purge --query "SELECT user_id FROM users WHERE created_at < '2024-01-01'"
+    python -m hexaco_bot.src.data.purge --users 123 --test pid5bfm
+
+Users are deleted in batches of --batch-size, one transaction per batch: result_scales, the completion
+counters (aggregates.remove_results), results, test_sessions, archetype_assignments and users. With
+--test only that test's results (and the counters) go; users.completed_tests_mask is reset to NULL
+and recomputed by the bot on the next read. --query runs on a read-only connection and must return
+user ids in its first column.
+
+Files are matched in one listing of each directory: reports report_<username>_<YYYYmmdd_HHMMSS>.json
+in USER_REPORTS_DIR (by the sanitized username, the way QuestionHandler names them; a name shared
+with a user who stays is left alone) and profiles <user_id>_profile.json in USER_PROFILES_DIR. --test
+keeps the files.
+
+After each committed batch an 'evict_users' event is written to admin_events. Every running bot
+process polls that table (ADMIN_EVENTS_POLL_SECONDS) and drops the users' sessions, cached users rows
+and similarity vectors, so a deleted user starts from /start instead of continuing a stale session.
+An event with 'cache_only' in its payload (DatabaseManager.reconcile_completed_tests) only drops the
+cached users rows.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.data.archetypes import ARCHETYPE_TEST_TYPES
+
+logger = logging.getLogger(__name__)
+
+EVICT_USERS = 'evict_users'
+ADMIN_EVENTS_KEEP_DAYS = 7
+# _YYYYmmdd_HHMMSS.json в конце имени отчета
+REPORT_SUFFIX_LENGTH = len('_20240101_120000.json')
+
+
+@dataclass
+class PurgeResult:
+    user_ids: List[int]
+    dry_run: bool
+    rows: Dict[str, int] = field(default_factory=dict)  # таблица -> удалено (или было бы удалено) строк
+    files: List[str] = field(default_factory=list)
+
+
+def safe_username(username) -> str:
+    """The username part of report file names (see QuestionHandler._generate_user_report)."""
+    return "".join(c if c.isalnum() else "_" for c in str(username))
+
+
+def publish_admin_event(conn: sqlite3.Connection, kind: str, payload: Dict):
+    """Queues an event for the running bot processes (caller commits); old events are dropped."""
+    conn.execute("DELETE FROM admin_events WHERE created_at < datetime('now', ?)",
+                 (f'-{ADMIN_EVENTS_KEEP_DAYS} days',))
+    conn.execute('INSERT INTO admin_events (kind, payload) VALUES (?, ?)', (kind, json.dumps(payload)))
+
+
+def read_user_ids(db_path: str, users: Sequence[int] = (), users_file: Optional[str] = None,
+                  query: Optional[str] = None) -> List[int]:
+    """Ids from the command line, a file (one per line, # comments) and a read-only query, deduplicated."""
+    user_ids = set(users)
+    if users_file:
+        with open(users_file, encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    user_ids.add(int(line))
+    if query:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            user_ids.update(int(row[0]) for row in conn.execute(query) if row[0] is not None)
+        finally:
+            conn.close()
+    return sorted(user_ids)
+
+
+def _batches(user_ids: Sequence[int], batch_size: int) -> Iterable[List[int]]:
+    for start in range(0, len(user_ids), batch_size):
+        yield list(user_ids[start:start + batch_size])
+
+
+def _purge_batch(conn: sqlite3.Connection, batch: List[int], test_type: Optional[str], dry_run: bool) -> Dict[str, int]:
+    """Deletes one batch (or only counts its rows when dry_run); runs in the caller's transaction."""
+    in_users = f"user_id IN ({', '.join('?' for _ in batch)})"
+    results_where, results_params = in_users, list(batch)
+    if test_type:
+        results_where += ' AND test_type = ?'
+        results_params.append(test_type)
+    statements = [
+        ('result_scales', f'result_id IN (SELECT result_id FROM results WHERE {results_where})', results_params),
+        ('results', results_where, results_params),
+    ]
+    if test_type is None:
+        statements += [
+            ('test_sessions', in_users, batch),
+            ('archetype_assignments', in_users, batch),
+            ('users', in_users, batch),
+        ]
+    elif test_type in ARCHETYPE_TEST_TYPES:
+        # Архетип считался и по этому тесту: бот назначит его заново при следующем сохранении
+        statements.append(('archetype_assignments', in_users, batch))
+
+    counts = {}
+    if dry_run:
+        for table, where, params in statements:
+            counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}', params).fetchone()[0]
+        return counts
+    for table, where, params in statements:
+        if table == 'results':
+            aggregates.remove_results(conn, batch, test_type)
+        counts[table] = conn.execute(f'DELETE FROM {table} WHERE {where}', params).rowcount
+    if test_type is not None:
+        conn.execute(f'UPDATE users SET completed_tests_mask = NULL WHERE {in_users}', batch)
+    return counts
+
+
+def report_usernames(conn: sqlite3.Connection, user_ids: Sequence[int], batch_size: int = 500) -> Set[str]:
+    """Sanitized usernames of the given users; users without a username have no report files of their own."""
+    names = set()
+    for batch in _batches(user_ids, batch_size):
+        for (username,) in conn.execute(f'''
+            SELECT username FROM users WHERE username IS NOT NULL AND user_id IN ({', '.join('?' for _ in batch)})
+        ''', batch):
+            if username:
+                names.add(safe_username(username))
+    return names
+
+
+def _kept_usernames(conn: sqlite3.Connection, names: Set[str], deleted: Set[int]) -> Set[str]:
+    """Which of `names` also belong to users that are not deleted (one pass over users)."""
+    kept = set()
+    for user_id, username in conn.execute('SELECT user_id, username FROM users WHERE username IS NOT NULL'):
+        if user_id not in deleted and safe_username(username) in names:
+            kept.add(safe_username(username))
+    return kept
+
+
+def find_user_files(user_ids: Iterable[int], usernames: Set[str], reports_dir: str, profiles_dir: str) -> List[str]:
+    """Report and profile files of the users: one os.scandir per directory, whatever the number of users."""
+    user_ids = set(user_ids)
+    found = []
+    if usernames and os.path.isdir(reports_dir):
+        with os.scandir(reports_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if (name.startswith('report_') and name.endswith('.json') and entry.is_file()
+                        and name[len('report_'):-REPORT_SUFFIX_LENGTH] in usernames):
+                    found.append(entry.path)
+    if os.path.isdir(profiles_dir):
+        with os.scandir(profiles_dir) as entries:
+            for entry in entries:
+                user_id = entry.name[:-len('_profile.json')]
+                if entry.name.endswith('_profile.json') and user_id.isdigit() and int(user_id) in user_ids:
+                    found.append(entry.path)
+    return sorted(found)
+
+
+def purge_users(conn: sqlite3.Connection, user_ids: Sequence[int], test_type: Optional[str] = None,
+                dry_run: bool = False, batch_size: int = 500, reports_dir: Optional[str] = None,
+                profiles_dir: Optional[str] = None) -> PurgeResult:
+    """
+    Deletes the users (or only their `test_type` results) batch by batch, publishing an eviction event
+    after each commit, then removes their files if the directories are given (not with test_type).
+    A failing batch raises sqlite3.Error; the batches committed before it stay deleted.
+    """
+    result = PurgeResult(list(user_ids), dry_run)
+    usernames = set()
+    if test_type is None and reports_dir:
+        usernames = report_usernames(conn, result.user_ids, batch_size)
+    for batch in _batches(result.user_ids, batch_size):
+        conn.execute('BEGIN' if dry_run else 'BEGIN IMMEDIATE')
+        try:
+            counts = _purge_batch(conn, batch, test_type, dry_run)
+            if not dry_run:
+                publish_admin_event(conn, EVICT_USERS, {'user_ids': batch, 'test_type': test_type})
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        for table, count in counts.items():
+            result.rows[table] = result.rows.get(table, 0) + count
+        logger.info(f"{'Dry run' if dry_run else 'Purged'} batch of {len(batch)} user(s): {counts}")
+
+    if test_type is None and (reports_dir or profiles_dir):
+        if usernames:
+            shared = _kept_usernames(conn, usernames, set(result.user_ids))
+            for name in sorted(shared):
+                logger.warning(f"Report files of '{name}' are kept: another user has the same file name prefix")
+            usernames -= shared
+        result.files = find_user_files(result.user_ids, usernames, reports_dir or '', profiles_dir or '')
+        if not dry_run:
+            for path in result.files:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Failed to remove {path}: {e}")
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import DATABASE_PATH, USER_REPORTS_DIR, USER_PROFILES_DIR
+    from hexaco_bot.src.data.database import DatabaseManager, COMPLETED_TEST_BITS
+
+    parser = argparse.ArgumentParser(description="Delete users (or their results of one test) in bulk.")
+    parser.add_argument("--users", type=int, nargs='+', default=[], metavar="USER_ID")
+    parser.add_argument("--users-file", help="File with one user id per line.")
+    parser.add_argument("--query", help="Read-only SQL returning user ids in the first column.")
+    parser.add_argument("--test", choices=sorted(COMPLETED_TEST_BITS),
+                        help="Delete only the results of this test, keep the users and their files.")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would be deleted, change nothing.")
+    parser.add_argument("--keep-files", action="store_true", help="Do not touch report and profile files.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not (args.users or args.users_file or args.query):
+        parser.error("give --users, --users-file or --query")
+    try:
+        user_ids = read_user_ids(args.db, args.users, args.users_file, args.query)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error(f"Failed to read user ids: {e}")
+        return 1
+    if not user_ids:
+        print("No users matched")
+        return 0
+
+    db = DatabaseManager(args.db)
+    if not db.initialize_database(run_online_migrations=False):
+        return 1
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        files = {} if args.keep_files else {'reports_dir': USER_REPORTS_DIR, 'profiles_dir': USER_PROFILES_DIR}
+        result = purge_users(conn, user_ids, args.test, args.dry_run, args.batch_size, **files)
+    except sqlite3.Error as e:
+        logger.error(f"Purge failed: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"{'Would delete' if args.dry_run else 'Deleted'} ({len(user_ids)} user id(s)"
+          f"{', test ' + args.test if args.test else ''}):")
+    for table, count in result.rows.items():
+        print(f"  {table:<24} {count:>8}")
+    print(f"  {'files':<24} {len(result.files):>8}")
+    if args.dry_run:
+        for path in result.files:
+            print(f"    {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,84 @@
+"""
+Compact storage format for results.responses.
+
+Version 1 is a BLOB: one version byte followed by one signed byte per question in question order
+(byte i+1 holds the answer to question i+1, -128 marks an unanswered question). All instruments
+answer with small integers (-5..7), so a 100-item HEXACO result takes 101 bytes instead of ~900
+bytes of JSON text and decodes without a JSON parse.
+
+Responses that do not fit (non-integer keys or values, answers outside -127..127) keep the old
+JSON text format; decode_responses() accepts both.
+"""
+
+import json
+from array import array
+from typing import Any, Dict, Optional, Union
+
+RESPONSES_CODEC_VERSION = 1
+MISSING_ANSWER = -128
+MAX_QUESTIONS = 1024
+
+
+def _parse(responses: Union[str, bytes, Dict[Any, Any]]) -> Optional[Dict[Any, Any]]:
+    if isinstance(responses, dict):
+        return responses
+    if isinstance(responses, (bytes, bytearray, memoryview)):
+        return decode_responses(responses)
+    data = json.loads(responses)
+    return data if isinstance(data, dict) else None
+
+
+def encode_responses(responses: Union[str, Dict[Any, Any]]) -> Union[bytes, str]:
+    """
+    Encodes a responses dict (or its JSON text, as produced by the scorers' responses_to_json) into
+    the v1 BLOB. Falls back to JSON text when the responses cannot be represented.
+    """
+    data = _parse(responses)
+    if not data:
+        return responses if isinstance(responses, str) else json.dumps(data or {})
+    try:
+        questions = list(map(int, data))
+    except (TypeError, ValueError):
+        return _as_json_text(responses)
+    answers = list(data.values())
+    last = max(questions)
+    # type() вместо isinstance(): bool тоже int, но ответом не является
+    if (min(questions) < 1 or last > MAX_QUESTIONS or set(map(type, answers)) != {int}
+            or MISSING_ANSWER in answers):
+        return _as_json_text(responses)
+    try:
+        if len(questions) == last and questions == list(range(1, last + 1)):
+            # Обычный случай: ответы на все вопросы по порядку
+            encoded = array('b', answers)
+        else:
+            encoded = array('b', [MISSING_ANSWER]) * last
+            for question, value in zip(questions, answers):
+                encoded[question - 1] = value
+    except OverflowError:  # ответ вне диапазона signed char
+        return _as_json_text(responses)
+    return bytes((RESPONSES_CODEC_VERSION,)) + encoded.tobytes()
+
+
+def _as_json_text(responses: Union[str, Dict[Any, Any]]) -> str:
+    return responses if isinstance(responses, str) else json.dumps(responses)
+
+
+def decode_responses(stored: Union[str, bytes, None]) -> Optional[Dict[str, Any]]:
+    """Returns responses as {"<question>": answer} for both the v1 BLOB and legacy JSON text."""
+    if stored is None or stored == '' or stored == b'':
+        return None
+    if isinstance(stored, str):
+        return json.loads(stored)
+    view = memoryview(stored)
+    version = view[0]
+    if version != RESPONSES_CODEC_VERSION:
+        raise ValueError(f"Unsupported responses encoding version: {version}")
+    values = view[1:].cast('b')
+    return {str(index): value for index, value in enumerate(values, start=1) if value != MISSING_ANSWER}
+
+
+def responses_as_json(stored: Union[str, bytes, None]) -> Optional[str]:
+    """Legacy JSON text view of a stored value (for callers that expect results.responses as text)."""
+    if stored is None or isinstance(stored, str):
+        return stored
+    return json.dumps(decode_responses(stored))
@@ -0,0 +1,342 @@
+"""
+Retention and compaction: keeps the report directory, the profile directory and test_sessions from
+growing without bound.
+
+Policies (RetentionPolicy, configured from RETENTION_* settings):
+    reports_per_user   newest report_<username>_<YYYYmmdd_HHMMSS>.json files kept per username
+                       (0 keeps all); reports of users without a username share the name
+                       report_None_* and are never pruned
+    session_days       test_sessions that are not completed and were started more than this many
+                       days ago are expired (0 keeps all): sessions without results are deleted,
+                       active ones with results are marked 'abandoned' (their results refer to them)
+    orphan_profiles    <user_id>_profile.json of users that are no longer in the database are removed;
+                       off by default (--delete-orphan-profiles, RETENTION_ORPHAN_PROFILES) and skipped
+                       while the users table is empty, so a job pointed at a wrong or freshly created
+                       database does not take every profile with it
+
+Sessions are processed in rowid ranges of `batch_size`, one short transaction per range with a pause
+between ranges, so the bot keeps writing while the job runs. Freed pages are then returned to the file
+system with PRAGMA incremental_vacuum, `vacuum_pages` pages per step. That needs auto_vacuum=INCREMENTAL:
+new databases get it from the migration runner; an existing one is converted once with
+--enable-incremental-vacuum (a full VACUUM, best run while the bot is stopped).
+
+RetentionJob runs in the background of the bot process that holds the singleton jobs, every
+RETENTION_INTERVAL_HOURS. Expired sessions are announced as an 'expire_sessions' admin event (see
+purge.py), so every bot process drops them from memory and the session store. Usage (from the
+repository root):
+    python -m hexaco_bot.src.data.retention --dry-run
+    python -m hexaco_bot.src.data.retention --reports-per-user 1 --session-days 7
+    python -m hexaco_bot.src.data.retention --enable-incremental-vacuum
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from hexaco_bot.src.data.purge import publish_admin_event
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = re.compile(r'^report_(.+)_(\d{8}_\d{6})\.json$')
+PROFILE_NAME = re.compile(r'^(\d+)_profile\.json$')
+# Так называются отчеты пользователей без username (см. QuestionHandler._generate_user_report)
+SHARED_REPORT_NAME = 'None'
+AUTO_VACUUM_INCREMENTAL = 2
+EXPIRE_SESSIONS = 'expire_sessions'
+
+
+@dataclass
+class RetentionPolicy:
+    reports_per_user: int = 3
+    session_days: float = 30
+    orphan_profiles: bool = False
+    batch_size: int = 500
+    batch_pause: float = 0.05
+    vacuum_pages: int = 1024
+
+
+@dataclass
+class RetentionReport:
+    dry_run: bool = False
+    sessions_deleted: int = 0
+    sessions_abandoned: int = 0
+    reports_removed: int = 0
+    profiles_removed: int = 0
+    file_bytes: int = 0
+    db_bytes: int = 0  # освобожденные страницы базы (при dry_run - сколько свободно сейчас)
+    duration: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.file_bytes + self.db_bytes
+
+
+def old_reports(reports_dir: str, keep: int) -> List[Tuple[str, int]]:
+    """(path, size) of the reports beyond the newest `keep` per username, from one directory listing."""
+    groups: Dict[str, List[Tuple[str, str, int]]] = {}
+    if keep <= 0 or not os.path.isdir(reports_dir):
+        return []
+    with os.scandir(reports_dir) as entries:
+        for entry in entries:
+            match = REPORT_NAME.match(entry.name)
+            if match and match.group(1) != SHARED_REPORT_NAME and entry.is_file():
+                groups.setdefault(match.group(1), []).append((match.group(2), entry.path, entry.stat().st_size))
+    expired = []
+    for reports in groups.values():
+        reports.sort(reverse=True)
+        expired.extend((path, size) for _, path, size in reports[keep:])
+    return sorted(expired)
+
+
+def orphan_profiles(conn: sqlite3.Connection, profiles_dir: str, batch_size: int = 500) -> List[Tuple[str, int]]:
+    """
+    (path, size) of <user_id>_profile.json files whose user is not in the users table; none while the
+    table is empty (the database is new or not the one the profiles belong to).
+    """
+    if not os.path.isdir(profiles_dir):
+        return []
+    if conn.execute('SELECT 1 FROM users LIMIT 1').fetchone() is None:
+        logger.warning(f"Users table is empty, orphan profiles in {profiles_dir} are not removed")
+        return []
+    profiles: Dict[int, Tuple[str, int]] = {}
+    with os.scandir(profiles_dir) as entries:
+        for entry in entries:
+            match = PROFILE_NAME.match(entry.name)
+            if match and entry.is_file():
+                profiles[int(match.group(1))] = (entry.path, entry.stat().st_size)
+    user_ids = sorted(profiles)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        for (user_id,) in conn.execute(
+                f"SELECT user_id FROM users WHERE user_id IN ({', '.join('?' for _ in batch)})", batch):
+            profiles.pop(user_id, None)
+    return sorted(profiles.values())
+
+
+def expire_sessions(conn: sqlite3.Connection, days: float, batch_size: int = 500, batch_pause: float = 0.0,
+                    dry_run: bool = False, stop_event: Optional[threading.Event] = None) -> Tuple[int, int, List[Tuple[int, str]]]:
+    """
+    Walks test_sessions in rowid ranges; in each range deletes the stale unfinished sessions without
+    results and marks stale active ones with results 'abandoned', announcing them to the bot processes
+    in the same transaction. `conn` must be in autocommit mode (isolation_level=None). Returns
+    (deleted, abandoned, [(user_id, session_id)] of both).
+    """
+    cutoff = f'-{days:g} days'
+    stale = "status != 'completed' AND started_at < datetime('now', ?)"
+    has_results = 'EXISTS (SELECT 1 FROM results r WHERE r.session_id = test_sessions.session_id)'
+    deleted = abandoned = 0
+    expired: List[Tuple[int, str]] = []
+    last = 0
+    while not (stop_event is not None and stop_event.is_set()):
+        upper = conn.execute('SELECT MAX(rowid) FROM (SELECT rowid FROM test_sessions WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+                             (last, batch_size)).fetchone()[0]
+        if upper is None:
+            break
+        in_range = 'rowid > ? AND rowid <= ?'
+        conn.execute('BEGIN' if dry_run else 'BEGIN IMMEDIATE')
+        try:
+            to_delete = conn.execute(f'''
+                SELECT user_id, session_id FROM test_sessions WHERE {in_range} AND {stale} AND NOT {has_results}
+            ''', (last, upper, cutoff)).fetchall()
+            to_abandon = conn.execute(f'''
+                SELECT user_id, session_id FROM test_sessions
+                WHERE {in_range} AND {stale} AND status = 'active' AND {has_results}
+            ''', (last, upper, cutoff)).fetchall()
+            if not dry_run:
+                conn.executemany('DELETE FROM test_sessions WHERE session_id = ?', [(s,) for _, s in to_delete])
+                conn.executemany("UPDATE test_sessions SET status = 'abandoned' WHERE session_id = ?",
+                                 [(s,) for _, s in to_abandon])
+                if to_delete or to_abandon:
+                    # Процессы бота сбросят эти сессии из памяти и хранилища
+                    publish_admin_event(conn, EXPIRE_SESSIONS,
+                                        {'sessions': [list(pair) for pair in to_delete + to_abandon]})
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('ROLLBACK' if dry_run else 'COMMIT')
+        deleted += len(to_delete)
+        abandoned += len(to_abandon)
+        expired.extend(to_delete + to_abandon)
+        last = upper
+        if batch_pause:
+            time.sleep(batch_pause)
+    return deleted, abandoned, expired
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages_per_step: int = 1024, pause: float = 0.0,
+                       stop_event: Optional[threading.Event] = None) -> int:
+    """
+    Returns free pages to the file system in steps of `pages_per_step`; returns the bytes reclaimed.
+    Does nothing (returns 0) unless the database uses auto_vacuum=INCREMENTAL.
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    before = conn.execute('PRAGMA page_count').fetchone()[0]
+    while conn.execute('PRAGMA freelist_count').fetchone()[0] > 0:
+        if stop_event is not None and stop_event.is_set():
+            break
+        # Прагма освобождает по странице на каждый шаг выполнения: fetchall доводит ее до конца
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages_per_step)})').fetchall()
+        if pause:
+            time.sleep(pause)
+    return (before - conn.execute('PRAGMA page_count').fetchone()[0]) * page_size
+
+
+def enable_incremental_vacuum(db_path: str) -> int:
+    """Switches an existing database to auto_vacuum=INCREMENTAL (full VACUUM); returns the bytes saved."""
+    size = os.path.getsize(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return size - os.path.getsize(db_path)
+
+
+class RetentionJob:
+    """Applies the retention policy every `interval` seconds in a daemon thread."""
+
+    def __init__(self, db_path: str, reports_dir: str, profiles_dir: str, policy: Optional[RetentionPolicy] = None,
+                 interval: float = 24 * 3600):
+        self.db_path = db_path
+        self.reports_dir = reports_dir
+        self.profiles_dir = profiles_dir
+        self.policy = policy or RetentionPolicy()
+        self.interval = interval
+        self.last_report: Optional[RetentionReport] = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._vacuum_hint_logged = False
+
+    def start(self) -> Optional[threading.Thread]:
+        """Starts the job thread; the first pass runs one interval after start."""
+        if self.db_path == ':memory:' or self.interval <= 0:
+            return None
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+        logger.info(f"Retention job started: every {self.interval / 3600:.1f}h")
+        return self._thread
+
+    def stop(self, timeout: float = 30.0):
+        """Stops the job between batches."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.run()
+
+    def _remove_files(self, files: List[Tuple[str, int]], report: RetentionReport) -> int:
+        removed = 0
+        for path, size in files:
+            if self._stop_event.is_set():
+                break
+            if not report.dry_run:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    report.errors.append(f"{path}: {e}")
+                    continue
+            removed += 1
+            report.file_bytes += size
+        return removed
+
+    def run(self, dry_run: bool = False) -> RetentionReport:
+        """One pass over all policies (in the calling thread). Never raises."""
+        with self._lock:
+            policy = self.policy
+            report = RetentionReport(dry_run=dry_run)
+            started = time.perf_counter()
+            try:
+                report.reports_removed = self._remove_files(old_reports(self.reports_dir, policy.reports_per_user), report)
+                conn = sqlite3.connect(self.db_path, isolation_level=None)
+                try:
+                    if policy.orphan_profiles:
+                        report.profiles_removed = self._remove_files(
+                            orphan_profiles(conn, self.profiles_dir, policy.batch_size), report)
+                    if policy.session_days > 0:
+                        report.sessions_deleted, report.sessions_abandoned, _ = expire_sessions(
+                            conn, policy.session_days, policy.batch_size, policy.batch_pause, dry_run, self._stop_event)
+                    if dry_run:
+                        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+                        report.db_bytes = conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size
+                    else:
+                        report.db_bytes = incremental_vacuum(conn, policy.vacuum_pages, policy.batch_pause,
+                                                             self._stop_event)
+                    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL \
+                            and not self._vacuum_hint_logged:
+                        self._vacuum_hint_logged = True
+                        logger.warning("Database does not use auto_vacuum=INCREMENTAL, freed pages stay in the file; "
+                                       "convert it once with: python -m hexaco_bot.src.data.retention --enable-incremental-vacuum")
+                finally:
+                    conn.close()
+            except (sqlite3.Error, OSError) as e:
+                report.errors.append(str(e))
+            report.duration = time.perf_counter() - started
+            self.last_report = report
+            for error in report.errors:
+                logger.error(f"Retention: {error}")
+            logger.info(f"Retention{' (dry run)' if dry_run else ''}: {report.sessions_deleted} sessions deleted, "
+                        f"{report.sessions_abandoned} abandoned, {report.reports_removed} reports and "
+                        f"{report.profiles_removed} profiles removed, {report.bytes_reclaimed} bytes reclaimed "
+                        f"in {report.duration:.2f}s")
+            return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import (
+        DATABASE_PATH, USER_REPORTS_DIR, USER_PROFILES_DIR, RETENTION_REPORTS_PER_USER, RETENTION_SESSION_DAYS,
+        RETENTION_ORPHAN_PROFILES, RETENTION_BATCH_SIZE, RETENTION_VACUUM_PAGES,
+    )
+
+    parser = argparse.ArgumentParser(description="Prune old reports, orphan profiles and stale sessions, compact the database.")
+    parser.add_argument("--reports-per-user", type=int, default=RETENTION_REPORTS_PER_USER,
+                        help="Newest reports kept per user, 0 keeps all (default: RETENTION_REPORTS_PER_USER).")
+    parser.add_argument("--session-days", type=float, default=RETENTION_SESSION_DAYS,
+                        help="Expire unfinished sessions older than this, 0 keeps all (default: RETENTION_SESSION_DAYS).")
+    parser.add_argument("--delete-orphan-profiles", action="store_true", default=RETENTION_ORPHAN_PROFILES,
+                        help="Also remove profiles of users that are not in the database "
+                             "(default: RETENTION_ORPHAN_PROFILES, off).")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be removed, change nothing.")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch the database to auto_vacuum=INCREMENTAL with a full VACUUM and exit.")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.enable_incremental_vacuum:
+        try:
+            saved = enable_incremental_vacuum(args.db)
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"VACUUM failed: {e}")
+            return 1
+        print(f"auto_vacuum=INCREMENTAL enabled, {saved} bytes reclaimed")
+        return 0
+
+    policy = RetentionPolicy(reports_per_user=args.reports_per_user, session_days=args.session_days,
+                             orphan_profiles=args.delete_orphan_profiles, batch_size=RETENTION_BATCH_SIZE,
+                             vacuum_pages=RETENTION_VACUUM_PAGES)
+    report = RetentionJob(args.db, USER_REPORTS_DIR, USER_PROFILES_DIR, policy).run(dry_run=args.dry_run)
+    print(f"{'Would remove' if args.dry_run else 'Removed'}: {report.sessions_deleted} sessions "
+          f"({report.sessions_abandoned} marked abandoned), {report.reports_removed} reports, "
+          f"{report.profiles_removed} profiles; {report.file_bytes} bytes of files, {report.db_bytes} bytes of database")
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,343 @@
+"""
+Nearest-neighbour search over user trait profiles (HEXACO factors and SVS values).
+
+Every user is a vector of the latest value of each scale in FEATURES, standardized with the mean and
+standard deviation of the whole population (scales the user has not taken yet count as the
+population mean, i.e. 0). The vectors live in one contiguous float32 matrix with a user_id -> row
+map, so a top-k query is one matrix-vector product plus np.argpartition instead of a comparison
+against every other user in Python. Cosine similarity compares the shape of the profiles,
+Euclidean distance also their magnitude.
+
+The index is built from result_scales once and then kept current incrementally: refresh() reads
+only the results stored after the last one it has seen (a range scan of the result_scales primary
+key), so results saved by other worker processes are picked up too. The standardization statistics
+are those of the last build(); the index is rebuilt when the number of users has doubled since.
+
+Usage (from the repository root):
+    python -m hexaco_bot.src.data.similarity 123456789 --top 10
+    python -m hexaco_bot.src.data.similarity 123456789 --metric euclidean --db ./data/hexaco_bot.db
+"""
+
+import sqlite3
+import logging
+import argparse
+import warnings
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from hexaco_bot.src.scoring.svs_scorer import VALUE_ORDER
+
+logger = logging.getLogger(__name__)
+
+HEXACO_SCALES = ('honesty_humility', 'emotionality', 'extraversion', 'agreeableness',
+                 'conscientiousness', 'openness', 'altruism')
+# (test_type, scale_code) в порядке столбцов матрицы
+FEATURES: Tuple[Tuple[str, str], ...] = (
+    tuple(('hexaco', scale) for scale in HEXACO_SCALES)
+    + tuple(('svs', f"value_type_scores.{value_type}") for value_type in VALUE_ORDER)
+)
+METRICS = ('cosine', 'euclidean')
+
+
+@dataclass
+class Neighbor:
+    user_id: int
+    score: float  # cosine: сходство (больше - ближе), euclidean: расстояние (меньше - ближе)
+
+
+def load_latest_scales(conn: sqlite3.Connection, features: Sequence[Tuple[str, str]], after_result_id: int = 0,
+                       upper_result_id: Optional[int] = None, fetch_size: int = 5000
+                       ) -> Iterable[List[Tuple[int, int, float]]]:
+    """
+    Chunks of (user_id, feature index, value) for the results with after_result_id < result_id <=
+    upper_result_id, in result_id order: a later value of the same feature replaces an earlier one.
+    """
+    column = {feature: i for i, feature in enumerate(features)}
+    test_types = sorted({test_type for test_type, _ in features})
+    scale_codes = sorted({scale_code for _, scale_code in features})
+    sql = f'''
+        SELECT r.user_id, rs.test_type, rs.scale_code, rs.value
+        FROM result_scales rs JOIN results r ON r.result_id = rs.result_id
+        WHERE rs.result_id > ? AND rs.result_id <= ?
+          AND rs.test_type IN ({', '.join('?' for _ in test_types)})
+          AND rs.scale_code IN ({', '.join('?' for _ in scale_codes)})
+        ORDER BY rs.result_id
+    '''
+    upper = upper_result_id if upper_result_id is not None else (1 << 62)
+    cursor = conn.execute(sql, (after_result_id, upper, *test_types, *scale_codes))
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield [(user_id, column[(test_type, scale_code)], value)
+               for user_id, test_type, scale_code, value in rows if (test_type, scale_code) in column]
+
+
+class SimilarityIndex:
+    """Top-k most similar users by trait profile; safe to share between threads."""
+
+    def __init__(self, db_path: str, features: Sequence[Tuple[str, str]] = FEATURES,
+                 fetch_size: int = 5000, initial_capacity: int = 1024):
+        self.db_path = db_path
+        self.features = tuple(features)
+        self.fetch_size = fetch_size
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._reset(initial_capacity)
+        self._mean = np.zeros(len(self.features))
+        self._std = np.ones(len(self.features))
+        self._users_at_build = 0
+        self._watermark = 0  # последний учтенный result_id
+        self._built = False
+
+    @property
+    def dimensions(self) -> int:
+        return len(self.features)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._rows
+
+    def _reset(self, capacity: int):
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        # Исходные значения шкал (NaN - тест не пройден) и стандартизованные векторы для поиска
+        self._raw = np.full((capacity, self.dimensions), np.nan)
+        self._matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._inv_norms = np.zeros(capacity, dtype=np.float32)
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        size = self._size
+        ids, raw, matrix = self._ids, self._raw, self._matrix
+        sq_norms, inv_norms = self._sq_norms, self._inv_norms
+        rows = self._rows
+        self._reset(capacity)
+        self._rows, self._size = rows, size
+        self._ids[:size] = ids[:size]
+        self._raw[:size] = raw[:size]
+        self._matrix[:size] = matrix[:size]
+        self._sq_norms[:size] = sq_norms[:size]
+        self._inv_norms[:size] = inv_norms[:size]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def build(self) -> int:
+        """(Re)loads every user's latest scales and recomputes the standardization; returns the user count."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            upper = conn.execute('SELECT COALESCE(MAX(result_id), 0) FROM results').fetchone()[0]
+            with self._lock:
+                self._reset(self._initial_capacity)
+                for chunk in load_latest_scales(conn, self.features, 0, upper, self.fetch_size):
+                    self._apply(chunk)
+                self._watermark = upper
+                self._restandardize()
+                self._built = True
+        finally:
+            conn.close()
+        logger.info(f"Similarity index built: {self._size} users, {self.dimensions} features")
+        return self._size
+
+    def refresh(self) -> int:
+        """
+        Adds the results stored since the last build/refresh; returns the number of updated users (all
+        of them when the index had to be (re)built).
+        """
+        if not self._built or self._size >= 2 * max(self._users_at_build, 1):
+            return self.build()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            upper = conn.execute('SELECT COALESCE(MAX(result_id), 0) FROM results').fetchone()[0]
+            if upper <= self._watermark:
+                return 0
+            with self._lock:
+                updated = set()
+                for chunk in load_latest_scales(conn, self.features, self._watermark, upper, self.fetch_size):
+                    updated.update(self._apply(chunk))
+                self._standardize_rows(np.fromiter(updated, dtype=np.intp, count=len(updated)))
+                self._watermark = upper
+        finally:
+            conn.close()
+        return len(updated)
+
+    def load(self, user_ids: Sequence[int], values: np.ndarray):
+        """
+        Replaces the index with the given raw scale values, one row per user in feature order (NaN where
+        a test is not taken); for data that does not come from the database, e.g. benchmarks.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (len(user_ids), self.dimensions):
+            raise ValueError(f"Expected values of shape ({len(user_ids)}, {self.dimensions}), got {values.shape}")
+        with self._lock:
+            self._reset(self._initial_capacity)
+            self._grow(len(user_ids))
+            self._rows = {user_id: row for row, user_id in enumerate(user_ids)}
+            if len(self._rows) != len(user_ids):
+                raise ValueError("Duplicate user ids")
+            self._size = len(user_ids)
+            self._ids[:self._size] = user_ids
+            self._raw[:self._size] = values
+            self._restandardize()
+            self._built = True
+
+    def add(self, user_id: int, values: Dict[Tuple[str, str], float]):
+        """Sets the given scales of one user ({(test_type, scale_code): value}, unknown scales are ignored)."""
+        column = {feature: i for i, feature in enumerate(self.features)}
+        with self._lock:
+            rows = self._apply([(user_id, column[feature], value)
+                                for feature, value in values.items() if feature in column])
+            self._standardize_rows(np.fromiter(rows, dtype=np.intp, count=len(rows)))
+
+    def remove(self, user_ids: Iterable[int]) -> int:
+        """
+        Takes users out of the index (the last row moves into the freed one); returns how many were in it.
+        Their remaining results come back only with the next build().
+        """
+        removed = 0
+        with self._lock:
+            for user_id in user_ids:
+                row = self._rows.pop(user_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    moved = int(self._ids[last])
+                    self._rows[moved] = row
+                    self._ids[row] = moved
+                    self._raw[row] = self._raw[last]
+                    self._matrix[row] = self._matrix[last]
+                    self._sq_norms[row] = self._sq_norms[last]
+                    self._inv_norms[row] = self._inv_norms[last]
+                self._raw[last] = np.nan
+                self._size = last
+                removed += 1
+        return removed
+
+    def _apply(self, chunk: List[Tuple[int, int, float]]) -> set:
+        """Writes raw values into the matrix rows (new users get a row); returns the touched rows."""
+        latest: Dict[Tuple[int, int], float] = {}
+        for user_id, column, value in chunk:
+            row = self._rows.get(user_id)
+            if row is None:
+                self._grow(self._size + 1)
+                row = self._rows[user_id] = self._size
+                self._ids[row] = user_id
+                self._size += 1
+            latest[(row, column)] = value
+        if latest:
+            rows, columns = zip(*latest)
+            self._raw[list(rows), list(columns)] = list(latest.values())
+        return {row for row, _ in latest}
+
+    def _restandardize(self):
+        raw = self._raw[:self._size]
+        self._users_at_build = self._size
+        if self._size:
+            with warnings.catch_warnings():
+                # Шкала, которую еще никто не прошел: nanmean предупреждает и возвращает NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                mean = np.nanmean(raw, axis=0)
+                std = np.nanstd(raw, axis=0)
+            self._mean = np.nan_to_num(mean, nan=0.0)
+            self._std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+        self._standardize_rows(np.arange(self._size))
+
+    def _standardize_rows(self, rows: np.ndarray):
+        if not len(rows):
+            return
+        vectors = np.nan_to_num((self._raw[rows] - self._mean) / self._std, nan=0.0).astype(np.float32)
+        self._matrix[rows] = vectors
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+        self._sq_norms[rows] = sq_norms
+        norms = np.sqrt(sq_norms)
+        self._inv_norms[rows] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    def vector(self, user_id: int) -> Optional[np.ndarray]:
+        """The standardized profile of a user (a copy), None if the user has no results."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            return None if row is None else self._matrix[row].copy()
+
+    def query(self, user_id: int, k: int = 10, metric: str = 'cosine') -> List[Neighbor]:
+        """The k users most similar to `user_id` (the user itself excluded); [] for an unknown user."""
+        with self._lock:
+            vector = self.vector(user_id)
+            if vector is None:
+                return []
+            return self.query_vector(vector, k, metric, exclude=user_id)
+
+    def query_vector(self, vector: np.ndarray, k: int = 10, metric: str = 'cosine',
+                     exclude: Optional[int] = None) -> List[Neighbor]:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            size = self._size
+            if not size or k <= 0:
+                return []
+            matrix = self._matrix[:size]
+            dots = matrix @ vector
+            if metric == 'cosine':
+                norm = float(np.sqrt(vector @ vector))
+                # Чем больше, тем ближе: сортируем по -сходству
+                keys = -(dots * self._inv_norms[:size]) * (1.0 / norm if norm else 0.0)
+            else:
+                keys = self._sq_norms[:size] - 2 * dots + float(vector @ vector)
+            excluded = self._rows.get(exclude) if exclude is not None else None
+            if excluded is not None:
+                keys[excluded] = np.inf
+            k = min(k, size - (excluded is not None))
+            if k <= 0:
+                return []
+            top = np.argpartition(keys, k - 1)[:k] if k < size else np.arange(size)
+            top = top[np.argsort(keys[top], kind='stable')]
+            ids = self._ids[top].tolist()
+            scores = keys[top]
+        if metric == 'cosine':
+            scores = -scores
+        else:
+            scores = np.sqrt(np.maximum(scores, 0))
+        return [Neighbor(user_id, score) for user_id, score in zip(ids, scores.tolist())]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from hexaco_bot.config.settings import DATABASE_PATH
+
+    parser = argparse.ArgumentParser(description="Users with the most similar HEXACO/SVS profiles.")
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("--top", type=int, default=10, help="Number of neighbours (default: 10).")
+    parser.add_argument("--metric", choices=METRICS, default='cosine')
+    parser.add_argument("--db", default=DATABASE_PATH, help="Database path (default: DATABASE_PATH).")
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex(args.db)
+    try:
+        index.build()
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return 1
+    if args.user_id not in index:
+        print(f"User {args.user_id} has no HEXACO or SVS results.")
+        return 1
+    for neighbor in index.query(args.user_id, args.top, args.metric):
+        print(f"{neighbor.user_id:>14}  {neighbor.score:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
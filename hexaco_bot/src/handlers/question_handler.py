@@ -9,10 +9,16 @@ from telebot import TeleBot
 from telebot.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, Chat # Added Chat for dummy message
 from typing import Union, Optional # Added Union and Optional
 from pathlib import Path
+import time
 
 # Используем абсолютные импорты
+from hexaco_bot.config.settings import USER_REPORTS_DIR, USER_PROFILES_DIR
 from hexaco_bot.src.data.database import DatabaseManager
 from hexaco_bot.src.session.session_manager import SessionManager
+from hexaco_bot.src.utils.metrics import TESTS_COMPLETED, REPORT_GENERATION_LATENCY
+from hexaco_bot.src.utils import tracing
+# Банки вопросов и скореры импортируются сразу: все вместе это 3-5 мс из ~150 мс импорта main
+# (python -m hexaco_bot.benchmarks.importtime), а нужны они уже на первом нажатии в меню теста
 from hexaco_bot.src.data.hexaco_questions import get_question as get_hexaco_question, get_total_questions as get_total_hexaco_questions
 from hexaco_bot.src.scoring.hexaco_scorer import HEXACOScorer
 # SDS Imports
@@ -43,6 +49,20 @@ from datetime import datetime # Added for timestamp in report filename
 
 logger = logging.getLogger(__name__)
 
+# Порядок и подписи тестов в меню "все результаты"
+OVERALL_RESULTS_TEST_NAMES = (
+    ('hexaco', "HEXACO"),
+    ('sds', "SDS"),
+    ('svs', "SVS"),
+    ('urica', "URICA"),
+    ('dweck', "Двек"),
+    ('panas', "ШПАНА"),
+    ('self_efficacy', "Самоэффективность"),
+    ('cdrisc', "Тест Устойчивости CD-RISC"),
+    ('rfq', "Тест RFQ"),
+    ('pid5bfm', "Опросник личности PID-5-BF+M"),
+)
+
 class QuestionHandler:
     """Handles all test question flows and response collection."""
     
@@ -135,42 +155,41 @@ class QuestionHandler:
         safe_username_prefix = "".join(c if c.isalnum() else "_" for c in str(username_for_file))
         report_file_prefix_to_check = f"report_{safe_username_prefix}_"
         
-        current_script_path = Path(__file__).resolve()
-        hexaco_bot_root = current_script_path.parent.parent.parent 
-        user_reports_dir_absolute = hexaco_bot_root / "user_reports"
-        user_profile_dir_absolute = hexaco_bot_root / "user_profile" # Определяем директорию для user_profile
+        user_reports_dir_absolute = Path(USER_REPORTS_DIR).resolve()
+        user_profile_dir_absolute = Path(USER_PROFILES_DIR).resolve() # Определяем директорию для user_profile
         
-        logger.info(f"_start_test_flow: Checking for user report files for user {user_id} (username: {username_for_file}) in {user_reports_dir_absolute} with prefix '{report_file_prefix_to_check}'.")
+        logger.info("_start_test_flow: Checking for user report files for user %s (username: %s) in %s with prefix '%s'.", user_id, username_for_file, user_reports_dir_absolute, report_file_prefix_to_check)
         
         initial_report_exists = False
         latest_report_path_str: Optional[str] = None # Для хранения пути к самому свежему user_report
 
         if user_reports_dir_absolute.exists() and user_reports_dir_absolute.is_dir():
             found_reports = []
-            for f_name in os.listdir(user_reports_dir_absolute):
-                if f_name.startswith(report_file_prefix_to_check) and f_name.endswith(".json"):
-                    found_reports.append(user_reports_dir_absolute / f_name)
+            with tracing.span("fs.listdir_reports", directory=str(user_reports_dir_absolute)):
+                for f_name in os.listdir(user_reports_dir_absolute):
+                    if f_name.startswith(report_file_prefix_to_check) and f_name.endswith(".json"):
+                        found_reports.append(user_reports_dir_absolute / f_name)
             
             if found_reports:
                 initial_report_exists = True
                 # Сортируем по времени модификации, чтобы взять самый свежий
                 found_reports.sort(key=lambda p: p.stat().st_mtime, reverse=True)
                 latest_report_path_str = str(found_reports[0])
-                logger.info(f"_start_test_flow: Found matching report file(s). Latest: {latest_report_path_str}")
+                logger.info("_start_test_flow: Found matching report file(s). Latest: %s", latest_report_path_str)
         else:
-            logger.warning(f"_start_test_flow: User reports directory {user_reports_dir_absolute} does not exist or is not a directory.")
+            logger.warning("_start_test_flow: User reports directory %s does not exist or is not a directory.", user_reports_dir_absolute)
 
-        logger.info(f"_start_test_flow: Result of initial_report_exists check: {initial_report_exists}")
+        logger.info("_start_test_flow: Result of initial_report_exists check: %s", initial_report_exists)
 
         # Получаем точную информацию о пройденных тестах из базы данных
         completed_tests_from_db = self.db.get_completed_tests_for_user(user_id)
-        logger.info(f"_start_test_flow: Completed tests from DB for user {user_id}: {completed_tests_from_db}")
+        logger.info("_start_test_flow: Completed tests from DB for user %s: %s", user_id, completed_tests_from_db)
         
         # Обновляем сессию на основе реальных данных из БД
         for test_key, is_completed in completed_tests_from_db.items():
             session.test_completed[test_key] = is_completed
         
-        logger.info(f"_start_test_flow: User {user_id} session.test_completed AFTER DB check: {session.test_completed}")
+        logger.info("_start_test_flow: User %s session.test_completed AFTER DB check: %s", user_id, session.test_completed)
         
         available_tests = []
         if not session.test_completed.get('hexaco', False): available_tests.append(("HEXACO Личностный Тест", "hexaco"))
@@ -182,7 +201,7 @@ class QuestionHandler:
         if not session.test_completed.get('rfq', False): available_tests.append(("Тест Диагностика фокуса регуляции (RFQ)", "rfq"))
         if not session.test_completed.get('pid5bfm', False): available_tests.append(("Опросник личности PID-5-BF+M", "pid5bfm"))
 
-        logger.info(f"_start_test_flow: User {user_id} available_tests after filtering: {available_tests}")
+        logger.info("_start_test_flow: User %s available_tests after filtering: %s", user_id, available_tests)
 
         if not available_tests: # Все тесты пройдены (или были пройдены)
             self.bot.send_message(chat_id, "🎉 Вы уже прошли все доступные тесты! Скоро здесь появятся новые.")
@@ -190,25 +209,25 @@ class QuestionHandler:
             path_to_user_report_for_processing: Optional[str] = None
 
             if not initial_report_exists:
-                logger.info(f"_start_test_flow: Generating user report for user {user_id} as it did not exist initially.")
+                logger.info("_start_test_flow: Generating user report for user %s as it did not exist initially.", user_id)
                 path_to_user_report_for_processing = self._generate_user_report(user_id) # Эта функция теперь возвращает путь
                 if path_to_user_report_for_processing:
-                    logger.info(f"_start_test_flow: Newly generated user report: {path_to_user_report_for_processing}")
+                    logger.info("_start_test_flow: Newly generated user report: %s", path_to_user_report_for_processing)
                 else:
-                    logger.error(f"_start_test_flow: Failed to generate new user report for user {user_id}.")
+                    logger.error("_start_test_flow: Failed to generate new user report for user %s.", user_id)
             else:
                 path_to_user_report_for_processing = latest_report_path_str # Используем найденный ранее самый свежий
-                logger.info(f"_start_test_flow: Using existing user report: {path_to_user_report_for_processing}")
+                logger.info("_start_test_flow: Using existing user report: %s", path_to_user_report_for_processing)
 
             # Теперь проверяем user_profile
             user_profile_filename = f"{user_id}_profile.json" # Имя файла user_profile
             user_profile_filepath = user_profile_dir_absolute / user_profile_filename
 
-            logger.info(f"_start_test_flow: Checking for user profile: {user_profile_filepath}")
+            logger.info("_start_test_flow: Checking for user profile: %s", user_profile_filepath)
             if user_profile_filepath.exists():
-                logger.info(f"_start_test_flow: User profile for user {user_id} already exists at {user_profile_filepath}.")
+                logger.info("_start_test_flow: User profile for user %s already exists at %s.", user_id, user_profile_filepath)
             else:
-                logger.info(f"_start_test_flow: User profile for user {user_id} does NOT exist. Attempting to generate.")
+                logger.info("_start_test_flow: User profile for user %s does NOT exist. Attempting to generate.", user_id)
                 if path_to_user_report_for_processing:
                     try:
                         with open(path_to_user_report_for_processing, 'r', encoding='utf-8') as f_report:
@@ -224,7 +243,7 @@ class QuestionHandler:
                         # from hexaco_bot.src.psychoprofile.profiler import generate_and_save_psychoprofile
                         
                         if all_user_tests_data:
-                            logger.info(f"_start_test_flow: AI profile generation is temporarily disabled for user {user_id}")
+                            logger.info("_start_test_flow: AI profile generation is temporarily disabled for user %s", user_id)
                             # logger.info(f"_start_test_flow: Calling generate_and_save_psychoprofile for user {user_id} using report {path_to_user_report_for_processing}")
                             # saved_profile_path = generate_and_save_psychoprofile(
                             #     user_id=str(user_id), # Функция ожидает str для формирования имени файла
@@ -236,15 +255,15 @@ class QuestionHandler:
                             # else:
                             #     logger.error(f"_start_test_flow: Psychoprofile generation failed for user {user_id}.")
                         else:
-                            logger.error(f"_start_test_flow: 'tests' key not found or data is invalid in report {path_to_user_report_for_processing}.")
+                            logger.error("_start_test_flow: 'tests' key not found or data is invalid in report %s.", path_to_user_report_for_processing)
                     except FileNotFoundError:
-                        logger.error(f"_start_test_flow: User report file {path_to_user_report_for_processing} not found when trying to generate profile.")
+                        logger.error("_start_test_flow: User report file %s not found when trying to generate profile.", path_to_user_report_for_processing)
                     except json.JSONDecodeError:
-                        logger.error(f"_start_test_flow: Error decoding JSON from user report {path_to_user_report_for_processing}.")
+                        logger.error("_start_test_flow: Error decoding JSON from user report %s.", path_to_user_report_for_processing)
                     except Exception as e:
-                        logger.error(f"_start_test_flow: Unexpected error processing report/generating profile for user {user_id}: {e}", exc_info=True)
+                        logger.error("_start_test_flow: Unexpected error processing report/generating profile for user %s: %s", user_id, e, exc_info=True)
                 else:
-                    logger.error(f"_start_test_flow: No user report path available for user {user_id}, cannot generate profile.")
+                    logger.error("_start_test_flow: No user report path available for user %s, cannot generate profile.", user_id)
             
             self.show_overall_results_menu(chat_id, user_id)
             return
@@ -925,7 +944,7 @@ class QuestionHandler:
         try:
             parts = call.data.split('_')
             if len(parts) < 4: # Ожидаем минимум answer_test_q_value
-                logger.error(f"Invalid callback data format: {call.data}")
+                logger.error("Invalid callback data format: %s", call.data)
                 self._safe_answer_callback_query(call.id, "❌ Ошибка формата данных ответа.")
                 return
 
@@ -943,19 +962,19 @@ class QuestionHandler:
             
             if not session or session.current_test_type != test_type:
                 self._safe_answer_callback_query(call.id, "⚠️ Ошибка сессии или типа теста. Попробуйте /test.")
-                logger.warning(f"Session/test type mismatch in answer CB. User: {user_id}, Expected: {test_type}, Got: {session.current_test_type if session else 'None'}")
+                logger.warning("Session/test type mismatch in answer CB. User: %s, Expected: %s, Got: %s", user_id, test_type, session.current_test_type if session else 'None')
                 return
 
             if call.message:
                  try:
                     self.bot.delete_message(call.message.chat.id, call.message.message_id)
                  except Exception as e:
-                    logger.warning(f"Could not delete message {call.message.message_id} for user {user_id}: {e}")
+                    logger.warning("Could not delete message %s for user %s: %s", call.message.message_id, user_id, e)
 
             response_saved = self.session_manager.save_response(user_id, test_type, question_num, response_value)
 
             if not response_saved:
-                logger.error(f"Failed to save response for user {user_id}, test {test_type}, Q {question_num}")
+                logger.error("Failed to save response for user %s, test %s, Q %s", user_id, test_type, question_num)
                 self._safe_answer_callback_query(call.id, "❌ Ошибка сохранения ответа.")
                 self._show_question(call.message.chat.id, user_id, question_num, test_type)
                 return
@@ -978,10 +997,10 @@ class QuestionHandler:
                 self._complete_test_part(call.message.chat.id, user_id, test_type)
                 
         except (IndexError, ValueError) as e:
-            logger.error(f"Error handling answer callback: {e}. Data: {call.data}")
+            logger.error("Error handling answer callback: %s. Data: %s", e, call.data)
             self._safe_answer_callback_query(call.id, "❌ Ошибка обработки ответа.")
         except Exception as e: # Generic exception handler
-            logger.error(f"Unexpected error in _handle_answer_callback: {e}")
+            logger.error("Unexpected error in _handle_answer_callback: %s", e)
             self._safe_answer_callback_query(call.id, "❌ Произошла непредвиденная ошибка.")
     
     def _handle_navigation_callback(self, call: CallbackQuery):
@@ -995,7 +1014,7 @@ class QuestionHandler:
             user_id = call.from_user.id
 
             self._safe_answer_callback_query(call.id, "Навигационные кнопки были удалены.")
-            logger.info(f"Navigation callback {call.data} received but buttons are disabled.")
+            logger.info("Navigation callback %s received but buttons are disabled.", call.data)
 
         except (IndexError, ValueError) as e:
             logger.error(f"Error handling navigation callback: {e}. Data: {call.data}")
@@ -1008,7 +1027,7 @@ class QuestionHandler:
         """Finalize a specific test part, calculate scores, and decide next step."""
         session = self.session_manager.get_session(user_id)
         if not session or session.current_test_type != test_type:
-            logger.error(f"Session error or test type mismatch during _complete_test_part for user {user_id}. Expected {test_type}, session has {session.current_test_type if session else 'None'}.")
+            logger.error("Session error or test type mismatch during _complete_test_part for user %s. Expected %s, session has %s.", user_id, test_type, session.current_test_type if session else 'None')
             self.bot.send_message(chat_id, "❌ Ошибка сессии при завершении теста. Пожалуйста, попробуйте команду /test снова.")
             return
         
@@ -1089,7 +1108,7 @@ class QuestionHandler:
                     else:
                         results_message_text = "Не удалось рассчитать SVS результаты (scores object is None)."
                 except Exception as e:
-                    logger.error(f"Error calculating or formatting SVS scores for user {user_id}: {e}", exc_info=True)
+                    logger.error("Error calculating or formatting SVS scores for user %s: %s", user_id, e, exc_info=True)
                     results_message_text = f"❌ Произошла ошибка при обработке результатов SVS: {e}"
             elif test_type == 'urica':
                 if len(responses_for_test) < get_total_urica_questions():
@@ -1291,19 +1310,20 @@ class QuestionHandler:
             
             # Mark this part as completed in session
             self.session_manager.complete_test_part(user_id, test_type)
-            logger.info(f"_complete_test_part: User {user_id} session.test_completed after update for {test_type}: {session.test_completed}")
+            TESTS_COMPLETED.inc(test_type)
+            logger.info("_complete_test_part: User %s session.test_completed after update for %s: %s", user_id, test_type, session.test_completed)
             
             # Send results for the completed test part
             # Экранируем подчеркивание в названии теста для корректного Markdown
             escaped_test_type_upper = test_type.upper().replace('_', '\\_')
             self.bot.send_message(chat_id, f"🎉 **Тест {escaped_test_type_upper} завершен!**\n\n{results_message_text}", parse_mode='Markdown')
-            logger.info(f"Test part {test_type} completed for user {user_id}")
+            logger.info("Test part %s completed for user %s", test_type, user_id)
 
             # Offer next test or finalize
             self._offer_next_test(chat_id, user_id)
 
         except Exception as e:
-            logger.error(f"Error completing test part {test_type} for user {user_id}: {e}")
+            logger.error("Error completing test part %s for user %s: %s", test_type, user_id, e)
             self.bot.send_message(chat_id, f"❌ Ошибка при расчете результатов для теста {test_type.upper()}.")
 
     def _offer_next_test(self, chat_id: int, user_id: int):
@@ -1323,19 +1343,16 @@ class QuestionHandler:
         
         if not available_tests:
             # Все тесты завершены! Генерируем обновленный отчет
-            logger.info(f"_offer_next_test: All tests completed for user {user_id}. Generating updated report.")
+            logger.info("_offer_next_test: All tests completed for user %s. Generating updated report.", user_id)
             self.bot.send_message(chat_id, "🎉 Поздравляем! Вы завершили все доступные тесты!")
             
             # Генерируем новый отчет с обновленными данными
             updated_report_path = self._generate_user_report(user_id)
             if updated_report_path:
-                logger.info(f"_offer_next_test: Updated report generated: {updated_report_path}")
+                logger.info("_offer_next_test: Updated report generated: %s", updated_report_path)
                 
                 # Проверяем и генерируем обновленный профиль
-                from pathlib import Path
-                current_script_path = Path(__file__).resolve()
-                hexaco_bot_root = current_script_path.parent.parent.parent 
-                user_profile_dir_absolute = hexaco_bot_root / "user_profile"
+                user_profile_dir_absolute = Path(USER_PROFILES_DIR).resolve()
                 user_profile_filename = f"{user_id}_profile.json"
                 user_profile_filepath = user_profile_dir_absolute / user_profile_filename
                 
@@ -1348,7 +1365,7 @@ class QuestionHandler:
                     if all_user_tests_data:
                         # ВРЕМЕННО ОТКЛЮЧЕНО: Интерпретация данных пользователя с помощью AI
                         # from hexaco_bot.src.psychoprofile.profiler import generate_and_save_psychoprofile
-                        logger.info(f"_offer_next_test: AI profile generation is temporarily disabled for user {user_id}")
+                        logger.info("_offer_next_test: AI profile generation is temporarily disabled for user %s", user_id)
                         # logger.info(f"_offer_next_test: Generating updated psychoprofile for user {user_id}")
                         # saved_profile_path = generate_and_save_psychoprofile(
                         #     user_id=str(user_id),
@@ -1360,14 +1377,14 @@ class QuestionHandler:
                         # else:
                         #     logger.error(f"_offer_next_test: Failed to generate updated psychoprofile for user {user_id}")
                     else:
-                        logger.error(f"_offer_next_test: No test data found in updated report for user {user_id}")
+                        logger.error("_offer_next_test: No test data found in updated report for user %s", user_id)
                         
                 except Exception as e:
-                    logger.error(f"_offer_next_test: Error processing updated report for user {user_id}: {e}")
+                    logger.error("_offer_next_test: Error processing updated report for user %s: %s", user_id, e)
                 
                 self.bot.send_message(chat_id, "📊 Ваш обновленный отчет готов! Подробный просмотр всех результатов доступен в меню.")
             else:
-                logger.error(f"_offer_next_test: Failed to generate updated report for user {user_id}")
+                logger.error("_offer_next_test: Failed to generate updated report for user %s", user_id)
                 self.bot.send_message(chat_id, "⚠️ Возникла проблема при создании обновленного отчета.")
             
             # Устанавливаем флаг завершения всех тестов
@@ -1381,40 +1398,10 @@ class QuestionHandler:
 
     def show_overall_results_menu(self, chat_id: int, user_id: int):
         """Placeholder: Shows a menu to view results of all completed tests."""
-        # This needs to be implemented: fetch all test results for the user and present them.
-        # For now, just acknowledge.
-        # We could try to get all results and send a summary if any.
-        all_results_info = []
-        hexaco_res = self.db.get_user_test_results(user_id, 'hexaco')
-        if hexaco_res:
-            all_results_info.append(f"HEXACO (пройдено {len(hexaco_res)} раз)")
-        sds_res = self.db.get_user_test_results(user_id, 'sds')
-        if sds_res:
-            all_results_info.append(f"SDS (пройдено {len(sds_res)} раз)")
-        svs_res = self.db.get_user_test_results(user_id, 'svs')
-        if svs_res:
-            all_results_info.append(f"SVS (пройдено {len(svs_res)} раз)")
-        urica_res = self.db.get_user_test_results(user_id, 'urica')
-        if urica_res:
-            all_results_info.append(f"URICA (пройдено {len(urica_res)} раз)")
-        dweck_res = self.db.get_user_test_results(user_id, 'dweck')
-        if dweck_res:
-            all_results_info.append(f"Двек (пройдено {len(dweck_res)} раз)")
-        panas_res = self.db.get_user_test_results(user_id, 'panas')
-        if panas_res:
-            all_results_info.append(f"ШПАНА (пройдено {len(panas_res)} раз)")
-        self_efficacy_res = self.db.get_user_test_results(user_id, 'self_efficacy')
-        if self_efficacy_res:
-            all_results_info.append(f"Самоэффективность (пройдено {len(self_efficacy_res)} раз)")
-        cdrisc_res = self.db.get_user_test_results(user_id, 'cdrisc')
-        if cdrisc_res:
-            all_results_info.append(f"Тест Устойчивости CD-RISC (пройдено {len(cdrisc_res)} раз)")
-        rfq_res = self.db.get_user_test_results(user_id, 'rfq')
-        if rfq_res:
-            all_results_info.append(f"Тест RFQ (пройдено {len(rfq_res)} раз)")
-        pid5bfm_res = self.db.get_user_test_results(user_id, 'pid5bfm')
-        if pid5bfm_res:
-            all_results_info.append(f"Опросник личности PID-5-BF+M (пройдено {len(pid5bfm_res)} раз)")
+        # Счетчики прохождений материализованы в user_test_counts (src/data/aggregates.py)
+        counts = self.db.get_user_test_counts(user_id)
+        all_results_info = [f"{name} (пройдено {counts[test_type]} раз)"
+                            for test_type, name in OVERALL_RESULTS_TEST_NAMES if counts.get(test_type)]
 
         if not all_results_info:
             self.bot.send_message(chat_id, "Вы еще не завершили ни одного теста. Используйте /test или кнопку в меню /start, чтобы начать.")
@@ -1469,22 +1456,22 @@ class QuestionHandler:
             call = context
             user_id = call.from_user.id
             chat_id = call.message.chat.id
-            logger.info(f"show_test_menu called for user_id: {user_id} via CallbackQuery from chat_id: {chat_id}")
+            logger.info("show_test_menu called for user_id: %s via CallbackQuery from chat_id: %s", user_id, chat_id)
         elif isinstance(context, Message):
             message = context
             user_id = message.from_user.id
             chat_id = message.chat.id
-            logger.info(f"show_test_menu called for user_id: {user_id} via Message from chat_id: {chat_id}")
+            logger.info("show_test_menu called for user_id: %s via Message from chat_id: %s", user_id, chat_id)
         else:
-            logger.error(f"show_test_menu called with invalid context type: {type(context)}")
+            logger.error("show_test_menu called with invalid context type: %s", type(context))
             # Cannot send a message if chat_id is unknown
             return
 
         user_data = self.db.get_user(user_id)
-        logger.info(f"show_test_menu: user_data from DB for user_id {user_id}: {user_data}")
+        logger.debug("show_test_menu: user_data from DB for user_id %s: %s", user_id, user_data)
         
         if not user_data:
-            logger.error(f"show_test_menu: user_data is None for user_id {user_id}. Sending registration prompt.")
+            logger.error("show_test_menu: user_data is None for user_id %s. Sending registration prompt.", user_id)
             self.bot.send_message(chat_id, "❌ Сначала нужно зарегистрироваться! Отправьте /start для регистрации.")
             return
         
@@ -1492,7 +1479,7 @@ class QuestionHandler:
 
         # If PAEI or MBTI are missing, direct to StartHandler flow first.
         if not user_data.get('paei_index') or not user_data.get('mbti_type'):
-            logger.warning(f"show_test_menu: User {user_id} is missing PAEI or MBTI. PAEI: {user_data.get('paei_index')}, MBTI: {user_data.get('mbti_type')}")
+            logger.warning("show_test_menu: User %s is missing PAEI or MBTI. PAEI: %s, MBTI: %s", user_id, user_data.get('paei_index'), user_data.get('mbti_type'))
             self.bot.send_message(chat_id, 
                                   "Пожалуйста, завершите начальную настройку, предоставив PAEI-индекс и MBTI-тип. "
                                   "Команда /start поможет вам в этом.")
@@ -1504,7 +1491,8 @@ class QuestionHandler:
         """Generate and send a JSON report of all user data and test results.
         Returns the path to the generated report file on success, None otherwise.
         """
-        logger.info(f"Generating comprehensive report for user {user_id}")
+        logger.info("Generating comprehensive report for user %s", user_id)
+        generation_started = time.perf_counter()
         
         report_data = self.db.get_user_data_for_report(user_id)
         
@@ -1519,13 +1507,11 @@ class QuestionHandler:
         final_report_content = report_data
 
         # Используем Path для работы с путями
-        current_script_path = Path(__file__).resolve()
-        hexaco_bot_root = current_script_path.parent.parent.parent 
-        reports_dir_path = hexaco_bot_root / "user_reports"
+        reports_dir_path = Path(USER_REPORTS_DIR).resolve()
 
         if not reports_dir_path.exists():
             reports_dir_path.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Created directory: {reports_dir_path}")
+            logger.info("Created directory: %s", reports_dir_path)
 
         username = report_data.get('username', f"user_{user_id}")
         safe_username = "".join(c if c.isalnum() else "_" for c in str(username))
@@ -1538,7 +1524,8 @@ class QuestionHandler:
         try:
             with open(report_filepath, 'w', encoding='utf-8') as f:
                 json.dump(final_report_content, f, ensure_ascii=False, indent=4)
-            logger.info(f"User report for {user_id} generated and saved to {report_filepath}")
+            REPORT_GENERATION_LATENCY.observe(time.perf_counter() - generation_started)
+            logger.info("User report for %s generated and saved to %s", user_id, report_filepath)
             
             with open(report_filepath, 'rb') as f_rb:
                 self.bot.send_document(user_id, f_rb, caption=f"📊 Ваш полный отчет, {report_data.get('first_name', '')}.")
@@ -16,11 +16,26 @@ if project_grandparent_dir not in sys.path:
 import logging
 import threading
 import time
-from telebot import TeleBot
+from typing import Any, Dict, Optional
+from telebot import TeleBot, apihelper
 from telebot.types import Message
 
-from hexaco_bot.config.settings import BOT_TOKEN, LOG_LEVEL, LOG_FILE
+from hexaco_bot.config.settings import (
+    BOT_TOKEN, BOT_THREADS, LOG_LEVEL, LOG_FILE, USER_REPORTS_DIR, USER_PROFILES_DIR, METRICS_HOST, METRICS_PORT,
+    LOG_MODE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_INTERVAL_HOURS, LOG_SAMPLING,
+    TRACE_EXPORT, TRACE_JSONL_PATH, TRACE_OTLP_ENDPOINT, TRACE_SLOW_MS, TRACE_SAMPLE_RATE,
+    ADMIN_USER_IDS, PROFILE_DIR, PROFILE_DEFAULT_SECONDS, PROFILE_SAMPLE_INTERVAL_MS,
+    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP_LAST, BACKUP_KEEP_DAILY,
+    BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS, COMPLETED_TESTS_RECONCILE_HOURS, ADMIN_EVENTS_POLL_SECONDS,
+    RETENTION_INTERVAL_HOURS, RETENTION_REPORTS_PER_USER, RETENTION_SESSION_DAYS, RETENTION_ORPHAN_PROFILES,
+    RETENTION_BATCH_SIZE, RETENTION_VACUUM_PAGES,
+    SESSION_STORE, SESSION_STORE_PATH, WORKER_INDEX, WORKER_BASE_PORT, LEADER_LEASE_SECONDS, TELEGRAM_API_URL,
+    SHUTDOWN_TIMEOUT_SECONDS, POLLING_TIMEOUT_SECONDS
+)
+from hexaco_bot.src.data.backup import BackupScheduler
 from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.data.purge import EVICT_USERS
+from hexaco_bot.src.data.retention import EXPIRE_SESSIONS, RetentionJob, RetentionPolicy
 from hexaco_bot.src.handlers.start_handler import (
     StartHandler, 
     STATE_GENDER_SELECTION, 
@@ -30,47 +45,94 @@ from hexaco_bot.src.handlers.start_handler import (
     STATE_INITIAL_SETUP_COMPLETE
 )
 from hexaco_bot.src.handlers.question_handler import QuestionHandler
-from hexaco_bot.src.session.session_manager import SessionManager
+from hexaco_bot.src.session.session_manager import SessionManager, instrument_bot as instrument_bot_sessions
+from hexaco_bot.src.session.session_store import SQLiteSessionStore, create_session_store
+from hexaco_bot.src.utils import lifecycle, metrics, tracing
+from hexaco_bot.src.utils.profiler import PROFILER, instrument_bot as instrument_bot_profiling, install_signal_toggle
+from hexaco_bot.src.utils.logging_setup import configure_logging, parse_sampling, stop_logging
 
 # Import report watcher for psychoprofile generation
 # from hexaco_bot.src.psychoprofile.report_watcher import start_watching_background  # ВРЕМЕННО ОТКЛЮЧЕНО
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+# Configure logging (file + console; in queue mode the I/O happens in a background listener thread)
+configure_logging(
+    level=LOG_LEVEL,
+    log_file=LOG_FILE,
+    mode=LOG_MODE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rotate_interval=LOG_ROTATE_INTERVAL_HOURS * 3600,
+    sampling=parse_sampling(LOG_SAMPLING),
 )
 
 logger = logging.getLogger(__name__)
 
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL
+
 class HEXACOBot:
     """Main HEXACO Telegram Bot class."""
     
     def __init__(self):
         """Initialize bot with handlers and database."""
-        self.bot = TeleBot(BOT_TOKEN)
+        self.bot = TeleBot(BOT_TOKEN, num_threads=BOT_THREADS)
+        # Запрос к Telegram идет параллельно с инициализацией базы, а не перед ней
+        self._get_me_thread = self._start_get_me()
         self.db = DatabaseManager()
-        self.session_manager = SessionManager(self.db)
+        self.session_manager = SessionManager(self.db, create_session_store(SESSION_STORE, SESSION_STORE_PATH))
+        self.lifecycle = lifecycle.Lifecycle(SHUTDOWN_TIMEOUT_SECONDS)
+        self.in_flight = lifecycle.InFlightTracker()
+        self.receiver = None
+        self.file_observer = None
+        self.similarity = None  # индекс строится при первой команде /similar
         self.start_handler = StartHandler(self.bot, self.db, self.session_manager)
         self.question_handler = QuestionHandler(self.bot, self.db, self.session_manager)
         
-        # Initialize database
-        if not self.db.initialize_database():
+        # Initialize database: blocking migrations now, long (online) ones in the background
+        if not self.db.initialize_database(run_online_migrations=False):
             logger.error("Failed to initialize database")
             sys.exit(1)
-        
-        # Start file system watcher in background thread
-        self._start_file_watcher()
+        self._restore_sessions()
+        # Команды администраторских скриптов нужны каждому процессу: у каждого свои сессии и кэши
+        self._admin_events_stop = self._start_admin_events()
+        self.backup_scheduler = self._create_backup_scheduler()
+        self.retention = self._create_retention_job()
+        self._reconcile_stop = None
+        self.leader = None
+        if WORKER_INDEX is None:
+            self._start_singleton_jobs()
+        else:
+            # Несколько воркеров: фоновые задачи выполняет только держатель аренды
+            from hexaco_bot.src.cluster.leader import LeaderElection
+            self.leader = LeaderElection(SESSION_STORE_PATH, 'background-jobs', LEADER_LEASE_SECONDS,
+                                         on_elected=self._start_singleton_jobs, on_lost=self._stop_singleton_jobs)
+            self.leader.start()
         
         # Register handlers
         self._register_handlers()
+        instrument_bot_sessions(self.bot, self.session_manager)
+        
+        # Instrumentation: must run after all handlers are registered
+        self._setup_metrics()
+        self._setup_tracing()
+        self._setup_profiling()
+        lifecycle.instrument_bot(self.bot, self.in_flight)
+        self._register_shutdown_steps()
         
         logger.info("HEXACO Bot initialized successfully")
     
+    def _start_get_me(self) -> threading.Thread:
+        """getMe in a background thread: checks the token and caches bot.user without delaying startup."""
+        def _get_me():
+            try:
+                logger.info(f"Connected to Telegram as @{self.bot.user.username}")
+            except Exception as e:
+                logger.warning(f"getMe failed, the token or Telegram API may be unavailable: {e}")
+
+        thread = threading.Thread(target=_get_me, name="telegram-get-me", daemon=True)
+        thread.start()
+        return thread
+
     def _safe_answer_callback_query(self, call_id: str, text: str = "") -> bool:
         """Безопасно отвечает на callback query, обрабатывая ошибки устаревших запросов."""
         try:
@@ -81,6 +143,301 @@ class HEXACOBot:
             logger.warning(f"Failed to answer callback query {call_id}: {e}")
             return False
     
+    def _setup_metrics(self):
+        """Wrap handlers, Telegram API and DB calls with metrics and start the local endpoint."""
+        metrics.instrument_bot(self.bot)
+        metrics.instrument_telegram_api()
+        metrics.instrument_database(self.db)
+        metrics.register_session_gauge(self.session_manager)
+        metrics.register_user_cache(self.db.user_cache)
+        metrics.register_backup_gauge(self.backup_scheduler)
+        self.metrics_server = metrics.start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    
+    def _setup_tracing(self):
+        """Start a trace per update and attach spans for DB, session and Telegram API calls."""
+        tracing.configure_tracing(
+            export=TRACE_EXPORT,
+            jsonl_path=TRACE_JSONL_PATH,
+            otlp_endpoint=TRACE_OTLP_ENDPOINT,
+            sample_rate=TRACE_SAMPLE_RATE,
+            slow_threshold_ms=TRACE_SLOW_MS,
+        )
+        tracing.instrument_bot(self.bot)
+        tracing.instrument_telegram_api()
+        tracing.instrument_methods(self.db, 'db', skip=('get_connection',))
+        tracing.instrument_methods(self.session_manager, 'session', skip=('update_scope',))
+
+    def _setup_profiling(self):
+        """Allow turning the runtime profiler on with /profile (admins) or SIGUSR1."""
+        PROFILER.output_dir = PROFILE_DIR
+        PROFILER.interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        instrument_bot_profiling(self.bot)
+        if install_signal_toggle(duration=PROFILE_DEFAULT_SECONDS,
+                                 on_finish=lambda result: self._send_profile_result(ADMIN_USER_IDS, result)):
+            logger.info("Send SIGUSR1 to pid %s to start/stop a %.0fs profiling window", os.getpid(), PROFILE_DEFAULT_SECONDS)
+
+    def _send_profile_result(self, chat_ids, result):
+        """Sends the profile summary and files to the given chats."""
+        summary = result.summary if len(result.summary) <= 3500 else result.summary[:3500] + "\n..."
+        for chat_id in chat_ids:
+            try:
+                self.bot.send_message(chat_id, f"📈 Профилирование завершено\n\n{summary}")
+                for path in result.files:
+                    if path.endswith('.txt'):
+                        continue
+                    with open(path, 'rb') as f:
+                        self.bot.send_document(chat_id, f)
+            except Exception as e:
+                logger.warning(f"Failed to send profile result to {chat_id}: {e}")
+
+    def _handle_profile_command(self, message: Message):
+        """/profile [seconds] [sample|cprofile] [all] or /profile stop - admins only."""
+        if message.from_user.id not in ADMIN_USER_IDS:
+            self.bot.send_message(message.chat.id, "⛔ Команда доступна только администраторам.")
+            return
+        args = message.text.split()[1:]
+        if args and args[0] == 'stop':
+            if PROFILER.stop() is None:
+                self.bot.send_message(message.chat.id, "Профилирование не запущено.")
+            return
+        duration = PROFILE_DEFAULT_SECONDS
+        mode = 'sample'
+        all_threads = False
+        for arg in args:
+            if arg in ('sample', 'cprofile'):
+                mode = arg
+            elif arg == 'all':
+                all_threads = True
+            else:
+                try:
+                    duration = float(arg)
+                except ValueError:
+                    self.bot.send_message(message.chat.id, "Использование: /profile [секунды] [sample|cprofile] [all] или /profile stop")
+                    return
+        started = PROFILER.start(duration, mode=mode, all_threads=all_threads,
+                                 on_finish=lambda result: self._send_profile_result([message.chat.id], result))
+        if started:
+            self.bot.send_message(message.chat.id, f"⏱ Профилирование ({mode}) запущено на {min(duration, PROFILER.max_duration):.0f} с.")
+        else:
+            self.bot.send_message(message.chat.id, "Профилирование уже запущено. /profile stop - остановить.")
+
+    def _similarity_index(self):
+        if self.similarity is None:
+            from hexaco_bot.src.data.similarity import SimilarityIndex
+            self.similarity = SimilarityIndex(self.db.db_path)
+        # Дочитывает результаты, сохраненные после прошлого запроса (в том числе другими воркерами)
+        self.similarity.refresh()
+        return self.similarity
+
+    def _handle_similar_command(self, message: Message):
+        """/similar [user_id] [k] [cosine|euclidean] - users with the closest HEXACO/SVS profiles, admins only."""
+        if message.from_user.id not in ADMIN_USER_IDS:
+            self.bot.send_message(message.chat.id, "⛔ Команда доступна только администраторам.")
+            return
+        user_id, k, metric = message.from_user.id, 10, 'cosine'
+        numbers = []
+        for arg in message.text.split()[1:]:
+            if arg in ('cosine', 'euclidean'):
+                metric = arg
+            elif arg.isdigit():
+                numbers.append(int(arg))
+            else:
+                self.bot.send_message(message.chat.id, "Использование: /similar [user_id] [k] [cosine|euclidean]")
+                return
+        if numbers:
+            user_id = numbers[0]
+        if len(numbers) > 1:
+            k = min(numbers[1], 50)
+        index = self._similarity_index()
+        if user_id not in index:
+            self.bot.send_message(message.chat.id, f"У пользователя {user_id} нет результатов HEXACO или SVS.")
+            return
+        lines = [f"👥 Ближайшие профили к {user_id} ({'косинусное сходство' if metric == 'cosine' else 'расстояние'}):"]
+        for neighbor in index.query(user_id, k, metric):
+            user = self.db.get_user(neighbor.user_id) or {}
+            name = f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip() or str(neighbor.user_id)
+            lines.append(f"{neighbor.score:.3f}  {name} ({neighbor.user_id})")
+        self.bot.send_message(message.chat.id, "\n".join(lines))
+
+    def _start_singleton_jobs(self):
+        """Jobs that must run in one process only: online migrations, backups, retention, reconciliation, file watcher."""
+        self.db.start_background_migrations()
+        self.backup_scheduler.start()
+        self.retention.start()
+        self._start_completed_tests_reconciliation()
+        self._start_file_watcher()
+
+    def _stop_singleton_jobs(self, timeout: float = 10.0):
+        """Called on shutdown and when this worker loses leadership; the jobs stop at a safe point."""
+        deadline = time.monotonic() + timeout
+        if self._reconcile_stop is not None:
+            self._reconcile_stop.set()
+        # Онлайн-миграция останавливается между пачками, снимок базы дописывается до конца
+        self.db.stop_background_migrations(max(0.0, deadline - time.monotonic()))
+        self.backup_scheduler.stop(max(0.0, deadline - time.monotonic()))
+        self.retention.stop(max(0.0, deadline - time.monotonic()))
+        self._stop_file_watcher(max(0.0, deadline - time.monotonic()))
+
+    def _restore_sessions(self):
+        """In-memory sessions saved to SESSION_STORE_PATH at the last shutdown are taken back."""
+        if self.session_manager.store is not None or not os.path.exists(SESSION_STORE_PATH):
+            return
+        store = SQLiteSessionStore(SESSION_STORE_PATH)
+        try:
+            self.session_manager.restore(store)
+        finally:
+            store.close()
+
+    def _register_shutdown_steps(self):
+        """Shutdown order: stop intake, finish handlers, save state, stop jobs, flush telemetry."""
+        steps = self.lifecycle
+        steps.add_step('stop intake', self._stop_intake)
+        steps.add_step('drain handlers', self._drain_handlers)
+        steps.add_step('confirm updates', self._confirm_updates)
+        steps.add_step('flush sessions', self._flush_sessions)
+        if self.leader is not None:
+            steps.add_step('release leadership', lambda timeout: self.leader.stop(timeout))
+        else:
+            steps.add_step('stop background jobs', self._stop_singleton_jobs)
+        steps.add_step('stop admin events', lambda timeout: self._admin_events_stop and self._admin_events_stop.set())
+        steps.add_step('stop profiler', lambda timeout: PROFILER.stop(timeout) if PROFILER.is_running else None)
+        steps.add_step('stop metrics endpoint', lambda timeout: self.metrics_server.stop() if self.metrics_server else None)
+        steps.add_step('flush traces', lambda timeout: tracing.TRACER.exporter.shutdown(timeout)
+                       if tracing.TRACER.exporter is not None else None)
+
+    def _stop_intake(self, timeout: float):
+        if self.receiver is not None:
+            # Front повторит непринятые апдейты, когда воркер поднимется снова
+            self.receiver.stop(timeout)
+        else:
+            self.bot.stop_polling()
+            polling = getattr(self, '_polling_thread', None)
+            if polling is not None:
+                # Текущий long poll завершится сам; то, что он вернет, тоже будет обработано
+                polling.join(timeout)
+
+    def _drain_handlers(self, timeout: float):
+        pool = self.bot.worker_pool if self.bot.threaded else None
+        queued = (lambda: pool.tasks.qsize()) if pool is not None else (lambda: 0)
+        self._drained = self.in_flight.wait_idle(timeout, queued)
+        if not self._drained:
+            logger.warning(f"{self.in_flight.count} handler(s) still running and {queued()} update(s) queued "
+                           f"at shutdown deadline")
+        if pool is not None:
+            for worker in pool.workers:
+                worker.stop()
+
+    def _confirm_updates(self, timeout: float):
+        """Tells Telegram that the handled updates are done, so they are not delivered again after restart."""
+        if self.receiver is not None or not self.bot.last_update_id:
+            return
+        if not getattr(self, '_drained', False):
+            # Необработанные апдейты не подтверждаем: Telegram пришлет их после перезапуска
+            logger.warning("Not all updates were handled, leaving them unconfirmed")
+            return
+        apihelper.get_updates(BOT_TOKEN, offset=self.bot.last_update_id + 1, limit=1,
+                              timeout=max(1, int(timeout)), long_polling_timeout=0)
+
+    def _flush_sessions(self, timeout: float):
+        if self.session_manager.store is not None:
+            # Общее хранилище: сохраняем только сессии обработчиков, не успевших завершиться
+            self.session_manager.flush()
+            self.session_manager.store.close()
+            return
+        store = SQLiteSessionStore(SESSION_STORE_PATH)
+        try:
+            self.session_manager.flush(store)
+        finally:
+            store.close()
+
+    def shutdown(self) -> bool:
+        """Graceful stop (see _register_shutdown_steps); safe to call more than once."""
+        ok = self.lifecycle.shutdown()
+        stop_logging()
+        return ok
+
+    def _create_backup_scheduler(self) -> BackupScheduler:
+        """Periodic hot backups of the database in a background thread (started with the singleton jobs)."""
+        return BackupScheduler(
+            self.db.db_path,
+            BACKUP_DIR or None,
+            interval=BACKUP_INTERVAL_HOURS * 3600,
+            keep_last=BACKUP_KEEP_LAST,
+            keep_daily=BACKUP_KEEP_DAILY,
+            pages=BACKUP_PAGES_PER_STEP,
+            step_sleep=BACKUP_STEP_SLEEP_MS / 1000,
+        )
+
+    def _create_retention_job(self) -> RetentionJob:
+        """Pruning of old reports, orphan profiles and stale sessions plus incremental vacuum (singleton job)."""
+        policy = RetentionPolicy(
+            reports_per_user=RETENTION_REPORTS_PER_USER,
+            session_days=RETENTION_SESSION_DAYS,
+            orphan_profiles=RETENTION_ORPHAN_PROFILES,
+            batch_size=RETENTION_BATCH_SIZE,
+            vacuum_pages=RETENTION_VACUUM_PAGES,
+        )
+        return RetentionJob(self.db.db_path, USER_REPORTS_DIR, USER_PROFILES_DIR, policy,
+                            interval=RETENTION_INTERVAL_HOURS * 3600)
+
+    def _start_completed_tests_reconciliation(self):
+        """Periodically checks the completed-tests bitmasks and the completion counters against results."""
+        if COMPLETED_TESTS_RECONCILE_HOURS <= 0:
+            return
+        interval = COMPLETED_TESTS_RECONCILE_HOURS * 3600
+        self._reconcile_stop = stop_event = threading.Event()
+
+        def _loop():
+            while not stop_event.wait(interval):
+                self.db.reconcile_completed_tests()
+                self.db.reconcile_aggregates()
+
+        threading.Thread(target=_loop, name="completed-tests-reconcile", daemon=True).start()
+
+    def _start_admin_events(self) -> Optional[threading.Event]:
+        """Polls admin_events for commands written by admin scripts (src/data/purge.py) after this start."""
+        if ADMIN_EVENTS_POLL_SECONDS <= 0:
+            return None
+        stop_event = threading.Event()
+        last_event_id = self.db.get_latest_admin_event_id()
+
+        def _loop():
+            nonlocal last_event_id
+            while not stop_event.wait(ADMIN_EVENTS_POLL_SECONDS):
+                for event in self.db.get_admin_events(last_event_id):
+                    try:
+                        self._apply_admin_event(event)
+                    except Exception as e:
+                        logger.error(f"Failed to apply admin event {event['event_id']} ({event['kind']}): {e}")
+                    last_event_id = event['event_id']
+
+        threading.Thread(target=_loop, name="admin-events", daemon=True).start()
+        return stop_event
+
+    def _apply_admin_event(self, event: Dict[str, Any]):
+        if event['kind'] == EXPIRE_SESSIONS:
+            evicted = sum(self.session_manager.evict_session(user_id, session_id)
+                          for user_id, session_id in event['payload']['sessions'])
+            logger.info(f"Admin event {event['event_id']}: {evicted} expired session(s) evicted")
+            return
+        if event['kind'] != EVICT_USERS:
+            logger.warning(f"Unknown admin event kind {event['kind']!r}, skipped")
+            return
+        user_ids = event['payload']['user_ids']
+        if event['payload'].get('cache_only'):
+            # Исправлена только строка users (reconcile_completed_tests): сессии и векторы остаются
+            for user_id in user_ids:
+                self.db.user_cache.invalidate(user_id)
+            logger.info(f"Admin event {event['event_id']}: cached rows of {len(user_ids)} user(s) invalidated")
+            return
+        evicted = sum(self.session_manager.evict(user_id) for user_id in user_ids)
+        for user_id in user_ids:
+            self.db.user_cache.invalidate(user_id)
+        if self.similarity is not None:
+            self.similarity.remove(user_ids)
+        scope = event['payload'].get('test_type') or 'all data'
+        logger.info(f"Admin event {event['event_id']}: {len(user_ids)} user(s) purged ({scope}), {evicted} session(s) evicted")
+
     def _start_file_watcher(self):
         """Start the file system watcher for automatic psychoprofile generation."""
         try:
@@ -94,14 +451,20 @@ class HEXACOBot:
         except Exception as e:
             logger.error(f"Failed to start file system watcher: {e}")
     
+    def _stop_file_watcher(self, timeout: float):
+        """Stops the observer; a report being turned into a psychoprofile is finished first."""
+        observer, self.file_observer = self.file_observer, None
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout)
+
     def _run_file_watcher(self):
         """Run the file system watcher."""
         try:
             # ВРЕМЕННО ОТКЛЮЧЕНО: Автоматическое создание профилей при появлении новых отчетов
             # Use absolute paths to ensure they work from any working directory
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # Go up to project root
-            reports_dir = os.path.join(base_dir, "hexaco_bot", "user_reports")
-            profiles_dir = os.path.join(base_dir, "hexaco_bot", "user_profile")
+            reports_dir = os.path.abspath(USER_REPORTS_DIR)
+            profiles_dir = os.path.abspath(USER_PROFILES_DIR)
             
             # self.file_observer = start_watching_background(reports_dir, profiles_dir)
             logger.info(f"File watcher is temporarily disabled. Reports dir: {reports_dir}, Profiles dir: {profiles_dir}")
@@ -213,6 +576,16 @@ class HEXACOBot:
             
             self.bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
         
+        # Admin: runtime profiler
+        @self.bot.message_handler(commands=['profile'])
+        def handle_profile(message: Message):
+            self._handle_profile_command(message)
+        
+        # Admin: users with similar profiles
+        @self.bot.message_handler(commands=['similar'])
+        def handle_similar(message: Message):
+            self._handle_similar_command(message)
+        
         # Default message handler
         @self.bot.message_handler(func=lambda message: True)
         def handle_message(message: Message):
@@ -264,24 +637,42 @@ class HEXACOBot:
         logger.info("Bot handlers registered")
     
     def run(self):
-        """Start bot polling."""
-        try:
+        """
+        Start bot polling (or, as a cluster worker, accept updates from the front) and block until
+        shutdown is requested; call shutdown() afterwards.
+        """
+        if WORKER_INDEX is not None:
+            from hexaco_bot.src.cluster.worker import UpdateReceiver
+            self.receiver = UpdateReceiver(self.bot, '127.0.0.1', WORKER_BASE_PORT + WORKER_INDEX).start()
+            logger.info(f"Starting HEXACO Bot worker {WORKER_INDEX}...")
+        else:
             logger.info("Starting HEXACO Bot...")
-            self.bot.infinity_polling(none_stop=True)
-        except Exception as e:
-            logger.error(f"Bot polling error: {e}")
-            raise
+            self._polling_thread = threading.Thread(
+                target=self.bot.infinity_polling,
+                kwargs={'timeout': POLLING_TIMEOUT_SECONDS + 10, 'long_polling_timeout': POLLING_TIMEOUT_SECONDS},
+                name="bot-polling",
+                daemon=True,
+            )
+            self._polling_thread.start()
+        # Ждем с таймаутом: так главный поток успевает обработать сигнал
+        while not self.lifecycle.wait(1.0):
+            pass
 
 def main():
     """Main entry point."""
     try:
         bot = HEXACOBot()
-        bot.run()
-    except KeyboardInterrupt:
-        logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Bot startup error: {e}")
         sys.exit(1)
+    bot.lifecycle.install_signal_handlers()
+    try:
+        bot.run()
+    except KeyboardInterrupt:
+        logger.info("Bot stopped by user")
+    finally:
+        if not bot.shutdown():
+            sys.exit(1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -4,14 +4,52 @@ HEXACO scoring algorithms and result calculations.
 
 import json
 import logging
-from typing import Dict, List, Tuple
-from collections import defaultdict
+from operator import itemgetter
+from typing import Callable, Dict, List, Tuple
 
 # Используем абсолютный импорт
-from hexaco_bot.src.data.hexaco_questions import HEXACO_QUESTIONS, FACTORS, get_questions_by_factor
+from hexaco_bot.src.data.hexaco_questions import HEXACO_QUESTIONS, FACTORS
 
 logger = logging.getLogger(__name__)
 
+# Ключ теста, собранный один раз при импорте: для вопроса N (индекс N-1) - номер фактора в
+# FACTOR_ORDER и знак (+1 прямой, -1 обратный). Обратный пункт считается как 6 - ответ.
+FACTOR_ORDER: Tuple[str, ...] = tuple(FACTORS)
+QUESTION_NUMBERS: Tuple[int, ...] = tuple(range(1, len(HEXACO_QUESTIONS) + 1))
+ITEM_FACTOR: Tuple[int, ...] = tuple(FACTOR_ORDER.index(factor) for _, factor, _ in HEXACO_QUESTIONS)
+ITEM_SIGN: Tuple[int, ...] = tuple(-1 if reverse else 1 for _, _, reverse in HEXACO_QUESTIONS)
+
+_QUESTION_SET = frozenset(QUESTION_NUMBERS)
+_VALID_ANSWERS = frozenset(range(1, 6))
+
+
+def _items_getter(question_numbers: List[int]) -> Callable[[Dict[int, int]], Tuple[int, ...]]:
+    """itemgetter that always returns a tuple (itemgetter of one key returns the bare value)."""
+    if not question_numbers:
+        return lambda responses: ()
+    if len(question_numbers) == 1:
+        single = itemgetter(question_numbers[0])
+        return lambda responses: (single(responses),)
+    return itemgetter(*question_numbers)
+
+
+def _compile_factor_keys() -> Tuple[Tuple[str, Callable, Callable, int, int], ...]:
+    """
+    Per factor: (code, getter of direct items, getter of reverse items, 6 * reverse items, items).
+    The factor sum is sum(direct) - sum(reverse) + 6 * reverse items: the sign-weighted dot
+    product of the answers with the key, done by itemgetter/sum in C instead of a Python loop.
+    """
+    keys = []
+    for index, factor in enumerate(FACTOR_ORDER):
+        direct = [q for q, f, sign in zip(QUESTION_NUMBERS, ITEM_FACTOR, ITEM_SIGN) if f == index and sign > 0]
+        reverse = [q for q, f, sign in zip(QUESTION_NUMBERS, ITEM_FACTOR, ITEM_SIGN) if f == index and sign < 0]
+        keys.append((factor, _items_getter(direct), _items_getter(reverse), 6 * len(reverse), len(direct) + len(reverse)))
+    return tuple(keys)
+
+
+_FACTOR_KEYS = _compile_factor_keys()
+
+
 class HEXACOScorer:
     """Calculates HEXACO personality scores from user responses."""
     
@@ -21,11 +59,10 @@ class HEXACOScorer:
         
     def _build_factor_mappings(self) -> Dict[str, List[Tuple[int, bool]]]:
         """Build mapping of factors to their questions and reverse scoring."""
-        mappings = {}
-        for factor in FACTORS.keys():
-            questions = get_questions_by_factor(factor)
+        mappings = {factor: [] for factor in FACTOR_ORDER}
+        for q_num, factor, sign in zip(QUESTION_NUMBERS, ITEM_FACTOR, ITEM_SIGN):
             # Store (question_number, is_reverse_scored) tuples
-            mappings[factor] = [(q_num, reverse) for q_num, _, reverse in questions]
+            mappings[FACTOR_ORDER[factor]].append((q_num, sign < 0))
         return mappings
     
     def calculate_scores(self, responses: Dict[int, int]) -> Dict[str, float]:
@@ -41,31 +78,16 @@ class HEXACOScorer:
         if len(responses) != 100:
             raise ValueError(f"Expected 100 responses, got {len(responses)}")
         
-        scores = {}
+        try:
+            # Суммы целые, поэтому результат совпадает с поэлементным подсчетом до последнего знака
+            scores = {factor: round((sum(direct(responses)) - sum(reverse(responses)) + offset) / items, 2)
+                      for factor, direct, reverse, offset, items in _FACTOR_KEYS}
+        except KeyError:
+            missing = min(q for q in QUESTION_NUMBERS if q not in responses)
+            raise ValueError(f"Missing response for question {missing}") from None
         
-        for factor, question_data in self.factor_questions.items():
-            factor_scores = []
-            
-            for question_num, is_reverse in question_data:
-                if question_num not in responses:
-                    raise ValueError(f"Missing response for question {question_num}")
-                
-                raw_score = responses[question_num]
-                
-                # Apply reverse scoring if needed
-                if is_reverse:
-                    # Reverse scale: 1->5, 2->4, 3->3, 4->2, 5->1
-                    adjusted_score = 6 - raw_score
-                else:
-                    adjusted_score = raw_score
-                
-                factor_scores.append(adjusted_score)
-            
-            # Calculate mean score for this factor
-            mean_score = sum(factor_scores) / len(factor_scores)
-            scores[factor] = round(mean_score, 2)
-            
-            logger.debug(f"Factor {factor}: {len(factor_scores)} items, mean = {mean_score:.2f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"HEXACO factor means: {scores}")
         
         return scores
     
@@ -182,6 +204,17 @@ class HEXACOScorer:
     
     def validate_responses(self, responses: Dict[int, int]) -> List[str]:
         """Validate user responses and return list of errors."""
+        # Быстрый путь для корректного набора: проверки множествами, без строк ошибок.
+        # 1.0 == 1 проходит проверку множеством, но дает float в сумме; bool и подклассы int
+        # остаются int, как и в isinstance ниже
+        answers = responses.values()
+        try:
+            if len(responses) == 100 and _QUESTION_SET.issuperset(responses) \
+                    and _VALID_ANSWERS.issuperset(answers) and type(sum(answers)) is int:
+                return []
+        except TypeError:
+            pass  # нехешируемые или нечисловые ответы: ошибки перечислит общий путь
+        
         errors = []
         
         # Check total count
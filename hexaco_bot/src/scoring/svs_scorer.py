@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 Calculates scores for the Schwartz Value Survey (SVS).
+
+Scoring is linear: the mean of a value type's ipsatized items equals the mean of its raw items minus
+the respondent's mean answer, so value type scores are the answers times a fixed 57x10 item-to-value
+weight matrix, divided by the item counts, minus the mean answer. calculate_scores() scores one
+respondent with plain Python floats; calculate_scores_batch()/score_matrix() score many at once with
+NumPy matrix products. Both paths sum the integer answers first, so equal values tie exactly and
+sort the same way in either path.
 """
-import numpy as np
-from typing import Dict, Any, List, Tuple
+from operator import itemgetter
+from typing import Dict, Any, List, Sequence, Tuple
 
 class SVSScorer:
     """
@@ -54,38 +61,25 @@ class SVSScorer:
                 - 'value_type_scores': Mean ipsatized scores for each of the 10 value types.
                 - 'cluster_scores': Mean ipsatized scores for the 4 higher-order clusters.
                 - 'sorted_value_types': Value types sorted by their mean ipsatized scores (descending).
+            All numbers are plain Python floats.
         """
-        if not responses or len(responses) != 57:
+        if not responses or len(responses) != QUESTION_COUNT or not _QUESTION_SET.issuperset(responses):
             # Or handle more gracefully, e.g., log a warning and return partial results
             # For now, require all 57 responses
             raise ValueError("SVS scorer requires all 57 responses.")
 
-        raw_scores_list = [responses[i] for i in range(1, 58) if i in responses]
-
-        if not raw_scores_list:
-            mean_raw_score = 0.0
-        else:
-            mean_raw_score = np.mean(raw_scores_list)
-
-        ipsatized_scores: Dict[int, float] = {}
-        for q_id, raw_score in responses.items():
-            ipsatized_scores[q_id] = float(raw_score - mean_raw_score)
-
-        value_type_scores: Dict[str, float] = {}
-        for value_type, question_ids in self.VALUE_MAP.items():
-            type_scores = [ipsatized_scores[q_id] for q_id in question_ids if q_id in ipsatized_scores]
-            if type_scores:
-                value_type_scores[value_type] = np.mean(type_scores)
-            else:
-                value_type_scores[value_type] = 0.0 # Or handle as NaN or error
-
-        cluster_scores: Dict[str, float] = {}
-        for cluster_name, comprised_values in self.CLUSTERS.items():
-            cluster_component_scores = [value_type_scores[val_type] for val_type in comprised_values if val_type in value_type_scores]
-            if cluster_component_scores:
-                cluster_scores[cluster_name] = np.mean(cluster_component_scores)
-            else:
-                cluster_scores[cluster_name] = 0.0
+        mean_raw_score = sum(responses.values()) / QUESTION_COUNT
+
+        ipsatized_scores: Dict[int, float] = {q_id: float(raw_score - mean_raw_score)
+                                              for q_id, raw_score in responses.items()}
+
+        value_type_scores: Dict[str, float] = {value_type: sum(items(responses)) / count - mean_raw_score
+                                               for value_type, items, count in _VALUE_ITEMS}
+
+        cluster_scores: Dict[str, float] = {
+            cluster_name: sum(value_type_scores[val_type] for val_type in comprised_values) / len(comprised_values)
+            for cluster_name, comprised_values in self.CLUSTERS.items()
+        }
 
         sorted_value_types = sorted(value_type_scores.items(), key=lambda item: item[1], reverse=True)
 
@@ -101,6 +95,86 @@ class SVSScorer:
             # This scorer focuses on calculating the numerical scores.
         }
 
+    def score_matrix(self, answers) -> Tuple[Any, Any, Any]:
+        """
+        Scores respondents given as an (n, 57) array of raw answers (column j = question j + 1).
+
+        Returns NumPy arrays (mean_raw_scores (n,), value_type_scores (n, 10) in VALUE_ORDER,
+        cluster_scores (n, 4) in CLUSTER_ORDER).
+        """
+        import numpy as np
+
+        answers = np.asarray(answers, dtype=np.float64)
+        if answers.ndim != 2 or answers.shape[1] != QUESTION_COUNT:
+            raise ValueError(f"Expected an (n, {QUESTION_COUNT}) answer matrix, got shape {answers.shape}")
+        value_weights, value_counts, cluster_weights, cluster_counts = _numpy_weights()
+        mean_raw_scores = answers.sum(axis=1) / QUESTION_COUNT
+        value_type_scores = answers @ value_weights / value_counts - mean_raw_scores[:, None]
+        return mean_raw_scores, value_type_scores, value_type_scores @ cluster_weights / cluster_counts
+
+    def calculate_scores_batch(self, responses_list: Sequence[Dict[int, int]]) -> List[Dict[str, Any]]:
+        """
+        calculate_scores() for many respondents: the arithmetic is done by score_matrix() for all of
+        them at once. Results have the same keys and plain floats; cluster scores may differ from
+        calculate_scores() in the last bit of a float (different summation order).
+        """
+        for responses in responses_list:
+            if not responses or len(responses) != QUESTION_COUNT or not _QUESTION_SET.issuperset(responses):
+                raise ValueError("SVS scorer requires all 57 responses.")
+        if not responses_list:
+            return []
+        rows = [[responses[q_id] for q_id in QUESTION_NUMBERS] for responses in responses_list]
+        mean_raw_scores, value_matrix, cluster_matrix = self.score_matrix(rows)
+
+        results = []
+        for responses, mean_raw_score, value_row, cluster_row in zip(
+                responses_list, mean_raw_scores.tolist(), value_matrix.tolist(), cluster_matrix.tolist()):
+            value_type_scores = dict(zip(VALUE_ORDER, value_row))
+            results.append({
+                'raw_scores': responses,
+                'ipsatized_scores': {q_id: float(raw_score - mean_raw_score) for q_id, raw_score in responses.items()},
+                'mean_raw_score': mean_raw_score,
+                'value_type_scores': value_type_scores,
+                'cluster_scores': dict(zip(CLUSTER_ORDER, cluster_row)),
+                'sorted_value_types': sorted(value_type_scores.items(), key=lambda item: item[1], reverse=True),
+            })
+        return results
+
+
+# Ключ теста, собранный один раз при импорте
+QUESTION_COUNT = 57
+QUESTION_NUMBERS: Tuple[int, ...] = tuple(range(1, QUESTION_COUNT + 1))
+VALUE_ORDER: Tuple[str, ...] = tuple(SVSScorer.VALUE_MAP)
+CLUSTER_ORDER: Tuple[str, ...] = tuple(SVSScorer.CLUSTERS)
+# VALUE_WEIGHTS[q - 1][v] = 1, если вопрос q входит в ценность VALUE_ORDER[v]; среднее - сумма / VALUE_ITEM_COUNTS[v]
+VALUE_WEIGHTS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(int(q_id in SVSScorer.VALUE_MAP[value_type]) for value_type in VALUE_ORDER)
+    for q_id in QUESTION_NUMBERS
+)
+VALUE_ITEM_COUNTS: Tuple[int, ...] = tuple(len(SVSScorer.VALUE_MAP[value_type]) for value_type in VALUE_ORDER)
+# CLUSTER_WEIGHTS[v][c] = 1, если ценность VALUE_ORDER[v] входит в кластер CLUSTER_ORDER[c]
+CLUSTER_WEIGHTS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(int(value_type in SVSScorer.CLUSTERS[cluster]) for cluster in CLUSTER_ORDER)
+    for value_type in VALUE_ORDER
+)
+CLUSTER_VALUE_COUNTS: Tuple[int, ...] = tuple(len(SVSScorer.CLUSTERS[cluster]) for cluster in CLUSTER_ORDER)
+
+_QUESTION_SET = frozenset(QUESTION_NUMBERS)
+# Для одного респондента: (ценность, itemgetter ее пунктов, число пунктов)
+_VALUE_ITEMS = tuple((value_type, itemgetter(*question_ids), len(question_ids))
+                     for value_type, question_ids in SVSScorer.VALUE_MAP.items())
+_numpy_weight_cache: List[Any] = []
+
+
+def _numpy_weights():
+    """The weight matrices and counts as float64 NumPy arrays, built on the first batch call."""
+    if not _numpy_weight_cache:
+        import numpy as np
+        _numpy_weight_cache.extend(np.array(table, dtype=np.float64) for table in
+                                   (VALUE_WEIGHTS, VALUE_ITEM_COUNTS, CLUSTER_WEIGHTS, CLUSTER_VALUE_COUNTS))
+    return tuple(_numpy_weight_cache)
+
+
 if __name__ == '__main__':
     # Example usage:
     # Create dummy responses (all 3s, for simplicity)
@@ -4,14 +4,20 @@ Session management for HEXACO test progress tracking.
 
 import uuid
 import logging
+import functools
+import threading
+from contextlib import contextmanager
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 import time
 
 # Используем абсолютный импорт
 from hexaco_bot.src.data.database import DatabaseManager
+from hexaco_bot.src.utils.handlers import wrap_handlers
 
 logger = logging.getLogger(__name__)
+# Отдельный логгер для событий на каждый ответ, чтобы их можно было семплировать (LOG_SAMPLING)
+response_logger = logging.getLogger(__name__ + '.responses')
 
 class UserSession:
     """Represents a user test session."""
@@ -47,12 +53,65 @@ class UserSession:
         self.temp_data = {}  # Temporary data storage during registration
 
 class SessionManager:
-    """Manages user sessions and test progress."""
+    """
+    Manages user sessions and test progress.
+
+    Without a store sessions live only in active_sessions of this process. With a SessionStore
+    (see session_store.py) several processes share them: a session is loaded for the duration of
+    update_scope() - one handled update - and written back when the scope ends.
+    """
     
-    def __init__(self, db: DatabaseManager):
+    def __init__(self, db: DatabaseManager, store=None):
         self.db = db
+        self.store = store
         self.active_sessions: Dict[int, UserSession] = {}
-        logger.info("Session manager initialized")
+        # Сколько обработчиков сейчас держат сессию пользователя (только при store)
+        self._scope_refs: Dict[int, int] = {}
+        self._scope_lock = threading.Lock()
+        logger.info("Session manager initialized (store: %s)", type(store).__name__ if store else "memory")
+
+    @contextmanager
+    def update_scope(self, user_id: int):
+        """
+        Keeps the user's session loaded while one update is handled and saves it afterwards.
+        Concurrent scopes of the same user in this process share one UserSession object.
+        """
+        if self.store is None:
+            yield
+            return
+        with self._scope_lock:
+            refs = self._scope_refs.get(user_id, 0)
+            self._scope_refs[user_id] = refs + 1
+            load = refs == 0 and user_id not in self.active_sessions
+        if load:
+            try:
+                session = self.store.load(user_id)
+            except Exception as e:
+                logger.error("Failed to load session of user %s: %s", user_id, e)
+                session = None
+            if session is not None:
+                with self._scope_lock:
+                    self.active_sessions.setdefault(user_id, session)
+        try:
+            yield
+        finally:
+            # Сохраняем, пока сессия еще в active_sessions: обработчик, начавшийся во время записи,
+            # возьмет этот же объект, а не устаревшую копию из хранилища
+            with self._scope_lock:
+                session = self.active_sessions.get(user_id) if self._scope_refs[user_id] == 1 else None
+            if session is not None:
+                try:
+                    self.store.save(session)
+                except Exception as e:
+                    logger.error("Failed to save session of user %s: %s", user_id, e)
+            with self._scope_lock:
+                refs = self._scope_refs[user_id] - 1
+                if refs:
+                    # Во время записи начался другой обработчик: он сохранит сессию сам
+                    self._scope_refs[user_id] = refs
+                else:
+                    del self._scope_refs[user_id]
+                    self.active_sessions.pop(user_id, None)
     
     def create_session(self, user_id: int) -> str:
         """Create new test session for user."""
@@ -63,15 +122,22 @@ class SessionManager:
             # Create in-memory session
             session = UserSession(session_id, user_id)
             self.active_sessions[user_id] = session
-            logger.info(f"Session created for user {user_id}: {session_id}")
+            if self.store is not None and user_id not in self._scope_refs:
+                # Создана вне update_scope: сразу сохраняем, иначе другие процессы ее не увидят
+                self.store.save(self.active_sessions.pop(user_id))
+            logger.info("Session created for user %s: %s", user_id, session_id)
             return session_id
         else:
-            logger.error(f"Failed to create session for user {user_id}")
+            logger.error("Failed to create session for user %s", user_id)
             return None
     
     def get_session(self, user_id: int) -> Optional[UserSession]:
         """Get active session for user."""
-        return self.active_sessions.get(user_id)
+        session = self.active_sessions.get(user_id)
+        if session is None and self.store is not None and user_id not in self._scope_refs:
+            # Вне update_scope сессия читается из хранилища; изменения такой копии не сохраняются
+            session = self.store.load(user_id)
+        return session
     
     def get_or_create_session(self, user_id: int) -> UserSession:
         """Get existing session or create new one."""
@@ -79,7 +145,7 @@ class SessionManager:
         if not session:
             session_id = self.create_session(user_id)
             if session_id:
-                session = self.active_sessions[user_id]
+                session = self.get_session(user_id)
         return session
     
     def update_session_state(self, user_id: int, state: str, temp_data: Dict = None):
@@ -91,7 +157,7 @@ class SessionManager:
             # This allows to resume the correct test flow
             if temp_data:
                 session.temp_data.update(temp_data)
-            logger.debug(f"Session state updated for user {user_id}: {state}, current test: {session.current_test_type}")
+            logger.debug("Session state updated for user %s: %s, current test: %s", user_id, state, session.current_test_type)
     
     def save_response(self, user_id: int, test_type: str, question_num: int, response: Any) -> bool:
         """Save user response to question for a specific test."""
@@ -103,9 +169,9 @@ class SessionManager:
             # Database update might need to be more generic or handled at test completion
             # For now, let's assume progress is mainly in-memory until test completion
             # self.db.update_session_progress(session.session_id, session.current_question, test_type) # Example
-            logger.info(f"Response saved for user {user_id}, test {test_type}, Q{question_num}: {response}")
+            response_logger.info("Response saved for user %s, test %s, Q%s: %s", user_id, test_type, question_num, response)
             return True
-        logger.warning(f"Failed to save response for user {user_id}, test {test_type}, Q{question_num}")
+        logger.warning("Failed to save response for user %s, test %s, Q%s", user_id, test_type, question_num)
         return False
     
     def complete_test_part(self, user_id: int, test_type: str):
@@ -114,11 +180,11 @@ class SessionManager:
         if session and test_type in session.test_completed:
             session.test_completed[test_type] = True
             session.current_question = 1 # Reset for the next test or if needed
-            logger.info(f"Test part {test_type} completed for user {user_id}.")
+            logger.info("Test part %s completed for user %s.", test_type, user_id)
             # Potentially update a general session status in DB if needed
             # self.db.update_session_status(session.session_id, f"{test_type}_completed")
         else:
-            logger.warning(f"Could not mark test {test_type} as completed for user {user_id}.")
+            logger.warning("Could not mark test %s as completed for user %s.", test_type, user_id)
 
     def get_next_test(self, user_id: int) -> Optional[str]:
         """Determines the next test for the user."""
@@ -145,8 +211,8 @@ class SessionManager:
             success = self.db.complete_session(session.session_id)
             if success:
                 # Remove from active sessions
-                del self.active_sessions[user_id]
-                logger.info(f"Session completed for user {user_id}")
+                self._forget_session(user_id)
+                logger.info("Session completed for user %s", user_id)
             return success
         return False
     
@@ -158,11 +224,38 @@ class SessionManager:
             
             # Update database (you might want to add this method to DatabaseManager)
             # For now, just remove from active sessions
-            del self.active_sessions[user_id]
-            logger.info(f"Session abandoned for user {user_id}")
+            self._forget_session(user_id)
+            logger.info("Session abandoned for user %s", user_id)
             return True
         return False
     
+    def evict(self, user_id: int) -> bool:
+        """
+        Drops the user's session from memory and from the shared store without touching test_sessions -
+        used when an administrator deleted the user's data (see src/data/purge.py).
+        """
+        had_session = user_id in self.active_sessions
+        self._forget_session(user_id)
+        if had_session:
+            logger.info("Session of user %s evicted", user_id)
+        return had_session
+
+    def evict_session(self, user_id: int, session_id: str) -> bool:
+        """Drops the user's session only if it is still `session_id` (its test_sessions row was expired)."""
+        session = self.active_sessions.get(user_id)
+        if session is None and self.store is not None:
+            session = self.store.load(user_id)
+        if session is None or session.session_id != session_id:
+            return False
+        self._forget_session(user_id)
+        logger.info("Expired session %s of user %s evicted", session_id, user_id)
+        return True
+
+    def _forget_session(self, user_id: int):
+        self.active_sessions.pop(user_id, None)
+        if self.store is not None:
+            self.store.delete(user_id)
+
     def get_session_progress(self, user_id: int) -> Dict[str, Any]:
         """Get session progress information."""
         session = self.get_session(user_id)
@@ -195,8 +288,66 @@ class SessionManager:
         
         for user_id in expired_users:
             self.abandon_session(user_id)
-            logger.info(f"Cleaned up expired session for user {user_id}")
+            logger.info("Cleaned up expired session for user %s", user_id)
     
+    def flush(self, store=None) -> int:
+        """
+        Writes the sessions held in memory to `store` (default: the shared store) - on shutdown, so
+        that answers given so far survive a restart. Returns the number of sessions written.
+        """
+        store = store or self.store
+        if store is None:
+            return 0
+        with self._scope_lock:
+            sessions = list(self.active_sessions.values())
+        saved = 0
+        for session in sessions:
+            try:
+                store.save(session)
+                saved += 1
+            except Exception as e:
+                logger.error("Failed to flush session of user %s: %s", session.user_id, e)
+        logger.info("Flushed %s session(s) to %s", saved, type(store).__name__)
+        return saved
+
+    def restore(self, store) -> int:
+        """Takes the sessions written by flush() back into memory and removes them from `store`."""
+        restored = 0
+        for session in store.load_all():
+            self.active_sessions[session.user_id] = session
+            store.delete(session.user_id)
+            restored += 1
+        if restored:
+            logger.info("Restored %s session(s) saved at the previous shutdown", restored)
+        return restored
+
     def get_active_sessions_count(self) -> int:
         """Get count of active sessions."""
-        return len(self.active_sessions) 
\ No newline at end of file
+        if self.store is not None:
+            return self.store.count()
+        return len(self.active_sessions)
+
+
+def _update_user_id(update) -> Optional[int]:
+    from_user = getattr(update, 'from_user', None)
+    return from_user.id if from_user is not None else None
+
+
+def instrument_bot(bot, session_manager: SessionManager) -> None:
+    """
+    Runs every registered message/callback handler inside session_manager.update_scope() of the
+    sender. Needed only with a shared store; must be called after all handlers are registered.
+    """
+    if session_manager.store is None:
+        return
+    def scoped(original):
+        @functools.wraps(original)
+        def wrapper(update, *args, **kwargs):
+            user_id = _update_user_id(update)
+            if user_id is None:
+                return original(update, *args, **kwargs)
+            with session_manager.update_scope(user_id):
+                return original(update, *args, **kwargs)
+        return wrapper
+
+    wrap_handlers(bot, scoped, '_session_scope_wrapped')
@@ -0,0 +1,170 @@
+"""
+Shared storage for user sessions, so several bot processes can serve the same users.
+
+SessionManager keeps working with in-memory UserSession objects; with a store configured it loads a
+session when an update for the user starts and writes it back when the update is handled (see
+SessionManager.update_scope). SessionStore is the interface, SQLiteSessionStore the local
+implementation: one row per user in a separate SQLite file in WAL mode, so readers in other
+processes never wait for a writer.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_FORMAT_VERSION = 1
+
+
+def session_to_dict(session) -> Dict[str, Any]:
+    return {
+        'v': SESSION_FORMAT_VERSION,
+        'session_id': session.session_id,
+        'user_id': session.user_id,
+        'status': session.status,
+        'current_test_type': session.current_test_type,
+        'current_question': session.current_question,
+        # JSON-ключи всегда строки: номера вопросов восстанавливаются в session_from_dict
+        'responses': {test_type: {str(q): a for q, a in answers.items()} for test_type, answers in session.responses.items()},
+        'test_completed': session.test_completed,
+        'started_at': session.started_at.isoformat(),
+        'state': session.state,
+        'temp_data': session.temp_data,
+    }
+
+
+def session_from_dict(data: Dict[str, Any]):
+    from hexaco_bot.src.session.session_manager import UserSession
+
+    session = UserSession(data['session_id'], data['user_id'], data.get('status', 'active'))
+    session.current_test_type = data['current_test_type']
+    session.current_question = data['current_question']
+    session.responses = {test_type: {int(q): a for q, a in answers.items()}
+                         for test_type, answers in data['responses'].items()}
+    session.test_completed.update(data['test_completed'])
+    session.started_at = datetime.fromisoformat(data['started_at'])
+    session.state = data['state']
+    session.temp_data = data.get('temp_data') or {}
+    return session
+
+
+class SessionStore:
+    """Interface of a shared session store; implementations must be safe to use from many threads."""
+
+    def load(self, user_id: int):
+        """Returns the stored UserSession of the user or None."""
+        raise NotImplementedError
+
+    def save(self, session):
+        raise NotImplementedError
+
+    def delete(self, user_id: int):
+        raise NotImplementedError
+
+    def load_all(self) -> List:
+        """All stored sessions (used to bring in-memory sessions back after a restart)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def delete_older_than(self, seconds: float) -> int:
+        """Drops sessions not saved for `seconds`; returns how many were removed."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions as JSON rows in a local SQLite file shared by all processes on the machine."""
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        # Одно соединение на поток: открывать файл на каждый апдейт дороже самого запроса
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def load(self, user_id: int):
+        row = self._connection().execute('SELECT data FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return session_from_dict(json.loads(row[0]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Stored session of user {user_id} is unreadable, ignoring it: {e}")
+            return None
+
+    def save(self, session):
+        data = json.dumps(session_to_dict(session), ensure_ascii=False)
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            ''', (session.user_id, data, time.time()))
+
+    def delete(self, user_id: int):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+
+    def load_all(self) -> List:
+        sessions = []
+        for user_id, data in self._connection().execute('SELECT user_id, data FROM sessions').fetchall():
+            try:
+                sessions.append(session_from_dict(json.loads(data)))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Stored session of user {user_id} is unreadable, ignoring it: {e}")
+        return sessions
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def delete_older_than(self, seconds: float) -> int:
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM sessions WHERE updated_at < ?', (time.time() - seconds,)).rowcount
+
+    def close(self):
+        """Closes the connections of all threads; a later call from any thread opens a new one."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+def create_session_store(kind: str, path: str) -> Optional[SessionStore]:
+    """'memory' (sessions live only in this process) -> None, 'sqlite' -> SQLiteSessionStore."""
+    if kind == 'memory':
+        return None
+    if kind == 'sqlite':
+        return SQLiteSessionStore(path)
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
@@ -0,0 +1,114 @@
+"""
+Small thread-safe LRU cache with a TTL, used in front of hot DatabaseManager reads.
+
+Lookups and stores cost one lock acquisition and an OrderedDict operation. Invalidation stamps the
+key with the next value of a global counter: a value read from the database before an invalidation of
+the same key is not stored afterwards, so a slow reader cannot put a stale row back into the cache.
+Stamps are kept for at most `maxsize` keys and dropped with their entry; a key without a stamp counts
+as stamped at the "floor" (the newest dropped stamp), so dropping one can only make a reader in flight
+skip its store, never let a stale value in.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """At most `maxsize` entries, each valid for `ttl` seconds (maxsize <= 0 or ttl <= 0 disables caching)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = maxsize > 0 and ttl > 0
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._generations: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self._tick = 0  # последняя выданная отметка инвалидации
+        self._floor = 0  # отметка ключей без своей отметки (наибольшая из выброшенных)
+        self._epoch = 0  # растет при clear(): отменяет все взятые до этого токены
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self._forget_generation(key)
+            self.misses += 1
+            return default
+
+    def generation(self, key: Hashable) -> Tuple[int, int]:
+        """Token to pass to set(): taken before reading the value from the source."""
+        with self._lock:
+            return self._epoch, self._generations.get(key, self._floor)
+
+    def set(self, key: Hashable, value: Any, generation: Optional[Tuple[int, int]] = None):
+        """Stores a value unless `key` was invalidated after `generation` was taken."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, self._floor)):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._forget_generation(evicted)
+                self.evictions += 1
+
+    def _stamp(self, key: Hashable):
+        self._tick += 1
+        self._generations[key] = self._tick
+        self._generations.move_to_end(key)
+        while len(self._generations) > max(self.maxsize, 1):
+            _, stamp = self._generations.popitem(last=False)
+            self._floor = max(self._floor, stamp)
+
+    def _forget_generation(self, key: Hashable):
+        stamp = self._generations.pop(key, None)
+        if stamp is not None:
+            self._floor = max(self._floor, stamp)
+
+    def update(self, key: Hashable, function: Callable[[Any], Any]):
+        """
+        Replaces a cached value with function(value) after the source was changed the same way;
+        does nothing if the key is not cached. Counts as an invalidation for readers in flight.
+        """
+        with self._lock:
+            self._stamp(key)
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                self._data[key] = (expires_at, function(value))
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+            self._stamp(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,21 @@
+"""
+Wrapping of registered TeleBot handlers, shared by the instrumentation layers (metrics, tracing,
+profiler, session scope, in-flight tracking).
+
+Each layer passes a decorator and its own marker attribute: a handler that already carries the marker
+is left alone, so calling a layer's instrument_bot twice does not wrap the handlers twice.
+"""
+
+from typing import Callable
+
+
+def wrap_handlers(bot, decorator: Callable[[Callable], Callable], marker: str) -> None:
+    """Replaces every registered message/callback handler with decorator(handler) and marks it with `marker`."""
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            function = handler['function']
+            if getattr(function, marker, False):
+                continue
+            wrapped = decorator(function)
+            setattr(wrapped, marker, True)
+            handler['function'] = wrapped
@@ -0,0 +1,147 @@
+"""
+Graceful shutdown of the bot process.
+
+Lifecycle collects shutdown steps (stop intake, drain handlers, flush sessions, stop background jobs,
+close exporters...) and runs them once, in registration order, when SIGTERM/SIGINT arrives or
+shutdown() is called. Every step gets what is left of one overall deadline, so a stuck step cannot
+keep the process alive forever: after the deadline the remaining steps still run with timeout 0 (they
+must not wait then, only flush what they hold). A second signal exits immediately.
+
+InFlightTracker counts handler calls in progress (instrument_bot wraps every registered handler),
+which lets the drain step wait until the updates already taken from Telegram are fully handled.
+"""
+
+import os
+import time
+import signal
+import logging
+import functools
+import threading
+from typing import Callable, List, Tuple
+
+from hexaco_bot.src.utils.handlers import wrap_handlers
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightTracker:
+    """Number of handler calls currently running in this process."""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def enter(self):
+        with self._lock:
+            self._count += 1
+
+    def exit(self):
+        with self._lock:
+            self._count -= 1
+
+    def wait_idle(self, timeout: float, queued: Callable[[], int] = lambda: 0, poll: float = 0.05) -> bool:
+        """
+        Waits until no handler runs and queued() (updates waiting for a worker thread) is 0.
+        The condition must hold on two checks in a row: a task taken from the queue is not yet
+        counted while telebot evaluates the handler filters. Returns False on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        idle_checks = 0
+        while time.monotonic() < deadline:
+            if self._count == 0 and queued() == 0:
+                idle_checks += 1
+                if idle_checks >= 2:
+                    return True
+            else:
+                idle_checks = 0
+            time.sleep(poll)
+        return False
+
+
+def instrument_bot(bot, tracker: InFlightTracker) -> None:
+    """Counts every registered message/callback handler call in `tracker`."""
+    def tracked(original):
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            tracker.enter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                tracker.exit()
+        return wrapper
+
+    wrap_handlers(bot, tracked, '_lifecycle_wrapped')
+
+
+class Lifecycle:
+    """Ordered shutdown steps bounded by one deadline of `timeout` seconds."""
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._steps: List[Tuple[str, Callable[[float], None]]] = []
+        self._requested = threading.Event()
+        self._done = False
+        self._lock = threading.Lock()
+
+    @property
+    def stopping(self) -> bool:
+        return self._requested.is_set()
+
+    def add_step(self, name: str, function: Callable[[float], None]):
+        """function(timeout) is called with the seconds left until the deadline."""
+        self._steps.append((name, function))
+
+    def request_shutdown(self, reason: str = ''):
+        if not self._requested.is_set():
+            logger.info(f"Shutdown requested{': ' + reason if reason else ''}")
+        self._requested.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until shutdown is requested; returns whether it was."""
+        return self._requested.wait(timeout)
+
+    def install_signal_handlers(self) -> bool:
+        """SIGTERM and SIGINT request shutdown; a second one exits at once. Main thread only."""
+        if threading.current_thread() is not threading.main_thread():
+            return False
+
+        def _handler(signum, frame):
+            name = signal.Signals(signum).name
+            if self._requested.is_set():
+                logger.warning(f"{name} received again, exiting without finishing shutdown")
+                os._exit(1)
+            self.request_shutdown(name)
+
+        signal.signal(signal.SIGTERM, _handler)
+        signal.signal(signal.SIGINT, _handler)
+        return True
+
+    def shutdown(self) -> bool:
+        """Runs the steps once; returns False if any of them failed or the deadline passed."""
+        with self._lock:
+            if self._done:
+                return True
+            self._done = True
+        self._requested.set()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        ok = True
+        overdue = False
+        for name, function in self._steps:
+            remaining = max(0.0, deadline - time.monotonic())
+            if remaining == 0 and not overdue:
+                ok, overdue = False, True
+                logger.error(f"Shutdown deadline of {self.timeout:.0f}s passed before step '{name}'")
+            step_started = time.monotonic()
+            try:
+                function(remaining)
+            except Exception as e:
+                ok = False
+                logger.error(f"Shutdown step '{name}' failed: {e}")
+            logger.debug(f"Shutdown step '{name}' took {time.monotonic() - step_started:.2f}s")
+        logger.info(f"Shutdown finished in {time.monotonic() - started:.2f}s")
+        return ok
@@ -0,0 +1,167 @@
+"""
+Logging configuration for the bot process.
+
+In "queue" mode (default) application threads only put LogRecords on an in-memory queue;
+formatting, sampling of noisy loggers' DEBUG/INFO records and file/console I/O happen in a
+single QueueListener thread. In "sync" mode the handlers are attached to the root logger directly,
+as before. The log file rotates by size and by age, whichever comes first.
+"""
+
+import os
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from typing import Dict, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that also rolls over once the current file is older than `interval` seconds."""
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 0,
+                 interval: float = 0, encoding: Optional[str] = None):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=False)
+        self.interval = interval
+        self._rollover_at = self._compute_rollover_at()
+
+    def _compute_rollover_at(self) -> float:
+        return time.time() + self.interval if self.interval else float('inf')
+
+    def shouldRollover(self, record) -> bool:
+        if time.time() >= self._rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = self._compute_rollover_at()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of DEBUG/INFO records for selected loggers (1 of every N, deterministic).
+    WARNING and above always pass. Rates are matched by logger name prefix, longest prefix wins.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = {name: max(0.0, min(1.0, rate)) for name, rate in rates.items()}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def _rule_for(self, logger_name: str) -> Optional[str]:
+        rule = self._resolved.get(logger_name, '')
+        if rule != '':
+            return rule
+        matches = [name for name in self.rates if logger_name == name or logger_name.startswith(name + '.')]
+        rule = max(matches, key=len) if matches else None
+        self._resolved[logger_name] = rule
+        return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+        rate = self.rates[rule]
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        every = max(1, round(1 / rate))
+        with self._lock:
+            count = self._counters.get(rule, 0)
+            self._counters[rule] = count + 1
+        return count % every == 0
+
+
+class _DeferredFormattingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does not format in the caller thread.
+
+    The stock prepare() merges msg % args before enqueueing (needed for pickling across processes);
+    for an in-process queue the record can travel as is, so %-style formatting moves to the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parses 'logger.name=0.1,other.logger=0.5' into a dict; malformed entries are ignored."""
+    rates = {}
+    for item in (spec or '').split(','):
+        name, sep, value = item.strip().partition('=')
+        if not sep or not name:
+            continue
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_logging(level: str = 'INFO', log_file: Optional[str] = None, mode: str = 'queue',
+                      max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                      rotate_interval: float = 24 * 3600, sampling: Optional[Dict[str, float]] = None):
+    """
+    Configures the root logger. Safe to call more than once: the previous listener is stopped and
+    root handlers are replaced.
+    """
+    global _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        file_handler = SizeAndTimeRotatingFileHandler(
+            log_file, max_bytes=max_bytes, backup_count=backup_count, interval=rotate_interval, encoding='utf-8')
+        handlers.append(file_handler)
+    handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    sampling_filter = SamplingFilter(sampling or {})
+    if mode == 'queue':
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = _DeferredFormattingQueueHandler(log_queue)
+        # Фильтр стоит до очереди: отброшенные записи не стоят ни форматирования, ни места в очереди
+        queue_handler.addFilter(sampling_filter)
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(sampling_filter)
+            root.addHandler(handler)
+
+
+def stop_logging():
+    """Flushes and stops the queue listener (no-op in sync mode)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,423 @@
+"""
+Lightweight Prometheus-style metrics for the bot process.
+
+Counters, gauges and histograms live in an in-process registry and are rendered in the Prometheus
+text exposition format by a small HTTP server (GET /metrics) running in a daemon thread. Recording a
+sample costs one lock acquisition and a dict lookup, so instrumentation can stay on the hot path.
+
+Instrumentation entry points (called once from HEXACOBot):
+    instrument_bot(bot)                      - updates received, per-handler counts and latency
+    instrument_telegram_api()                - Telegram Bot API call latency and result codes
+    instrument_database(db)                  - latency per DatabaseManager method
+    register_session_gauge(session_manager)  - active in-memory sessions
+    register_user_cache(db.user_cache)       - user cache hits, misses and hit ratio
+    register_backup_gauge(scheduler)         - time of the last verified database snapshot
+"""
+
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from hexaco_bot.src.utils.handlers import wrap_handlers
+
+logger = logging.getLogger(__name__)
+
+# Границы бакетов в секундах: от 1 мс (хэндлеры, SQLite) до 30 с (long polling getUpdates)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Common part of all metric types: name, help text, label names and a lock."""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Sequence) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {labelvalues}")
+        return tuple(str(v) for v in labelvalues)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labelvalues) -> float:
+        with self._lock:
+            return self._values.get(self._key(labelvalues), 0.0)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        """Reads {labelvalues: value} on every scrape, for counts kept by the instrumented object itself."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                items = sorted(self._function().items())
+            except Exception as e:
+                logger.warning(f"Counter {self.name} callback failed: {e}")
+                return []
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time by a callback."""
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[self._key(labelvalues)] = float(value)
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Computes the (label-less) gauge value on every scrape."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets (seconds by convention)."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счетчики по бакетам (последний = +Inf), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues):
+        key = self._key(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        """Context manager observing the duration of the block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def count(self, *labelvalues) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labelvalues))
+            return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+UPDATES_RECEIVED = REGISTRY.register(Counter(
+    'hexaco_updates_received_total', 'Telegram updates received by the bot, by update type.', ['update_type']))
+UPDATES_HANDLED = REGISTRY.register(Counter(
+    'hexaco_updates_handled_total', 'Updates processed by a handler, by handler and outcome (ok/error).',
+    ['handler', 'outcome']))
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'hexaco_handler_duration_seconds', 'Time spent inside a message/callback handler.', ['handler']))
+TELEGRAM_API_LATENCY = REGISTRY.register(Histogram(
+    'hexaco_telegram_api_duration_seconds', 'Telegram Bot API request latency, by API method.', ['method']))
+TELEGRAM_API_CALLS = REGISTRY.register(Counter(
+    'hexaco_telegram_api_calls_total', 'Telegram Bot API calls by method and result code (200, 429, ..., exception).',
+    ['method', 'code']))
+DB_QUERY_LATENCY = REGISTRY.register(Histogram(
+    'hexaco_db_method_duration_seconds', 'Duration of DatabaseManager method calls.', ['method']))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge(
+    'hexaco_active_sessions', 'In-memory sessions held by SessionManager.'))
+TESTS_COMPLETED = REGISTRY.register(Counter(
+    'hexaco_tests_completed_total', 'Completed test instruments, by test type.', ['test_type']))
+REPORT_GENERATION_LATENCY = REGISTRY.register(Histogram(
+    'hexaco_report_generation_seconds', 'Time to build and write a user report file.'))
+USER_CACHE_REQUESTS = REGISTRY.register(Counter(
+    'hexaco_user_cache_requests_total', 'DatabaseManager.get_user lookups by user cache result (hit/miss).',
+    ['result']))
+USER_CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    'hexaco_user_cache_hit_ratio', 'Share of get_user lookups served from the user cache since start.'))
+BACKUP_LAST_SUCCESS = REGISTRY.register(Gauge(
+    'hexaco_backup_last_success_timestamp_seconds', 'Unix time of the last verified database snapshot (0 if none yet).'))
+
+
+def _timed_handler(function: Callable) -> Callable:
+    handler_name = getattr(function, '__name__', 'handler')
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, handler_name)
+            UPDATES_HANDLED.inc(handler_name, outcome)
+
+    return wrapper
+
+
+def instrument_bot(bot) -> None:
+    """
+    Wraps every registered message/callback handler of a TeleBot instance and its
+    process_new_updates. Must be called after all handlers are registered.
+    """
+    wrap_handlers(bot, _timed_handler, '_metrics_wrapped')
+
+    if getattr(bot.process_new_updates, '_metrics_wrapped', False):
+        return
+    original = bot.process_new_updates
+
+    @functools.wraps(original)
+    def process_new_updates(updates):
+        for update in updates:
+            if update.message is not None:
+                UPDATES_RECEIVED.inc('message')
+            elif update.callback_query is not None:
+                UPDATES_RECEIVED.inc('callback_query')
+            else:
+                UPDATES_RECEIVED.inc('other')
+        return original(updates)
+
+    process_new_updates._metrics_wrapped = True
+    bot.process_new_updates = process_new_updates
+
+
+def instrument_telegram_api() -> None:
+    """Wraps telebot's single request function so that every Bot API call is timed and counted."""
+    from telebot import apihelper
+
+    original = apihelper._make_request
+    if getattr(original, '_metrics_wrapped', False):
+        return
+
+    @functools.wraps(original)
+    def _make_request(token, method_name, method='get', params=None, files=None):
+        started = time.perf_counter()
+        code = '200'
+        try:
+            return original(token, method_name, method=method, params=params, files=files)
+        except apihelper.ApiTelegramException as e:
+            code = str(e.error_code)
+            raise
+        except apihelper.ApiHTTPException as e:
+            code = str(getattr(e.result, 'status_code', 'http_error'))
+            raise
+        except Exception:
+            code = 'exception'
+            raise
+        finally:
+            TELEGRAM_API_LATENCY.observe(time.perf_counter() - started, method_name)
+            TELEGRAM_API_CALLS.inc(method_name, code)
+
+    _make_request._metrics_wrapped = True
+    apihelper._make_request = _make_request
+
+
+def instrument_database(db) -> None:
+    """Wraps the public methods of a DatabaseManager instance with a latency histogram."""
+    for name in dir(db):
+        if name.startswith('_') or name == 'get_connection':
+            continue
+        method = getattr(db, name)
+        if not callable(method) or getattr(method, '_metrics_wrapped', False):
+            continue
+
+        def make_wrapper(method_name, original):
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    DB_QUERY_LATENCY.observe(time.perf_counter() - started, method_name)
+            wrapper._metrics_wrapped = True
+            return wrapper
+
+        setattr(db, name, make_wrapper(name, method))
+
+
+def register_session_gauge(session_manager) -> None:
+    """Reports SessionManager.get_active_sessions_count() on every scrape."""
+    ACTIVE_SESSIONS.set_function(session_manager.get_active_sessions_count)
+
+
+def register_user_cache(cache) -> None:
+    """Reports the DatabaseManager user cache hit/miss counts and hit ratio on every scrape."""
+    USER_CACHE_REQUESTS.set_function(lambda: {('hit',): cache.hits, ('miss',): cache.misses})
+    USER_CACHE_HIT_RATIO.set_function(cache.hit_ratio)
+
+
+def register_backup_gauge(scheduler) -> None:
+    """Reports when BackupScheduler last produced a verified snapshot."""
+    BACKUP_LAST_SUCCESS.set_function(lambda: scheduler.last_success_at or 0.0)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics scrape %s - %s", self.address_string(), format % args)
+
+
+class MetricsServer:
+    """Serves the registry on http://host:port/metrics from a daemon thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9108, registry: MetricsRegistry = REGISTRY):
+        handler_class = type('BoundMetricsRequestHandler', (_MetricsRequestHandler,), {'registry': registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def start_metrics_server(host: str, port: int) -> Optional[MetricsServer]:
+    """Starts the endpoint; returns None (and logs) if the port cannot be bound."""
+    try:
+        server = MetricsServer(host, port).start()
+    except OSError as e:
+        logger.error(f"Failed to start metrics endpoint on {host}:{port}: {e}")
+        return None
+    logger.info(f"Metrics endpoint listening on {server.url}")
+    return server
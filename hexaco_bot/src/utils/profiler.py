@@ -0,0 +1,296 @@
+"""
+Runtime profiler that can be switched on in a running bot (admin /profile command or SIGUSR1).
+
+Two modes:
+- "sample": a background thread takes stack samples of all threads (sys._current_frames) every
+  few milliseconds for the requested window and writes a flamegraph-compatible collapsed-stack
+  file (`flamegraph.pl profile.collapsed > profile.svg`, speedscope, etc.). The first frame of every
+  stack is the handler the sample belongs to: the deepest bot frame such as `_handle_answer_callback`,
+  `_complete_test_part` or `_show_question`, so time aggregates per handler.
+- "cprofile": every handler invocation during the window runs under cProfile; stats are merged per
+  registered handler and dumped as .pstats files.
+
+Both modes also write a short text summary.
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import logging
+import functools
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from hexaco_bot.src.utils.handlers import wrap_handlers
+
+if TYPE_CHECKING:
+    import pstats
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Функции бота, по которым агрегируются сэмплы (берется самая глубокая из найденных в стеке)
+HANDLER_NAME_RE = re.compile(
+    r'^(_?handle_\w+|_complete_test_part|_start_test_flow|_initiate_test_flow|_show_question'
+    r'|_offer_next_test|_generate_user_report|show_test_menu|show_overall_results_menu)$'
+)
+
+
+@dataclass
+class ProfileResult:
+    """What a finished profiling window produced."""
+    mode: str
+    started_at: datetime
+    duration: float
+    samples: int = 0
+    by_handler: Dict[str, float] = field(default_factory=dict)  # sample mode: samples, cprofile mode: seconds
+    files: List[str] = field(default_factory=list)
+    summary: str = ''
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _is_handler_frame(code) -> bool:
+    return code.co_filename.startswith(SRC_DIR) and HANDLER_NAME_RE.match(code.co_name) is not None
+
+
+class _CProfileCollector:
+    """Merges per-invocation cProfile data by handler name."""
+
+    def __init__(self):
+        self.stats: Dict[str, 'pstats.Stats'] = {}
+        self.calls: Counter = Counter()
+        self.elapsed: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def run(self, label: str, function: Callable, *args, **kwargs):
+        # cProfile/pstats нужны только в окне профилирования: не тратим на них время при старте
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Другой профилировщик уже активен в этом потоке/интерпретаторе - выполняем без профиля
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.calls[label] += 1
+                self.elapsed[label] += elapsed
+                if label in self.stats:
+                    self.stats[label].add(profile)
+                else:
+                    self.stats[label] = pstats.Stats(profile)
+
+
+class RuntimeProfiler:
+    """Single profiling window at a time; start() returns False if one is already running."""
+
+    def __init__(self, output_dir: str = './logs/profiles', interval: float = 0.005, max_duration: float = 300.0):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_duration = max_duration
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._collector: Optional[_CProfileCollector] = None
+        self.last_result: Optional[ProfileResult] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 30.0, mode: str = 'sample', all_threads: bool = False,
+              on_finish: Optional[Callable[[ProfileResult], None]] = None) -> bool:
+        """Starts a profiling window of `duration` seconds in the background."""
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        with self._lock:
+            if self.is_running:
+                return False
+            duration = max(0.1, min(float(duration), self.max_duration))
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(duration, mode, all_threads, on_finish),
+                name="runtime-profiler", daemon=True,
+            )
+            self._thread.start()
+        logger.info("Profiling started: mode=%s, duration=%.1fs, all_threads=%s", mode, duration, all_threads)
+        return True
+
+    def stop(self, timeout: float = 30.0) -> Optional[ProfileResult]:
+        """Ends the current window early; returns its result (None if nothing was running)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return None
+        self._stop_event.set()
+        thread.join(timeout=timeout)
+        return self.last_result
+
+    def toggle(self, duration: float = 30.0, **kwargs) -> bool:
+        """Starts a window or, if one is running, stops it. Returns True if profiling is now on."""
+        if self.is_running:
+            self.stop()
+            return False
+        return self.start(duration, **kwargs)
+
+    def _run(self, duration: float, mode: str, all_threads: bool, on_finish):
+        started_at = datetime.now()
+        started = time.perf_counter()
+        deadline = started + duration
+        result = None
+        try:
+            if mode == 'sample':
+                stacks = self._sample(deadline, all_threads)
+                result = self._write_sample_result(stacks, started_at, time.perf_counter() - started)
+            else:
+                self._collector = _CProfileCollector()
+                self._stop_event.wait(max(0.0, deadline - time.perf_counter()))
+                collector, self._collector = self._collector, None
+                result = self._write_cprofile_result(collector, started_at, time.perf_counter() - started)
+            self.last_result = result
+            logger.info("Profiling finished: %s", ', '.join(result.files))
+        except Exception as e:
+            self._collector = None
+            logger.error(f"Profiling failed: {e}", exc_info=True)
+            return
+        if on_finish:
+            try:
+                on_finish(result)
+            except Exception as e:
+                logger.error(f"Profiling on_finish callback failed: {e}")
+
+    def _sample(self, deadline: float, all_threads: bool) -> Counter:
+        stacks: Counter = Counter()
+        own_id = threading.get_ident()
+        while time.perf_counter() < deadline and not self._stop_event.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                label = None
+                try:
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(_frame_label(code))
+                        if label is None and _is_handler_frame(code):
+                            label = code.co_name
+                        frame = frame.f_back
+                except AttributeError:
+                    # Чужой поток успел изменить стек, пока мы по нему шли - пропускаем этот сэмпл
+                    continue
+                if label is None:
+                    if not all_threads:
+                        continue
+                    label = f"thread:{names.get(thread_id, thread_id)}"
+                stack.append(label)
+                stacks[';'.join(reversed(stack))] += 1
+            self._stop_event.wait(self.interval)
+        return stacks
+
+    def _output_path(self, started_at: datetime, suffix: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"profile_{started_at.strftime('%Y%m%d_%H%M%S')}{suffix}")
+
+    def _write_sample_result(self, stacks: Counter, started_at: datetime, duration: float) -> ProfileResult:
+        by_handler: Counter = Counter()
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            by_handler[frames[0]] += count
+            leaves[frames[-1]] += count
+        total = sum(stacks.values())
+
+        collapsed_path = self._output_path(started_at, '.collapsed')
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        lines = [f"Sampling profile {started_at:%Y-%m-%d %H:%M:%S}, {duration:.1f}s, "
+                 f"{total} samples (interval {self.interval * 1000:.0f} ms)", "", "By handler:"]
+        for label, count in by_handler.most_common():
+            lines.append(f"  {label:<40} {count:>7}  {count / total:6.1%}")
+        lines += ["", "Top frames (self):"]
+        for label, count in leaves.most_common(20):
+            lines.append(f"  {label:<60} {count:>7}  {count / total:6.1%}")
+        summary = '\n'.join(lines) if total else "No handler samples were captured in this window."
+        summary_path = self._output_path(started_at, '.txt')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary + '\n')
+
+        return ProfileResult('sample', started_at, duration, samples=total, by_handler=dict(by_handler),
+                             files=[collapsed_path, summary_path], summary=summary)
+
+    def _write_cprofile_result(self, collector: _CProfileCollector, started_at: datetime,
+                               duration: float) -> ProfileResult:
+        files = []
+        lines = [f"cProfile {started_at:%Y-%m-%d %H:%M:%S}, {duration:.1f}s"]
+        for label, _ in collector.elapsed.most_common():
+            stats = collector.stats[label]
+            pstats_path = self._output_path(started_at, f"_{label}.pstats")
+            stats.dump_stats(pstats_path)
+            files.append(pstats_path)
+            buffer = io.StringIO()
+            stats.stream = buffer
+            stats.sort_stats('cumulative').print_stats(15)
+            lines += ["", f"== {label}: {collector.calls[label]} calls, {collector.elapsed[label] * 1000:.1f} ms total",
+                      buffer.getvalue().strip()]
+        if not collector.calls:
+            lines.append("No handler calls were profiled in this window.")
+        summary = '\n'.join(lines)
+        summary_path = self._output_path(started_at, '.txt')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary + '\n')
+        files.append(summary_path)
+        return ProfileResult('cprofile', started_at, duration, samples=sum(collector.calls.values()),
+                             by_handler=dict(collector.elapsed), files=files, summary=summary)
+
+
+PROFILER = RuntimeProfiler()
+
+
+def instrument_bot(bot, profiler: RuntimeProfiler = PROFILER) -> None:
+    """Lets "cprofile" windows profile every registered handler; costs one attribute check otherwise."""
+    def profiled(original):
+        label = getattr(original, '__name__', 'handler')
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            collector = profiler._collector
+            if collector is None:
+                return original(*args, **kwargs)
+            return collector.run(label, original, *args, **kwargs)
+        return wrapper
+
+    wrap_handlers(bot, profiled, '_profiler_wrapped')
+
+
+def install_signal_toggle(profiler: RuntimeProfiler = PROFILER, duration: float = 30.0,
+                          on_finish: Optional[Callable[[ProfileResult], None]] = None) -> bool:
+    """SIGUSR1 starts a sampling window (or stops the running one). Not available on Windows."""
+    import signal
+    if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def _handler(signum, frame):
+        # Работа с потоками вне обработчика сигнала: он выполняется в главном потоке между байткодами
+        threading.Thread(target=profiler.toggle, args=(duration,), kwargs={'on_finish': on_finish},
+                         name="profiler-toggle", daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, _handler)
+    return True
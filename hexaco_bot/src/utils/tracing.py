@@ -0,0 +1,360 @@
+"""
+Lightweight per-update tracing.
+
+A trace is started for every Telegram update when a registered handler runs; spans for
+DatabaseManager / SessionManager methods, Telegram Bot API requests and explicit blocks
+(`with tracing.span("fs.listdir"):`) attach to it through a ContextVar, so nothing has to be passed
+around. Outside of a trace span() is a no-op.
+
+Finished traces are exported when they are slower than the configured threshold or picked by
+random sampling. Export happens in a background thread, to a JSONL file or to an OTLP/HTTP (JSON)
+collector such as loadtest/otlp_collector_stub.py.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import logging
+import functools
+import threading
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from hexaco_bot.src.utils.handlers import wrap_handlers
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'hexaco_bot'
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('hexaco_current_span', default=None)
+
+
+class Span:
+    """One timed operation inside a trace."""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class Trace:
+    """All spans recorded while handling one update."""
+
+    __slots__ = ('trace_id', 'spans', 'lock')
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'start_ns': root.start_ns,
+            'duration_ms': round(root.duration_ms, 3),
+            'attributes': root.attributes,
+            'spans': [span.to_dict() for span in self.spans],
+        }
+
+
+class _BackgroundExporter:
+    """Base exporter: traces are queued by the handler thread and written by a daemon thread."""
+
+    def __init__(self, max_queue: int = 1000):
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            # Экспорт не должен тормозить обработку апдейтов: при переполнении просто теряем трейс
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            try:
+                self.export(trace)
+            except Exception as e:
+                logger.warning(f"Trace export failed in {type(self).__name__}: {e}")
+
+    def export(self, trace: Trace):
+        raise NotImplementedError
+
+    def shutdown(self, timeout: float = 5.0):
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout=timeout)
+
+
+class JsonlTraceExporter(_BackgroundExporter):
+    """Appends one JSON object per trace to a file."""
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(max_queue)
+
+    def export(self, trace: Trace):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def trace_to_otlp(trace: Trace) -> Dict[str, Any]:
+    """Converts a trace into an OTLP/JSON ExportTraceServiceRequest body."""
+    spans = []
+    for span in trace.spans:
+        otlp_span = {
+            'traceId': trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns or span.start_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }]
+    }
+
+
+class OtlpHttpTraceExporter(_BackgroundExporter):
+    """Posts traces as OTLP/JSON to a collector endpoint (e.g. http://127.0.0.1:4318/v1/traces)."""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0, max_queue: int = 1000):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        super().__init__(max_queue)
+
+    def export(self, trace: Trace):
+        body = json.dumps(trace_to_otlp(trace), default=str).encode('utf-8')
+        request = urllib.request.Request(self.endpoint, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Creates traces/spans and decides which finished traces to export."""
+
+    def __init__(self, exporter: Optional[_BackgroundExporter] = None, sample_rate: float = 0.0,
+                 slow_threshold_ms: float = 1000.0, enabled: bool = True):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.enabled = enabled
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Starts a new trace (or a child span if a trace is already active in this context)."""
+        if not self.enabled or _current_span.get() is not None:
+            with self.span(name, **attributes) as span:
+                yield span
+            return
+        trace = Trace()
+        root = Span(trace, name, None, attributes)
+        trace.spans.append(root)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child span of the active one; does nothing (yields None) outside of a trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        with parent.trace.lock:
+            parent.trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def _finish(self, trace: Trace):
+        if self.exporter is None:
+            return
+        if trace.root.duration_ms >= self.slow_threshold_ms or (self.sample_rate and random.random() < self.sample_rate):
+            self.exporter.submit(trace)
+
+
+TRACER = Tracer(enabled=False)
+
+
+def configure_tracing(export: str = 'jsonl', jsonl_path: str = './logs/traces.jsonl',
+                      otlp_endpoint: str = 'http://127.0.0.1:4318/v1/traces',
+                      sample_rate: float = 0.0, slow_threshold_ms: float = 1000.0) -> Tracer:
+    """Configures the module tracer. export: 'jsonl', 'otlp' or 'none' (tracing disabled)."""
+    if TRACER.exporter is not None:
+        TRACER.exporter.shutdown()
+    if export == 'jsonl':
+        TRACER.exporter = JsonlTraceExporter(jsonl_path)
+    elif export == 'otlp':
+        TRACER.exporter = OtlpHttpTraceExporter(otlp_endpoint)
+    else:
+        TRACER.exporter = None
+    TRACER.enabled = TRACER.exporter is not None
+    TRACER.sample_rate = sample_rate
+    TRACER.slow_threshold_ms = slow_threshold_ms
+    return TRACER
+
+
+def span(name: str, **attributes):
+    """Shortcut for TRACER.span(); use as `with tracing.span("fs.listdir"):`."""
+    return TRACER.span(name, **attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace.trace_id if current else None
+
+
+def _update_attributes(update: Any) -> Dict[str, Any]:
+    attributes = {}
+    from_user = getattr(update, 'from_user', None)
+    if from_user is not None:
+        attributes['user_id'] = from_user.id
+    data = getattr(update, 'data', None)
+    if data is not None:
+        attributes['update_type'] = 'callback_query'
+        attributes['callback_data'] = data
+    else:
+        attributes['update_type'] = 'message'
+        text = getattr(update, 'text', None)
+        if text and text.startswith('/'):
+            attributes['command'] = text.split()[0]
+    return attributes
+
+
+def instrument_bot(bot) -> None:
+    """Starts a trace around every registered message/callback handler of a TeleBot instance."""
+    def traced(original):
+        name = f"handler.{getattr(original, '__name__', 'handler')}"
+
+        @functools.wraps(original)
+        def wrapper(update, *args, **kwargs):
+            if not TRACER.enabled:
+                return original(update, *args, **kwargs)
+            with TRACER.trace(name, **_update_attributes(update)):
+                return original(update, *args, **kwargs)
+        return wrapper
+
+    wrap_handlers(bot, traced, '_tracing_wrapped')
+
+
+def instrument_methods(obj, prefix: str, skip: tuple = ()) -> None:
+    """Wraps the public methods of an instance (DatabaseManager, SessionManager) with spans."""
+    for name in dir(obj):
+        if name.startswith('_') or name in skip:
+            continue
+        method = getattr(obj, name)
+        if not callable(method) or getattr(method, '_tracing_wrapped', False):
+            continue
+
+        def make_wrapper(span_name, original):
+            @functools.wraps(original)
+            def wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return original(*args, **kwargs)
+                with TRACER.span(span_name):
+                    return original(*args, **kwargs)
+            wrapper._tracing_wrapped = True
+            return wrapper
+
+        setattr(obj, name, make_wrapper(f"{prefix}.{name}", method))
+
+
+def instrument_telegram_api() -> None:
+    """Adds a span for every Bot API request made inside a trace."""
+    from telebot import apihelper
+
+    original = apihelper._make_request
+    if getattr(original, '_tracing_wrapped', False):
+        return
+
+    @functools.wraps(original)
+    def _make_request(token, method_name, method='get', params=None, files=None):
+        if _current_span.get() is None:
+            return original(token, method_name, method=method, params=params, files=files)
+        with TRACER.span(f"telegram.{method_name}"):
+            return original(token, method_name, method=method, params=params, files=files)
+
+    _make_request._tracing_wrapped = True
+    apihelper._make_request = _make_request
@@ -0,0 +1,53 @@
+"""
+Shared fixtures. Settings are pointed at a throwaway directory before any bot module is imported,
+the same way benchmarks/run.py does it.
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+
+import pytest
+
+project_grandparent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_grandparent_dir not in sys.path:
+    sys.path.insert(0, project_grandparent_dir)
+
+_workdir = tempfile.mkdtemp(prefix="hexaco_tests_")
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ["DATABASE_PATH"] = os.path.join(_workdir, "default.db")
+os.environ["USER_REPORTS_DIR"] = os.path.join(_workdir, "user_reports")
+os.environ["USER_PROFILES_DIR"] = os.path.join(_workdir, "user_profile")
+
+from hexaco_bot.src.data.database import DatabaseManager  # noqa: E402
+
+# test_type -> ответы, которые сохраняются в results (содержимое для этих тестов не важно)
+RESPONSES = {
+    'hexaco': {str(i): 3 for i in range(1, 101)},
+    'sds': {str(i): 2 for i in range(1, 11)},
+    'svs': {str(i): 4 for i in range(1, 58)},
+    'urica': {str(i): 5 for i in range(1, 33)},
+    'dweck': {str(i): 1 for i in range(1, 9)},
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    """DatabaseManager over a fresh file database with all migrations applied."""
+    manager = DatabaseManager(str(tmp_path / "bot.db"))
+    assert manager.initialize_database()
+    return manager
+
+
+def add_user(db: DatabaseManager, user_id: int, results=(), username: str = None, session_id: str = None) -> str:
+    """Creates a user with one session and saves a result for every test type in `results`."""
+    db.create_user(user_id, username, "Test", "User", "male")
+    session_id = session_id or f"session-{user_id}"
+    db.create_test_session(session_id, user_id)
+    rng = random.Random(user_id)
+    for test_type in results:
+        scores = {'score': rng.random()} if test_type != 'hexaco' else {'H': rng.random(), 'E': rng.random()}
+        assert db.save_test_result(session_id, user_id, test_type, scores, json.dumps(RESPONSES[test_type]))
+    return session_id
@@ -0,0 +1,57 @@
+import random
+
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.data.archetypes import ArchetypeAssigner, ArchetypeModel, save_model
+
+from hexaco_bot.tests.conftest import add_user
+
+FEATURES = (('hexaco', 'honesty_humility'), ('hexaco', 'emotionality'), ('sds', 'score'), ('svs', 'score'))
+
+
+def _install_model(db, k=3):
+    rng = random.Random(0)
+    model = ArchetypeModel(FEATURES, [0.5] * len(FEATURES), [0.3] * len(FEATURES),
+                           [[rng.uniform(-2, 2) for _ in FEATURES] for _ in range(k)], ['a', 'b', 'c'][:k])
+    with db.get_connection() as conn:
+        save_model(conn, model, [])
+    db.archetypes = ArchetypeAssigner(check_interval=0)
+    return model
+
+
+def _assignment(db, user_id):
+    with db.get_connection() as conn:
+        return tuple(conn.execute('SELECT model_id, cluster, distance FROM archetype_assignments WHERE user_id = ?',
+                                  (user_id,)).fetchone())
+
+
+def test_incremental_assignment_matches_full_recompute(db):
+    _install_model(db)
+    for user_id in range(1, 21):
+        # Повторный hexaco: сохраненные шкалы перезаписываются более поздним результатом
+        add_user(db, user_id, ['hexaco', 'sds', 'hexaco', 'svs'])
+    for user_id in range(1, 21):
+        incremental = _assignment(db, user_id)
+        with db.get_connection() as conn:
+            expected = ArchetypeAssigner(check_interval=0).assign(conn, user_id)
+        assert incremental[1:] == expected
+
+
+def test_assignment_after_refit_reads_all_results(db):
+    add_user(db, 1, ['hexaco', 'sds'])
+    model = _install_model(db)
+    with db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM archetype_assignments').fetchone()[0] == 0
+    db.save_test_result('session-1', 1, 'svs', {'score': 0.1}, '{}')
+    with db.get_connection() as conn:
+        expected = ArchetypeAssigner(check_interval=0).assign(conn, 1)
+    assert _assignment(db, 1) == (model.model_id, *expected)
+
+
+def test_completion_counters_stay_consistent(db):
+    for user_id in range(1, 11):
+        add_user(db, user_id, ['hexaco', 'sds', 'sds'][:1 + user_id % 3])
+    with db.get_connection() as conn:
+        assert aggregates.reconcile(conn) == 0
+        users, completions = conn.execute(
+            "SELECT users, completions FROM test_completion_counts WHERE test_type = 'sds'").fetchone()
+    assert (users, completions) == (7, 10)
@@ -0,0 +1,35 @@
+from hexaco_bot.src.utils.cache import LRUCache
+
+
+def test_generations_stay_bounded():
+    cache = LRUCache(maxsize=10, ttl=60)
+    for key in range(1000):
+        cache.set(key, key)
+        cache.invalidate(key)
+        cache.update(key + 5000, lambda value: value)
+    assert len(cache) <= 10
+    assert len(cache._generations) <= 10
+
+
+def test_stale_reader_rejected_after_its_stamp_was_dropped():
+    cache = LRUCache(maxsize=2, ttl=60)
+    token = cache.generation('user')  # чтение из базы началось
+    cache.invalidate('user')  # строку изменили
+    for key in range(10):  # отметка 'user' вытеснена другими ключами
+        cache.invalidate(key)
+    assert 'user' not in cache._generations
+    cache.set('user', 'stale row', token)
+    assert cache.get('user') is None
+
+    cache.set('user', 'fresh row', cache.generation('user'))
+    assert cache.get('user') == 'fresh row'
+
+
+def test_evicted_entry_drops_its_stamp():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.update('a', lambda value: value + 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    assert cache.get('a') is None
+    assert 'a' not in cache._generations
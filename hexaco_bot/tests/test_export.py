@@ -0,0 +1,58 @@
+import os
+import csv
+import json
+
+from hexaco_bot.src.data.database import COMPLETED_TEST_BITS
+from hexaco_bot.src.data.export import ColumnarExporter, question_counts
+
+from hexaco_bot.tests.conftest import add_user
+
+
+def _header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f))
+
+
+def _parts(output_dir, test_type):
+    test_dir = os.path.join(output_dir, test_type)
+    return [os.path.join(test_dir, name) for name in sorted(os.listdir(test_dir))]
+
+
+def test_question_counts_cover_every_test_type():
+    counts = question_counts()
+    assert set(counts) == set(COMPLETED_TEST_BITS)
+    assert counts['hexaco'] == 100
+
+
+def test_tests_without_question_bank_get_columns_from_responses(db, tmp_path):
+    add_user(db, 1, ['urica', 'dweck'])
+    output_dir = str(tmp_path / 'exports')
+    ColumnarExporter(db.db_path, output_dir, 'csv').export()
+
+    header = _header(_parts(output_dir, 'urica')[0])
+    assert header[-1] == 'q32' and 'q1' in header
+    assert _header(_parts(output_dir, 'dweck')[0])[-1] == 'q8'
+
+
+def test_later_parts_keep_the_columns_of_the_first(db, tmp_path):
+    add_user(db, 1, ['sds'])
+    output_dir = str(tmp_path / 'exports')
+    exporter = ColumnarExporter(db.db_path, output_dir, 'csv')
+    exporter.export()
+
+    # Новая шкала после первой выгрузки не меняет колонки следующих частей
+    db.create_user(2, None, "Test", "User", "male")
+    db.create_test_session('session-2', 2)
+    assert db.save_test_result('session-2', 2, 'sds', {'score': 1.0, 'extra': 2.0},
+                               json.dumps({str(i): 2 for i in range(1, 11)}))
+    result = exporter.export()
+    assert result.results == {'sds': 1}
+
+    first, second = _parts(output_dir, 'sds')
+    assert _header(first) == _header(second)
+    assert 'extra' not in _header(second)
+    with open(exporter.watermark_path, encoding='utf-8') as f:
+        assert json.load(f)['columns']['sds'] == {'scales': ['score'], 'items': question_counts()['sds']}
+
+    exporter.export(full=True)
+    assert 'extra' in _header(_parts(output_dir, 'sds')[0])
@@ -0,0 +1,108 @@
+import sqlite3
+import dataclasses
+
+from hexaco_bot.src.data import migrations
+from hexaco_bot.src.data.migrations import MIGRATIONS, MigrationRunner
+
+from hexaco_bot.tests.conftest import add_user
+
+
+def _rerun_v5(db, batch=None):
+    """Marks v5 as never applied and returns a runner for it alone (optionally with a wrapped batch step)."""
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM schema_version WHERE version = 5')
+    v5 = next(m for m in MIGRATIONS if m.version == 5)
+    if batch is not None:
+        v5 = dataclasses.replace(v5, batch=batch)
+    return MigrationRunner(db, [v5], batch_size=10, batch_pause=0, backup_dir=db.db_path + '.backups')
+
+
+def _results(db):
+    with db.get_connection() as conn:
+        return conn.execute('SELECT result_id, user_id, test_type, responses FROM results ORDER BY result_id').fetchall()
+
+
+def _schema_row(db, version):
+    with db.get_connection() as conn:
+        return conn.execute('SELECT status, progress FROM schema_version WHERE version = ?', (version,)).fetchone()
+
+
+def test_interrupted_batched_migration_resumes_from_progress(db):
+    for user_id in range(1, 31):
+        add_user(db, user_id, ['hexaco', 'sds'])
+    before = [tuple(row) for row in _results(db)]
+
+    calls = []
+
+    def stopping_batch(conn, last_rowid, upper_rowid, batch_size):
+        calls.append(last_rowid)
+        if len(calls) == 3:
+            runner.stop(timeout=0)
+        return migrations._v5_copy_results_batch(conn, last_rowid, upper_rowid, batch_size)
+
+    runner = _rerun_v5(db, stopping_batch)
+    assert runner.run() is False
+    status, progress = _schema_row(db, 5)
+    assert status == 'running' and progress > 0
+    with db.get_connection() as conn:
+        copied = conn.execute('SELECT COUNT(*) FROM results_new').fetchone()[0]
+    assert copied == 30
+
+    resumed_from = []
+
+    def recording_batch(conn, last_rowid, upper_rowid, batch_size):
+        resumed_from.append(last_rowid)
+        return migrations._v5_copy_results_batch(conn, last_rowid, upper_rowid, batch_size)
+
+    v5 = dataclasses.replace(next(m for m in MIGRATIONS if m.version == 5), batch=recording_batch)
+    resumed = MigrationRunner(db, [v5], batch_size=10, batch_pause=0, backup_dir=runner.backup_dir)
+    assert resumed.run() is True
+    # apply (DROP/CREATE results_new) не повторялся, копирование продолжилось с сохраненного rowid
+    assert resumed_from[0] == progress
+    assert _schema_row(db, 5)[0] == 'applied'
+    assert [tuple(row) for row in _results(db)] == before
+
+
+def test_v5_swap_keeps_rows_written_during_the_copy(db):
+    for user_id in range(1, 21):
+        add_user(db, user_id, ['hexaco', 'sds'])
+    deleted_id = _results(db)[-1]['result_id']  # еще не скопирована, когда ее удаляют
+    calls = []
+
+    def concurrent_batch(conn, last_rowid, upper_rowid, batch_size):
+        result = migrations._v5_copy_results_batch(conn, last_rowid, upper_rowid, batch_size)
+        calls.append(last_rowid)
+        if len(calls) == 1:
+            # Запись другого процесса между пачками: новый результат и удаление еще не скопированного
+            conn.execute('COMMIT')
+            add_user(db, 500, ['svs'])
+            with db.get_connection() as other:
+                other.execute('DELETE FROM results WHERE result_id = ?', (deleted_id,))
+            conn.execute('BEGIN IMMEDIATE')
+        return result
+
+    runner = _rerun_v5(db, concurrent_batch)
+    assert runner.run() is True
+    expected = [tuple(row) for row in _results(db)]
+    assert len(expected) == 40
+    assert deleted_id not in [row[0] for row in expected]
+    assert [row for row in expected if row[1] == 500][0][2] == 'svs'
+
+    with db.get_connection() as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        check = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'results'").fetchone()[0]
+    assert 'results_new' not in tables
+    assert {'idx_results_user_id', 'idx_results_session_id'} <= indexes
+    assert "CHECK (test_type IN" not in check
+    # После замены таблицы новые результаты получают следующие id
+    add_user(db, 501, ['hexaco'])
+    assert _results(db)[-1]['result_id'] > max(row[0] for row in expected)
+
+
+def test_fresh_database_reaches_latest_version(db):
+    runner = MigrationRunner(db)
+    assert runner.current_version() == MIGRATIONS[-1].version
+    assert runner.pending() == []
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
@@ -0,0 +1,76 @@
+import json
+import sqlite3
+
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.data.purge import EVICT_USERS, purge_users
+
+from hexaco_bot.tests.conftest import add_user
+
+
+def _connect(db):
+    return sqlite3.connect(db.db_path, isolation_level=None)
+
+
+def _count(conn, table, user_id):
+    return conn.execute(f'SELECT COUNT(*) FROM {table} WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+
+def test_purge_users_deletes_rows_files_and_keeps_counters_consistent(db, tmp_path):
+    for user_id in range(1, 8):
+        add_user(db, user_id, ['hexaco', 'sds', 'svs'], username=f"user{user_id}")
+    reports_dir, profiles_dir = tmp_path / 'reports', tmp_path / 'profiles'
+    reports_dir.mkdir()
+    profiles_dir.mkdir()
+    for user_id in (1, 2):
+        (reports_dir / f"report_user{user_id}_20240101_120000.json").write_text('{}')
+        (profiles_dir / f"{user_id}_profile.json").write_text('{}')
+    kept_report = reports_dir / 'report_user3_20240101_120000.json'
+    kept_report.write_text('{}')
+
+    conn = _connect(db)
+    try:
+        result = purge_users(conn, [1, 2], batch_size=1, reports_dir=str(reports_dir),
+                             profiles_dir=str(profiles_dir))
+        assert result.rows['results'] == 6 and result.rows['users'] == 2
+        assert len(result.files) == 4
+        for table in ('users', 'results', 'test_sessions', 'user_test_counts'):
+            assert _count(conn, table, 1) == 0 and _count(conn, table, 2) == 0
+        assert conn.execute('SELECT COUNT(*) FROM result_scales WHERE result_id NOT IN '
+                            '(SELECT result_id FROM results)').fetchone()[0] == 0
+        assert aggregates.reconcile(conn) == 0
+        # Одно событие на пачку: работающие боты сбросят сессии удаленных пользователей
+        events = [json.loads(payload) for kind, payload in conn.execute(
+            'SELECT kind, payload FROM admin_events ORDER BY event_id') if kind == EVICT_USERS]
+        assert [event['user_ids'] for event in events] == [[1], [2]]
+    finally:
+        conn.close()
+    assert kept_report.exists()
+    assert sorted(path.name for path in reports_dir.iterdir()) == [kept_report.name]
+
+
+def test_purge_one_test_keeps_the_user(db):
+    for user_id in range(1, 6):
+        add_user(db, user_id, ['hexaco', 'sds', 'sds'])
+    conn = _connect(db)
+    try:
+        result = purge_users(conn, [1, 3], 'sds')
+        assert result.rows['results'] == 4
+        assert _count(conn, 'users', 1) == 1 and _count(conn, 'results', 1) == 1
+        assert aggregates.reconcile(conn) == 0
+        assert conn.execute("SELECT users, completions FROM test_completion_counts "
+                            "WHERE test_type = 'sds'").fetchone() == (3, 6)
+    finally:
+        conn.close()
+    assert db.get_completed_tests_for_user(1)['sds'] is False
+
+
+def test_dry_run_changes_nothing(db):
+    add_user(db, 1, ['hexaco'])
+    conn = _connect(db)
+    try:
+        result = purge_users(conn, [1], dry_run=True)
+        assert result.rows['results'] == 1
+        assert _count(conn, 'results', 1) == 1
+        assert conn.execute('SELECT COUNT(*) FROM admin_events').fetchone()[0] == 0
+    finally:
+        conn.close()
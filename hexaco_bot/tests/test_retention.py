@@ -0,0 +1,85 @@
+import json
+import sqlite3
+
+from hexaco_bot.src.data import aggregates
+from hexaco_bot.src.data.retention import EXPIRE_SESSIONS, RetentionJob, RetentionPolicy, expire_sessions
+
+from hexaco_bot.tests.conftest import add_user
+
+
+def _age_sessions(db, days):
+    with db.get_connection() as conn:
+        conn.execute("UPDATE test_sessions SET started_at = datetime('now', ?)", (f'-{days} days',))
+
+
+def test_expire_sessions_deletes_empty_and_abandons_active_with_results(db):
+    add_user(db, 1, ['hexaco'])  # активная сессия с результатом
+    add_user(db, 2)  # активная сессия без результатов
+    add_user(db, 3, ['sds'])
+    _age_sessions(db, 40)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE test_sessions SET status = 'completed' WHERE user_id = 3")
+    add_user(db, 4)  # свежая сессия остается
+
+    conn = sqlite3.connect(db.db_path, isolation_level=None)
+    try:
+        deleted, abandoned, expired = expire_sessions(conn, 30, batch_size=2)
+        assert (deleted, abandoned) == (1, 1)
+        assert sorted(expired) == [(1, 'session-1'), (2, 'session-2')]
+        statuses = dict(conn.execute('SELECT user_id, status FROM test_sessions'))
+        assert statuses == {1: 'abandoned', 3: 'completed', 4: 'active'}
+        events = [json.loads(payload) for (payload,) in conn.execute(
+            'SELECT payload FROM admin_events WHERE kind = ?', (EXPIRE_SESSIONS,))]
+        assert sorted(tuple(pair) for event in events for pair in event['sessions']) == sorted(expired)
+        # Результаты и счетчики прохождений сессии не затрагивают
+        assert conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 2
+        assert aggregates.reconcile(conn) == 0
+    finally:
+        conn.close()
+
+
+def test_dry_run_expires_nothing(db):
+    add_user(db, 1)
+    _age_sessions(db, 40)
+    conn = sqlite3.connect(db.db_path, isolation_level=None)
+    try:
+        assert expire_sessions(conn, 30, dry_run=True)[:2] == (1, 0)
+        assert conn.execute('SELECT COUNT(*) FROM test_sessions').fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def _profiles(tmp_path, user_ids):
+    profiles_dir = tmp_path / 'profiles'
+    profiles_dir.mkdir()
+    for user_id in user_ids:
+        (profiles_dir / f"{user_id}_profile.json").write_text('{}')
+    return profiles_dir
+
+
+def _job(db, tmp_path, profiles_dir, **policy):
+    return RetentionJob(db.db_path, str(tmp_path / 'reports'), str(profiles_dir),
+                        RetentionPolicy(session_days=0, **policy))
+
+
+def test_orphan_profiles_are_kept_by_default(db, tmp_path):
+    add_user(db, 1)
+    profiles_dir = _profiles(tmp_path, [1, 2])
+    report = _job(db, tmp_path, profiles_dir).run()
+    assert report.profiles_removed == 0
+    assert sorted(path.name for path in profiles_dir.iterdir()) == ['1_profile.json', '2_profile.json']
+
+
+def test_orphan_profiles_removed_when_enabled(db, tmp_path):
+    add_user(db, 1)
+    profiles_dir = _profiles(tmp_path, [1, 2])
+    report = _job(db, tmp_path, profiles_dir, orphan_profiles=True).run()
+    assert report.profiles_removed == 1 and not report.errors
+    assert [path.name for path in profiles_dir.iterdir()] == ['1_profile.json']
+
+
+def test_orphan_profiles_skipped_while_users_table_is_empty(db, tmp_path):
+    profiles_dir = _profiles(tmp_path, [1, 2])
+    report = _job(db, tmp_path, profiles_dir, orphan_profiles=True).run()
+    assert report.profiles_removed == 0
+    assert len(list(profiles_dir.iterdir())) == 2